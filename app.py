@@ -6,6 +6,7 @@ Streamlitを使用したWebアプリケーション
 import streamlit as st
 import plotly.graph_objects as go
 import pandas as pd
+import os
 import sys
 import traceback
 from typing import Dict
@@ -14,6 +15,17 @@ from typing import Dict
 try:
     from utils.data_manager import DataManager
     from utils.chart_generator import ChartGenerator
+    from utils.allocation_optimizer import AllocationOptimizer, OBJECTIVES
+    from utils.allocation_drivers import BUILTIN_DRIVERS
+    from utils.cost_pools import POOL_COST_TYPES
+    from utils.kpi_formulas import KPI_FIELDS, KPI_FUNCTIONS, compile_formula
+    from utils.ratio_normalizer import NORMALIZATION_MODES
+    from utils.stress_test import StressTester
+    from utils.master_data import MASTER_FORMATS, MasterDataError
+    from utils.gl_ingestion import GLIngestionError, load_account_mapping
+    from utils.gl_incremental import state_path_for
+    from utils.scenario_store import ScenarioStore
+    from utils.result_cache import ResultCache
     from utils.auth_manager import AuthManager
     from utils.streamlit_compat import get_query_param, set_query_param, rerun_app
 except ImportError as e:
@@ -38,6 +50,14 @@ def validate_data_manager(data_manager):
         return False
     return True
 
+def set_session_ratios(allocation_ratios: Dict):
+    """配賦割合をセッション状態と数値入力に反映（数値入力の生成前に呼び出す）"""
+    for dept_name, ratios in allocation_ratios.items():
+        st.session_state.fixed_ratios[dept_name] = ratios["fixed"]
+        st.session_state.variable_ratios[dept_name] = ratios["variable"]
+        st.session_state[f"fixed_number_{dept_name}"] = ratios["fixed"] * 100
+        st.session_state[f"variable_number_{dept_name}"] = ratios["variable"] * 100
+
 # login_uiモジュールのインポート（個別にエラーハンドリング）
 try:
     from utils.login_ui import show_login_page, show_user_management_page, show_user_profile, show_user_info_in_sidebar
@@ -74,6 +94,12 @@ st.set_page_config(
 # 認証マネージャーの初期化
 auth_manager = AuthManager()
 
+# 計画の保存先
+scenario_store = ScenarioStore()
+
+# 計算結果・グラフのディスクキャッシュ（同じ配賦条件ではセッションをまたいで再利用）
+result_cache = ResultCache()
+
 # セッション状態の初期化
 if 'data_manager' not in st.session_state:
     st.session_state.data_manager = DataManager()
@@ -81,6 +107,8 @@ elif not validate_data_manager(st.session_state.data_manager):
     # メソッドが不足している場合は再初期化
     st.session_state.data_manager = DataManager()
 
+st.session_state.data_manager.result_cache = result_cache
+
 if 'chart_generator' not in st.session_state:
     st.session_state.chart_generator = ChartGenerator()
 
@@ -151,6 +179,7 @@ def main():
             st.cache_resource.clear()
             st.session_state.clear()
             st.session_state.data_manager = DataManager()
+            st.session_state.data_manager.result_cache = result_cache
             st.session_state.chart_generator = ChartGenerator()
             st.rerun()
         
@@ -184,6 +213,13 @@ def main():
             # 本部費用の配賦設定
             st.subheader("本部費用配賦設定")
             
+            # 円単位の厳密計算（配賦額の合計を本部費用に1円単位で一致させる）
+            st.session_state.data_manager.exact_yen = st.checkbox(
+                "円単位で厳密に計算",
+                value=st.session_state.data_manager.exact_yen,
+                help="配賦額を最大剰余法で円単位に丸め、合計を本部費用と1円単位で一致させます"
+            )
+            
             # 操作説明
             with st.expander("ℹ️ 操作方法", expanded=False):
                 st.markdown("""
@@ -193,6 +229,89 @@ def main():
                 - **リセット**: 均等配賦に戻す場合は「配賦割合をリセット」ボタンを使用
                 """)
             
+            # 自動調整した配賦割合を数値入力の生成前に反映
+            if "pending_ratios" in st.session_state:
+                set_session_ratios(st.session_state.pop("pending_ratios"))
+            
+            # 合計が100%でない場合の自動調整
+            normalization_options = ["none"] + list(NORMALIZATION_MODES.keys())
+            normalization_mode = st.selectbox(
+                "合計が100%でない場合の自動調整",
+                options=normalization_options,
+                index=normalization_options.index("lock_edited"),
+                format_func=lambda key: "調整しない" if key == "none" else NORMALIZATION_MODES[key],
+                key="normalization_mode"
+            )
+            
+            # 配賦割合の自動最適化（数値入力の生成前に値を反映する必要があるため先に配置）
+            with st.expander("🎯 配賦割合の自動最適化", expanded=False):
+                objective = st.selectbox(
+                    "目的関数",
+                    options=list(OBJECTIVES.keys()),
+                    format_func=lambda key: OBJECTIVES[key],
+                    key="optimizer_objective"
+                )
+                if st.button("最適化を実行"):
+                    optimizer = AllocationOptimizer(st.session_state.data_manager)
+                    result = optimizer.optimize(objective)
+                    set_session_ratios(result["ratios"])
+                    st.success(
+                        f"最適化完了: {result['iterations']}回反復 / {result['elapsed_seconds'] * 1000:.1f}ms"
+                    )
+            
+            # 配賦基準からの配賦割合の算出
+            with st.expander("📐 配賦基準から設定", expanded=False):
+                fixed_basis = st.selectbox(
+                    "本部固定費の配賦基準",
+                    options=list(BUILTIN_DRIVERS.keys()),
+                    format_func=lambda key: BUILTIN_DRIVERS[key],
+                    key="fixed_basis"
+                )
+                variable_basis = st.selectbox(
+                    "本部変動費の配賦基準",
+                    options=list(BUILTIN_DRIVERS.keys()),
+                    format_func=lambda key: BUILTIN_DRIVERS[key],
+                    key="variable_basis"
+                )
+                if st.button("配賦基準を適用"):
+                    basis = st.session_state.data_manager.get_allocation_basis()
+                    set_session_ratios(basis.allocation_ratios(fixed_basis, variable_basis))
+            
+            # コストプール別の配賦基準からの本部費用と配賦割合の算出
+            with st.expander("🏦 コストプールから設定", expanded=False):
+                st.markdown("本部費用をプールに分け、プールごとの配賦基準で配賦します（本部費用はプールの合計になります）")
+                driver_labels = {label: key for key, label in BUILTIN_DRIVERS.items()}
+                cost_type_labels = {label: key for key, label in POOL_COST_TYPES.items()}
+                pool_rows = st.data_editor(
+                    pd.DataFrame([
+                        {"プール名": "本部固定費", "費用区分": POOL_COST_TYPES["fixed"],
+                         "金額": st.session_state.data_manager.headquarters_fixed_cost,
+                         "配賦基準": BUILTIN_DRIVERS["equal"]},
+                        {"プール名": "本部変動費", "費用区分": POOL_COST_TYPES["variable"],
+                         "金額": st.session_state.data_manager.headquarters_variable_cost,
+                         "配賦基準": BUILTIN_DRIVERS["equal"]}
+                    ]),
+                    num_rows="dynamic",
+                    column_config={
+                        "費用区分": st.column_config.SelectboxColumn(options=list(cost_type_labels), required=True),
+                        "金額": st.column_config.NumberColumn(min_value=0, format="%.0f", required=True),
+                        "配賦基準": st.column_config.SelectboxColumn(options=list(driver_labels), required=True)
+                    },
+                    key="cost_pool_editor"
+                )
+                if st.button("コストプールを適用"):
+                    pools = [
+                        {"name": row["プール名"], "cost_type": cost_type_labels[row["費用区分"]],
+                         "amount": row["金額"], "basis": driver_labels[row["配賦基準"]]}
+                        for row in pool_rows.dropna().to_dict("records")
+                    ]
+                    try:
+                        result = st.session_state.data_manager.apply_cost_pools(pools)
+                        set_session_ratios(result["allocation_ratios"])
+                        st.success("コストプールを適用しました（内訳は「データ詳細」タブに表示されます）")
+                    except ValueError as e:
+                        st.error(str(e))
+            
             # 固定費の配賦割合
             st.markdown("**固定費配賦割合**")
             
@@ -200,6 +319,7 @@ def main():
             dept_names = list(st.session_state.data_manager.departments.keys())
             
             # 各事業部の数値入力を表示
+            edited_fixed = []
             for i, dept_name in enumerate(dept_names):
                 # セッション状態から現在の値を取得
                 current_ratio = st.session_state.fixed_ratios[dept_name]
@@ -234,6 +354,7 @@ def main():
                 # 変更された場合、セッション状態を更新
                 if abs(ratio - current_ratio) > 0.001:
                     st.session_state.fixed_ratios[dept_name] = ratio
+                    edited_fixed.append(dept_name)
             
             # 合計を表示
             total_fixed = sum(st.session_state.fixed_ratios.values())
@@ -249,6 +370,7 @@ def main():
             st.markdown("**変動費配賦割合**")
             
             # 各事業部の数値入力を表示
+            edited_variable = []
             for i, dept_name in enumerate(dept_names):
                 # セッション状態から現在の値を取得
                 current_ratio = st.session_state.variable_ratios[dept_name]
@@ -283,6 +405,7 @@ def main():
                 # 変更された場合、セッション状態を更新
                 if abs(ratio - current_ratio) > 0.001:
                     st.session_state.variable_ratios[dept_name] = ratio
+                    edited_variable.append(dept_name)
             
             # 合計を表示
             total_variable = sum(st.session_state.variable_ratios.values())
@@ -301,6 +424,15 @@ def main():
                     "fixed": fixed_ratios[dept_name],
                     "variable": variable_ratios[dept_name]
                 }
+            
+            # 合計が100%でない場合は自動調整した値を次回の描画で数値入力に反映
+            if normalization_mode != "none" and (abs(total_fixed - 1.0) >= 0.001 or abs(total_variable - 1.0) >= 0.001):
+                st.session_state.pending_ratios = st.session_state.data_manager.normalize_allocation_ratios(
+                    new_ratios,
+                    normalization_mode,
+                    locked={"fixed": edited_fixed, "variable": edited_variable}
+                )
+                st.rerun()
             st.session_state.data_manager.update_allocation_ratios(new_ratios)
             
             # リセットボタン
@@ -362,7 +494,9 @@ def main():
             #         )
             
             # グラフを生成
-            fig = st.session_state.chart_generator.create_break_even_chart(allocated_costs)
+            fig = st.session_state.data_manager.cached_figure(
+                "break_even", lambda: st.session_state.chart_generator.create_break_even_chart(allocated_costs)
+            )
             
             # グラフを表示
             st.plotly_chart(fig, use_container_width=True)
@@ -377,6 +511,16 @@ def main():
             - **緑の丸**: 損益分岐点
             - **グレーの点線**: 損益分岐線（利益=0）
             """)
+            
+            # 月次推移（年間の値を12ヶ月に均等按分）
+            st.subheader("月次推移")
+            monthly_plan = st.session_state.data_manager.get_monthly_plan()
+            monthly_fig = st.session_state.chart_generator.create_monthly_chart(
+                monthly_plan.calculate(),
+                monthly_plan.names,
+                monthly_plan.month_labels
+            )
+            st.plotly_chart(monthly_fig, use_container_width=True)
         
         with tab2:
             st.header("配賦サマリー")
@@ -385,7 +529,9 @@ def main():
             allocated_costs = st.session_state.data_manager.calculate_allocated_costs()
             
             # 配賦詳細チャートを生成
-            detail_fig = st.session_state.chart_generator.create_allocation_detail_chart(allocated_costs)
+            detail_fig = st.session_state.data_manager.cached_figure(
+                "allocation_detail", lambda: st.session_state.chart_generator.create_allocation_detail_chart(allocated_costs)
+            )
             
             # グラフを表示
             st.plotly_chart(detail_fig, use_container_width=True)
@@ -404,7 +550,9 @@ def main():
                 """)
             
             # サマリーチャートを生成
-            summary_fig = st.session_state.chart_generator.create_allocation_summary_chart(allocated_costs)
+            summary_fig = st.session_state.data_manager.cached_figure(
+                "allocation_summary", lambda: st.session_state.chart_generator.create_allocation_summary_chart(allocated_costs)
+            )
             
             # グラフを表示
             st.plotly_chart(summary_fig, use_container_width=True)
@@ -483,10 +631,155 @@ def main():
             st.subheader("配賦後データ")
             summary_df = st.session_state.data_manager.get_summary_data()
             st.dataframe(summary_df, use_container_width=True)
+            
+            # シナリオ比較
+            st.subheader("シナリオ比較")
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                scenario_name = st.text_input("シナリオ名", key="scenario_name", placeholder="例: A案")
+            with col2:
+                st.write("")
+                if st.button("現在の配賦を保存") and scenario_name:
+                    st.session_state.data_manager.save_scenario(scenario_name)
+            
+            # 保存した計画（ログアウト・キャッシュクリア後も残る）
+            owner = current_user['username'] if current_user else ""
+            with st.expander("💾 計画の保存と読み込み", expanded=False):
+                col1, col2, col3 = st.columns([2, 2, 1])
+                with col1:
+                    plan_name = st.text_input("計画名", key="plan_name", placeholder="例: 8期予算 当初案")
+                with col2:
+                    plan_tags = st.text_input("タグ（カンマ区切り）", key="plan_tags", placeholder="例: 承認済")
+                with col3:
+                    st.write("")
+                    if st.button("計画を保存") and plan_name:
+                        saved = st.session_state.data_manager.save_plan(
+                            scenario_store, plan_name, owner=owner,
+                            tags=[tag.strip() for tag in plan_tags.split(",") if tag.strip()]
+                        )
+                        st.success(f"「{plan_name}」をバージョン {saved['version']} として保存しました")
+                
+                plans = scenario_store.list_plans(owner=owner)
+                if plans:
+                    plan_index = st.selectbox(
+                        "保存した計画",
+                        options=range(len(plans)),
+                        format_func=lambda i: f"{plans[i]['name']}（v{plans[i]['version']}、{plans[i]['created_at'][:16]}）"
+                                              + (f" [{', '.join(plans[i]['tags'])}]" if plans[i]['tags'] else "")
+                    )
+                    versions = scenario_store.list_versions(plans[plan_index]["name"], owner)
+                    plan_version = st.selectbox(
+                        "バージョン",
+                        options=[version["version"] for version in versions],
+                        format_func=lambda version: f"v{version}"
+                    )
+                    if st.button("計画を読み込む"):
+                        st.session_state.data_manager.load_plan(
+                            scenario_store, plans[plan_index]["name"], owner=owner, version=plan_version)
+                        st.session_state.fixed_ratios = {}
+                        st.session_state.variable_ratios = {}
+                        st.session_state.pending_ratios = st.session_state.data_manager.get_allocation_ratios()
+                        st.rerun()
+            
+            saved_names = list(st.session_state.data_manager.saved_scenarios.keys())
+            if len(saved_names) >= 2:
+                col1, col2 = st.columns(2)
+                with col1:
+                    baseline_name = st.selectbox("基準シナリオ", options=saved_names, key="baseline_scenario")
+                with col2:
+                    compared_name = st.selectbox(
+                        "比較シナリオ",
+                        options=[name for name in saved_names if name != baseline_name],
+                        key="compared_scenario"
+                    )
+                scenario_diff = st.session_state.data_manager.diff_scenarios(baseline_name, [compared_name])
+                movers_df = pd.DataFrame([
+                    {
+                        "事業部": mover["department"],
+                        "項目": mover["field"],
+                        "差額": f"{mover['absolute']:+,.0f}" if mover["field"] != "margin_rate" else f"{mover['absolute']:+.1%}",
+                        "変化率": f"{mover['relative']:+.1%}"
+                    }
+                    for mover in scenario_diff.largest_movers(top=10, by="relative")
+                ])
+                st.markdown("**変化の大きい項目**")
+                st.dataframe(movers_df, use_container_width=True)
+            
+            # ストレステスト（現在の計画と保存したシナリオに標準のショックを適用）
+            st.subheader("ストレステスト")
+            only_flipped = st.checkbox("赤字に転落する事業部がある組合せのみ表示", value=False)
+            stress_result = st.session_state.data_manager.run_stress_test()
+            stress_df = StressTester.get_summary_data(stress_result, only_flipped=only_flipped)
+            if stress_result["flipped"].any():
+                st.warning(f"黒字から赤字に転落する組合せ: {int(stress_result['flipped'].any(axis=2).sum())}件")
+            st.dataframe(stress_df, use_container_width=True)
         
         with tab3:
             st.header("データ詳細")
             
+            # マスターデータの読み込み
+            with st.expander("📂 マスターデータの読み込み", expanded=False):
+                st.markdown("""
+                - **事業部マスター**: 事業部, 限界利益率, 固定費, 変動費 の列（英語の列名 name, margin_rate, fixed_cost, variable_cost も可）
+                - **本部費用マスター**: 費用区分（固定費 / 変動費）, 金額 の列（任意）
+                """)
+                master_types = [extension.lstrip(".") for extension in MASTER_FORMATS]
+                department_file = st.file_uploader("事業部マスター", type=master_types, key="department_master")
+                headquarters_file = st.file_uploader("本部費用マスター", type=master_types, key="headquarters_master")
+                if st.button("マスターデータを読み込む") and department_file is not None:
+                    try:
+                        st.session_state.data_manager.load_master_data(
+                            department_file.getvalue(),
+                            headquarters_file.getvalue() if headquarters_file is not None else None,
+                            file_format=MASTER_FORMATS[os.path.splitext(department_file.name)[1].lower()],
+                            headquarters_format=(MASTER_FORMATS[os.path.splitext(headquarters_file.name)[1].lower()]
+                                                 if headquarters_file is not None else None)
+                        )
+                        # 事業部の構成が変わる場合があるため配賦割合の入力を作り直す
+                        st.session_state.fixed_ratios = {}
+                        st.session_state.variable_ratios = {}
+                        st.session_state.pending_ratios = st.session_state.data_manager.get_allocation_ratios()
+                        st.rerun()
+                    except MasterDataError as e:
+                        st.error(str(e))
+                
+                st.markdown("**仕訳明細（総勘定元帳）から集計**")
+                st.caption("列: 部門, 勘定科目コード, 金額。勘定科目コードの先頭 4: 売上、5: 変動費、6・7: 固定費 として集計します")
+                ledger_file = st.file_uploader("仕訳明細", type=["csv", "parquet"], key="general_ledger")
+                mapping_file = st.file_uploader("勘定科目の対応表（任意）", type=["csv"], key="account_mapping")
+                incremental = st.checkbox(
+                    "前回の取込以降の仕訳のみ読み込む",
+                    help="仕訳行番号の列が必要です。取込済みの位置と集計はユーザーごとに data/gl_state/ に保存されます"
+                )
+                if st.button("仕訳明細を集計して読み込む") and ledger_file is not None:
+                    try:
+                        mapping = load_account_mapping(mapping_file.getvalue()) if mapping_file is not None else None
+                        ledger_format = "parquet" if ledger_file.name.lower().endswith(".parquet") else "csv"
+                        if incremental:
+                            aggregator = st.session_state.data_manager.update_general_ledger(
+                                ledger_file.getvalue(),
+                                state_path_for(current_user['username'] if current_user else ""),
+                                mapping=mapping,
+                                file_format=ledger_format
+                            )["aggregator"]
+                        else:
+                            aggregator = st.session_state.data_manager.load_general_ledger(
+                                ledger_file.getvalue(), mapping=mapping, file_format=ledger_format
+                            )
+                        st.session_state.gl_summary = aggregator.get_summary_data()
+                        st.session_state.gl_unmapped = (aggregator.unmapped_lines, aggregator.unmapped_amount)
+                        st.session_state.fixed_ratios = {}
+                        st.session_state.variable_ratios = {}
+                        st.session_state.pending_ratios = st.session_state.data_manager.get_allocation_ratios()
+                        st.rerun()
+                    except GLIngestionError as e:
+                        st.error(str(e))
+                if 'gl_summary' in st.session_state:
+                    st.dataframe(st.session_state.gl_summary, use_container_width=True)
+                    unmapped_lines, unmapped_amount = st.session_state.gl_unmapped
+                    if unmapped_lines > 0:
+                        st.warning(f"区分に対応しない仕訳が {unmapped_lines:,}行（{unmapped_amount:,.0f}円）あります")
+            
             # 基本データ
             st.subheader("事業部基本データ")
             dept_data = st.session_state.data_manager.get_department_data()
@@ -535,6 +828,11 @@ def main():
             with col2:
                 st.metric("本部変動費", f"{hq_variable:,.0f}円")
             
+            pool_breakdown = st.session_state.data_manager.get_cost_pool_breakdown()
+            if not pool_breakdown.empty:
+                st.markdown("**コストプール別の配賦額**")
+                st.dataframe(pool_breakdown.style.format("{:,.0f}円"), use_container_width=True)
+            
             # 配賦割合
             st.subheader("現在の配賦割合")
             allocation_df = pd.DataFrame([
@@ -546,6 +844,36 @@ def main():
                 for dept_name, ratios in st.session_state.data_manager.get_allocation_ratios().items()
             ])
             st.dataframe(allocation_df, use_container_width=True)
+            
+            # 計算式で定義したKPI
+            st.subheader("KPI（計算式）")
+            with st.expander("➕ KPIを追加", expanded=False):
+                st.markdown(f"使用できる項目: `{'`, `'.join(KPI_FIELDS)}`")
+                st.markdown(f"使用できる関数: `{'`, `'.join(KPI_FUNCTIONS)}`")
+                kpi_name = st.text_input("KPI名", key="kpi_name")
+                kpi_formula = st.text_input("計算式", key="kpi_formula", placeholder="hq_fixed_allocated / fixed_cost")
+                if st.button("KPIを追加") and kpi_name and kpi_formula:
+                    try:
+                        compile_formula(kpi_formula)
+                        st.session_state.data_manager.kpi_definitions[kpi_name] = kpi_formula
+                    except ValueError as e:
+                        st.error(str(e))
+            
+            kpi_definitions = st.session_state.data_manager.kpi_definitions
+            if kpi_definitions:
+                with st.expander("🗑️ KPIを削除", expanded=False):
+                    removed_kpi = st.selectbox(
+                        "削除するKPI",
+                        options=list(kpi_definitions.keys()),
+                        format_func=lambda name: f"{name}（{kpi_definitions[name]}）"
+                    )
+                    if st.button("KPIを削除"):
+                        del kpi_definitions[removed_kpi]
+                        st.rerun()
+            
+            kpi_values = st.session_state.data_manager.calculate_kpis()
+            kpi_df = pd.DataFrame(kpi_values, index=list(st.session_state.data_manager.departments.keys()))
+            st.dataframe(kpi_df.style.format("{:,.3f}"), use_container_width=True)
         
         with tab4:
             st.header("営業利益貢献度分析")
@@ -705,6 +1033,22 @@ def main():
             elasticity_df = pd.DataFrame(elasticity_summary)
             st.dataframe(elasticity_df, use_container_width=True)
             
+            # 安全余裕率・営業レバレッジ
+            st.subheader("安全余裕率・営業レバレッジ分析")
+            safety = st.session_state.data_manager.calculate_safety_analytics()
+            safety_df = pd.DataFrame([
+                {
+                    "事業部": dept_name,
+                    "損益分岐点": f"{safety['break_even_point'][i]:,.0f}円",
+                    "安全余裕額": f"{safety['margin_of_safety'][i]:,.0f}円",
+                    "安全余裕率": f"{safety['safety_margin_ratio'][i]:.1%}",
+                    "限界利益": f"{safety['contribution_margin'][i]:,.0f}円",
+                    "営業レバレッジ係数": f"{safety['operating_leverage'][i]:.2f}"
+                }
+                for i, dept_name in enumerate(contribution_data.keys())
+            ])
+            st.dataframe(safety_df, use_container_width=True)
+            
             # 弾性の説明
             with st.expander("ℹ️ 売上総利益-営業利益弾性について", expanded=False):
                 st.markdown("""
@@ -722,6 +1066,46 @@ def main():
                 - 投資効果の予測
                 - 営業戦略の優先順位決定
                 """)
+            
+            # 営業利益目標からの逆算
+            st.subheader("営業利益目標からの逆算")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                target_profit = st.number_input(
+                    "全社の営業利益目標（円）",
+                    value=0,
+                    step=1000000,
+                    help="目標を達成するために各事業部に必要な売上総利益を逆算します"
+                )
+            with col2:
+                max_growth_rate = st.slider(
+                    "各事業部の最大伸び率（%）",
+                    min_value=0,
+                    max_value=1000,
+                    value=1000,
+                    step=10,
+                    help="この伸び率を超える事業部は上限で止め、残りを他の事業部で負担します"
+                )
+            
+            required = st.session_state.data_manager.calculate_required_sales(
+                target_profit,
+                max_growth={dept_name: max_growth_rate / 100 for dept_name in contribution_data.keys()}
+            )
+            if not required["feasible"]:
+                st.warning(f"伸び率の上限内では目標に {required['shortfall']:,.0f}円 届きません")
+            
+            required_df = pd.DataFrame([
+                {
+                    "事業部": dept_name,
+                    "必要売上総利益": f"{data['必要売上総利益']:,.0f}円",
+                    "売上総利益増加額": f"{data['売上総利益増加額']:,.0f}円",
+                    "必要伸び率": f"{data['必要伸び率']:.1%}",
+                    "目標達成時営業利益": f"{data['目標達成時営業利益']:,.0f}円"
+                }
+                for dept_name, data in required["departments"].items()
+            ])
+            st.dataframe(required_df, use_container_width=True)
         
         with tab5:
             st.header("📚 分析手法の説明")
@@ -0,0 +1,87 @@
+"""
+円単位の厳密計算のテスト
+最大剰余法の丸めで合計が保たれ、負の値・端数の同値でも結果が決まること
+"""
+
+import unittest
+
+import numpy as np
+
+from utils.allocation_engine import compute_allocation_exact, round_preserving_sum
+from utils.data_manager import DataManager
+
+
+class RoundPreservingSumTest(unittest.TestCase):
+
+    def test_sum_is_preserved(self):
+        rng = np.random.default_rng(0)
+        amounts = rng.dirichlet(np.ones(50), size=20) * 1234567.89
+        rounded = round_preserving_sum(amounts)
+        self.assertEqual(rounded.dtype, np.int64)
+        np.testing.assert_array_equal(rounded.sum(axis=1), np.rint(amounts.sum(axis=1)))
+        # 各値は切り捨てか切り上げのいずれか
+        self.assertTrue(np.all(np.abs(rounded - amounts) < 1))
+
+    def test_largest_remainders_are_rounded_up(self):
+        rounded = round_preserving_sum(np.array([100.2, 200.7, 300.6, 398.5]))
+        np.testing.assert_array_equal(rounded, [100, 201, 301, 398])
+
+    def test_negative_values(self):
+        # 負担調整額は事業部間で相殺するため合計0（切り捨ては負の方向）
+        amounts = np.array([-1000.4, 333.3, 333.3, 333.8])
+        rounded = round_preserving_sum(amounts)
+        self.assertEqual(rounded.sum(), 0)
+        np.testing.assert_array_equal(rounded, [-1000, 333, 333, 334])
+
+        rng = np.random.default_rng(1)
+        amounts = rng.uniform(-1e5, 1e5, (8, 13))
+        amounts -= amounts.mean(axis=1, keepdims=True)
+        rounded = round_preserving_sum(amounts)
+        np.testing.assert_array_equal(rounded.sum(axis=1), np.rint(amounts.sum(axis=1)))
+        self.assertTrue(np.all(np.abs(rounded - amounts) < 1))
+
+    def test_ties_prefer_earlier_elements(self):
+        np.testing.assert_array_equal(round_preserving_sum(np.full(3, 1000 / 3)), [334, 333, 333])
+        np.testing.assert_array_equal(round_preserving_sum(np.array([0.5, 0.5, 0.5, 0.5])), [1, 1, 0, 0])
+        # 行ごとに不足する円数が異なる場合も同じ規則
+        rounded = round_preserving_sum(np.array([[0.5, 0.5, 0.5, 0.5], [0.25, 0.25, 0.25, 0.25]]))
+        np.testing.assert_array_equal(rounded, [[1, 1, 0, 0], [1, 0, 0, 0]])
+
+    def test_integers_are_unchanged(self):
+        np.testing.assert_array_equal(round_preserving_sum(np.array([3.0, -2.0, 0.0])), [3, -2, 0])
+        np.testing.assert_array_equal(round_preserving_sum(np.zeros((2, 4))), np.zeros((2, 4)))
+
+
+class ExactAllocationTest(unittest.TestCase):
+
+    def test_allocations_match_headquarters_cost(self):
+        data_manager = DataManager()
+        data_manager.headquarters_fixed_cost = 10000001.0
+        data_manager.headquarters_variable_cost = 7000000.0
+        names = list(data_manager.departments.keys())
+        data_manager.cost_transfers = {f"{names[0]}_fixed": -100.5, f"{names[1]}_fixed": 100.5}
+        data_manager.exact_yen = True
+        allocated = data_manager.calculate_allocated_arrays()
+
+        for field in ("fixed_cost", "variable_cost", "implied_sales", "hq_fixed_allocated", "transfer_fixed"):
+            self.assertEqual(allocated[field].dtype, np.int64, field)
+        self.assertEqual(allocated["hq_fixed_allocated"].sum(), 10000001)
+        self.assertEqual(allocated["hq_variable_allocated"].sum(), 7000000)
+        self.assertEqual(allocated["transfer_fixed"].sum(), 0)
+        np.testing.assert_array_equal(
+            allocated["fixed_cost"],
+            allocated["original_fixed"] + allocated["hq_fixed_allocated"] + allocated["transfer_fixed"])
+
+    def test_batch_rows_are_rounded_independently(self):
+        rng = np.random.default_rng(2)
+        ratios = rng.dirichlet(np.ones(6), size=(4, 2))
+        allocated = compute_allocation_exact(
+            rng.uniform(0.2, 0.8, 6), rng.uniform(1e6, 1e7, 6), rng.uniform(1e6, 1e7, 6),
+            ratios[:, 0], ratios[:, 1], np.array([[1e7 + 3], [2e7], [3e7 + 7], [4e7]]), 5e6)
+        np.testing.assert_array_equal(allocated["hq_fixed_allocated"].sum(axis=1), [1e7 + 3, 2e7, 3e7 + 7, 4e7])
+        np.testing.assert_array_equal(allocated["hq_variable_allocated"].sum(axis=1), np.full(4, 5e6))
+        np.testing.assert_array_equal(allocated["transfer_fixed"], np.zeros((4, 6)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+仕訳明細の差分取込のテスト
+セッション（DataManager）をまたいだ再開と、状態ファイルの取込条件・取込元の確認
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from utils.data_manager import DataManager
+from utils.gl_incremental import IncrementalGLIngestor, state_path_for
+from utils.gl_ingestion import AccountMapping, GLIngestionError
+
+DEPARTMENTS = ("キャリア", "インサイド", "フィールド", "SP", "飲食")
+
+
+def _ledger(first_line: int, lines_per_department: int, departments=DEPARTMENTS, seed: int = 0) -> pd.DataFrame:
+    """売上・変動費・固定費の仕訳（限界利益率が0〜1になる金額）"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for name in departments:
+        for account, low, high in (("4110", 8e4, 1e5), ("5100", 1e4, 3e4), ("6200", 1e4, 5e4)):
+            rows += [(name, account, round(amount)) for amount in rng.uniform(low, high, lines_per_department)]
+    ledger = pd.DataFrame(rows, columns=["部門", "勘定科目コード", "金額"]).sample(frac=1, random_state=seed)
+    ledger["仕訳行番号"] = np.arange(first_line, first_line + len(ledger))
+    return ledger
+
+
+class IncrementalGLTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.state_path = os.path.join(self.directory, "state", "gl.json")
+        # 先頭の確認範囲（64KB）より大きくなる行数
+        self.day1 = _ledger(1, 300)
+        self.day2 = pd.concat([self.day1, _ledger(len(self.day1) + 1, 5, departments=("キャリア",), seed=1)])
+        self.day1_path = os.path.join(self.directory, "day1.csv")
+        self.day2_path = os.path.join(self.directory, "day2.csv")
+        self.day1.to_csv(self.day1_path, index=False)
+        self.day2.to_csv(self.day2_path, index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _assert_departments_equal(self, actual: DataManager, expected: DataManager):
+        self.assertEqual(set(actual.departments.keys()), set(expected.departments.keys()))
+        for name, values in expected.departments.items():
+            for key, value in values.items():
+                self.assertAlmostEqual(actual.departments[name][key], value, places=6, msg=f"{name}: {key}")
+
+    def test_resume_in_new_session_updates_every_department(self):
+        DataManager().update_general_ledger(self.day1_path, self.state_path)
+
+        # 新しいセッションの事業部データは data/departments.csv の初期値
+        data_manager = DataManager()
+        result = data_manager.update_general_ledger(self.day2_path, self.state_path)
+        self.assertEqual(result["new_lines"], 15)
+        self.assertEqual(result["changed"], ["キャリア"])
+
+        expected = DataManager()
+        expected.load_general_ledger(self.day2_path)
+        self._assert_departments_equal(data_manager, expected)
+
+    def test_resume_in_same_session_matches_full_load(self):
+        data_manager = DataManager()
+        data_manager.update_general_ledger(self.day1_path, self.state_path)
+        data_manager.calculate_allocated_arrays()
+        data_manager.update_general_ledger(self.day2_path, self.state_path)
+
+        expected = DataManager()
+        expected.load_general_ledger(self.day2_path)
+        self._assert_departments_equal(data_manager, expected)
+        self.assertEqual(data_manager.update_general_ledger(self.day2_path, self.state_path)["new_lines"], 0)
+
+    def test_reads_only_appended_csv_lines(self):
+        IncrementalGLIngestor(self.state_path).update(self.day1_path)
+        self.assertGreater(os.path.getsize(self.day1_path), 64 * 1024)
+
+        # 取込済みの範囲（先頭の確認範囲より後）の行を壊しても、追記分のみ読み込むためエラーにならない
+        with open(self.day2_path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        lines[len(self.day1)] = lines[len(self.day1)].replace(",", ",x", 1)
+        with open(self.day2_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        self.assertEqual(IncrementalGLIngestor(self.state_path).update(self.day2_path)["new_lines"], 15)
+
+    def test_rejects_different_configuration_and_source(self):
+        IncrementalGLIngestor(self.state_path).update(self.day1_path)
+        with self.assertRaises(GLIngestionError):
+            IncrementalGLIngestor(self.state_path, AccountMapping(prefixes={"4": "sales", "5": "variable"}))
+        with self.assertRaises(GLIngestionError):
+            IncrementalGLIngestor(self.state_path, department_map={"SP": "飲食"})
+
+        shuffled = self.day2.sample(frac=1, random_state=3).to_csv(index=False).encode("utf-8")
+        with self.assertRaises(GLIngestionError):
+            IncrementalGLIngestor(self.state_path).update(shuffled, file_format="csv")
+        truncated = self.day1.iloc[:10].to_csv(index=False).encode("utf-8")
+        with self.assertRaises(GLIngestionError):
+            IncrementalGLIngestor(self.state_path).update(truncated, file_format="csv")
+
+    def test_state_path_per_user(self):
+        self.assertNotEqual(state_path_for("alice"), state_path_for("bob"))
+        self.assertEqual(os.path.dirname(state_path_for("../other", self.directory)), self.directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
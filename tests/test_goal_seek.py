@@ -0,0 +1,61 @@
+"""
+目標逆算のテスト
+必要売上総利益から operating_profit で計算した営業利益が目標に一致すること
+"""
+
+import unittest
+
+import numpy as np
+
+from utils.allocation_engine import operating_profit
+from utils.data_manager import DataManager
+from utils.goal_seek import GoalSeeker
+
+
+class GoalSeekRoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_manager = DataManager()
+        allocated = self.data_manager.calculate_allocated_arrays()
+        self.fixed_cost = allocated["fixed_cost"]
+        self.current_profit = operating_profit(allocated["implied_sales"], self.fixed_cost).sum()
+        self.targets = self.current_profit + np.array([0.0, 1e6, 5e7, 3e8])
+
+    def _assert_round_trip(self, result):
+        required = result["required_implied_sales"]
+        profit = operating_profit(required, self.fixed_cost[None, :])
+        np.testing.assert_allclose(profit, result["operating_profit"])
+        np.testing.assert_allclose(profit.sum(axis=1), result["achieved_profit"], rtol=1e-12)
+        feasible = result["feasible"]
+        np.testing.assert_allclose(profit.sum(axis=1)[feasible], result["targets"][feasible], rtol=1e-9)
+
+    def test_same_growth_rate(self):
+        result = GoalSeeker(self.data_manager).solve(self.targets)
+        self.assertTrue(result["feasible"].all())
+        self._assert_round_trip(result)
+        # 重みを省略した場合はすべての事業部が同じ伸び率
+        growth = result["growth_rate"]
+        np.testing.assert_allclose(growth, growth[:, :1] * np.ones_like(growth))
+
+    def test_shares_and_caps(self):
+        names = list(self.data_manager.departments.keys())
+        result = GoalSeeker(self.data_manager).solve(
+            self.targets,
+            max_growth={name: 0.5 for name in names},
+            shares={names[0]: 0.3}
+        )
+        self._assert_round_trip(result)
+        gaps = self.targets - self.current_profit
+        np.testing.assert_allclose(result["sales_increase"][:, 0], 0.3 * gaps)
+
+    def test_unreachable_target_reports_shortfall(self):
+        names = list(self.data_manager.departments.keys())
+        target = self.current_profit + 1e12
+        result = GoalSeeker(self.data_manager).solve([target], max_growth={name: 0.1 for name in names})
+        self.assertFalse(result["feasible"][0])
+        self._assert_round_trip(result)
+        self.assertAlmostEqual(result["shortfall"][0], target - result["achieved_profit"][0], delta=1e-3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+配賦割合の正規化のテスト
+固定した事業部の値を保ったまま、残りの事業部で合計1・上下限を満たすこと
+"""
+
+import unittest
+
+import numpy as np
+
+from utils.data_manager import DataManager
+from utils.ratio_normalizer import normalize_ratios, project_to_simplex
+
+
+class NormalizeRatiosTest(unittest.TestCase):
+
+    def test_project_matches_simplex_projection(self):
+        values = np.array([0.5, 0.4, 0.3, 0.1])
+        np.testing.assert_allclose(normalize_ratios(values, "project"), [0.425, 0.325, 0.225, 0.025])
+        np.testing.assert_allclose(normalize_ratios(values, "project"), project_to_simplex(values))
+
+    def test_lock_edited_keeps_locked_values(self):
+        values = np.array([0.5, 0.3, 0.3, 0.2])
+        locked = np.array([True, False, False, False])
+        normalized = normalize_ratios(values, "lock_edited", locked)
+        self.assertAlmostEqual(normalized.sum(), 1.0)
+        self.assertEqual(normalized[0], 0.5)
+        # 残りの事業部は同じ幅（0.1ずつ）で減少
+        np.testing.assert_allclose(normalized[1:], [0.2, 0.2, 0.1])
+
+    def test_proportional_keeps_ratio_of_unlocked(self):
+        values = np.array([0.4, 0.2, 0.6, 0.2])
+        locked = np.array([True, False, False, False])
+        normalized = normalize_ratios(values, "proportional", locked)
+        self.assertAlmostEqual(normalized.sum(), 1.0)
+        self.assertEqual(normalized[0], 0.4)
+        np.testing.assert_allclose(normalized[1:], [0.6 * 0.2, 0.6 * 0.6, 0.6 * 0.2])
+
+    def test_bounds_are_respected(self):
+        values = np.array([0.7, 0.1, 0.1, 0.1])
+        locked = np.array([True, False, False, False])
+        lower = np.array([0.0, 0.0, 0.15, 0.0])
+        upper = np.array([1.0, 0.1, 1.0, 1.0])
+        normalized = normalize_ratios(values, "lock_edited", locked, lower, upper)
+        self.assertAlmostEqual(normalized.sum(), 1.0)
+        self.assertEqual(normalized[0], 0.7)
+        self.assertTrue(np.all(normalized >= lower - 1e-12) and np.all(normalized <= upper + 1e-12))
+        np.testing.assert_allclose(normalized, [0.7, 0.075, 0.15, 0.075])
+
+    def test_infeasible_lock_is_released(self):
+        # 固定した値だけで合計が1を超える場合は固定を解除して射影
+        values = np.array([0.8, 0.7, 0.1])
+        locked = np.array([True, True, False])
+        normalized = normalize_ratios(values, "lock_edited", locked)
+        np.testing.assert_allclose(normalized, project_to_simplex(values))
+
+    def test_rows_are_normalized_independently(self):
+        rng = np.random.default_rng(0)
+        values = rng.uniform(0, 0.5, (50, 6))
+        locked = rng.random((50, 6)) < 0.3
+        locked[:, 0] = False
+        for mode in ("project", "proportional", "lock_edited"):
+            normalized = normalize_ratios(values, mode, locked)
+            np.testing.assert_allclose(normalized.sum(axis=1), 1.0)
+            self.assertTrue(np.all(normalized >= -1e-12))
+            if mode != "project":
+                kept = locked & (np.sum(np.where(locked, values, 0.0), axis=1, keepdims=True) <= 1.0)
+                np.testing.assert_array_equal(normalized[kept], values[kept])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            normalize_ratios(np.array([0.5, 0.5]), "unknown")
+
+
+class DataManagerNormalizeTest(unittest.TestCase):
+
+    def test_locked_departments_per_cost_type(self):
+        data_manager = DataManager()
+        names = list(data_manager.departments.keys())
+        ratios = {name: {"fixed": 0.3, "variable": 0.1} for name in names}
+        locked = {"fixed": [names[0]], "variable": [names[1]]}
+        normalized = data_manager.normalize_allocation_ratios(ratios, "lock_edited", locked)
+
+        self.assertAlmostEqual(sum(values["fixed"] for values in normalized.values()), 1.0)
+        self.assertAlmostEqual(sum(values["variable"] for values in normalized.values()), 1.0)
+        self.assertEqual(normalized[names[0]]["fixed"], 0.3)
+        self.assertEqual(normalized[names[1]]["variable"], 0.1)
+        # 配賦割合そのものは更新しない
+        self.assertNotEqual(data_manager.allocation_ratios[names[0]]["fixed"], 0.3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+計算結果キャッシュのテスト
+保存・復元で内容が変わらず、置き換え・削除後も合計サイズが実際のファイルと一致すること
+"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from utils.data_manager import DataManager
+from utils.result_cache import (
+    ResultCache,
+    dump_allocation,
+    dump_dataframe,
+    load_allocation,
+    load_dataframe,
+    scenario_hash
+)
+
+
+class ScenarioHashTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_manager = DataManager()
+
+    def test_same_inputs_same_hash(self):
+        arrays = self.data_manager.get_department_arrays()
+        self.assertEqual(scenario_hash(arrays), scenario_hash(DataManager().get_department_arrays()))
+        self.assertNotEqual(scenario_hash(arrays), scenario_hash(arrays, exact_yen=True))
+
+    def test_changed_input_changes_hash(self):
+        before = scenario_hash(self.data_manager.get_department_arrays())
+        name = next(iter(self.data_manager.departments))
+        self.data_manager.departments[name]["fixed_cost"] += 1
+        self.assertNotEqual(before, scenario_hash(self.data_manager.get_department_arrays()))
+
+
+class DumpLoadTest(unittest.TestCase):
+
+    def test_allocation_round_trip(self):
+        data_manager = DataManager()
+        for exact_yen in (False, True):
+            data_manager.exact_yen = exact_yen
+            result = data_manager.calculate_allocated_arrays()
+            restored = load_allocation(dump_allocation(result))
+            self.assertEqual(restored.names, result.names)
+            self.assertEqual(set(restored.fields), set(result.fields))
+            for field, values in result.fields.items():
+                self.assertEqual(restored[field].dtype, values.dtype, field)
+                np.testing.assert_array_equal(restored[field], values)
+
+    def test_dataframe_round_trip(self):
+        frame = pd.DataFrame({
+            "事業部": ["キャリア", "ワークス"],
+            "営業利益": [1.5e7, -2.25e6],
+            "件数": [3, 4],
+            "限界利益率": [0.25, np.nan],
+            "更新日": ["2024-04-01", "2024-04-02"]
+        })
+        pd.testing.assert_frame_equal(load_dataframe(dump_dataframe(frame)), frame)
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = self._directory.name
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _disk_bytes(self) -> int:
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, files in os.walk(self.directory) for name in files)
+
+    def _set_last_used(self, cache: ResultCache, key: str, kind: str, seconds: int):
+        os.utime(cache._path(key, kind), ns=(seconds * 10**9, seconds * 10**9))
+
+    def test_put_and_get(self):
+        cache = ResultCache(self.directory)
+        self.assertIsNone(cache.get("ab" * 32, "summary"))
+        cache.put("ab" * 32, "summary", b"data")
+        self.assertEqual(cache.get("ab" * 32, "summary"), b"data")
+        self.assertIsNone(cache.get("ab" * 32, "allocation"))
+
+    def test_replace_keeps_total_bytes(self):
+        cache = ResultCache(self.directory)
+        cache.put("ab" * 32, "summary", b"x" * 100)
+        cache.put("cd" * 32, "summary", b"y" * 50)
+        cache.put("ab" * 32, "summary", b"z" * 30)
+        self.assertEqual(cache.get("ab" * 32, "summary"), b"z" * 30)
+        self.assertEqual(cache.total_bytes, 80)
+        self.assertEqual(cache.total_bytes, self._disk_bytes())
+        # 別のインスタンス（別のプロセス）はディレクトリから合計サイズを求める
+        self.assertEqual(ResultCache(self.directory).total_bytes, 80)
+
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(self.directory, max_bytes=250)
+        keys = ["aa" * 32, "bb" * 32, "cc" * 32]
+        cache.put(keys[0], "summary", b"a" * 100)
+        cache.put(keys[1], "summary", b"b" * 100)
+        self._set_last_used(cache, keys[0], "summary", 1000)
+        self._set_last_used(cache, keys[1], "summary", 2000)
+        # 取得すると最終使用時刻が更新され、keys[1] の方が古くなる
+        self.assertIsNotNone(cache.get(keys[0], "summary"))
+
+        cache.put(keys[2], "summary", b"c" * 100)
+        self.assertIsNone(cache.get(keys[1], "summary"))
+        self.assertEqual(cache.get(keys[0], "summary"), b"a" * 100)
+        self.assertEqual(cache.get(keys[2], "summary"), b"c" * 100)
+        self.assertEqual(cache.total_bytes, 200)
+        self.assertEqual(cache.total_bytes, self._disk_bytes())
+
+    def test_get_or_create_builds_once(self):
+        data_manager = DataManager()
+        key = data_manager.scenario_key()
+        calls = []
+
+        def build():
+            calls.append(1)
+            return data_manager.get_department_arrays().allocate()
+
+        first = ResultCache(self.directory).get_or_create(key, "allocation", build, dump_allocation, load_allocation)
+        second = ResultCache(self.directory).get_or_create(key, "allocation", build, dump_allocation, load_allocation)
+        self.assertEqual(len(calls), 1)
+        np.testing.assert_array_equal(second["implied_sales"], first["implied_sales"])
+
+    def test_cached_summary_matches(self):
+        expected = DataManager().get_summary_data()
+        for _ in range(2):
+            # 1回目は作成して保存、2回目は保存済みの内容を復元
+            data_manager = DataManager()
+            data_manager.result_cache = ResultCache(self.directory)
+            pd.testing.assert_frame_equal(data_manager.get_summary_data(), expected)
+
+    def test_clear(self):
+        cache = ResultCache(self.directory)
+        cache.put("ab" * 32, "summary", b"data")
+        cache.clear()
+        self.assertEqual(cache.total_bytes, 0)
+        self.assertIsNone(cache.get("ab" * 32, "summary"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+計画保存のテスト
+保存したバージョンを同じ内容で読み込めること、バージョンが変更・削除できないこと
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import numpy as np
+
+from utils.data_manager import DataManager
+from utils.scenario_store import ScenarioStore
+
+
+class ScenarioStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._directory.name, "scenarios.db")
+        self.store = ScenarioStore(self.path)
+        self.data_manager = DataManager()
+        names = list(self.data_manager.departments.keys())
+        self.data_manager.cost_transfers = {f"{names[0]}_fixed": -1e6, f"{names[1]}_fixed": 1e6}
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_round_trip(self):
+        arrays = self.data_manager.get_department_arrays()
+        result = self.data_manager.calculate_allocated_arrays()
+        self.store.save("予算案", arrays, result, owner="user", tags=["承認済"], note="初版")
+
+        plan = self.store.load("予算案", owner="user")
+        self.assertEqual((plan["version"], plan["note"], plan["tags"]), (1, "初版", ["承認済"]))
+        loaded = plan["arrays"]
+        self.assertEqual(loaded.names, arrays.names)
+        for field in ("margin_rate", "fixed_cost", "variable_cost", "ratios", "transfers"):
+            np.testing.assert_array_equal(getattr(loaded, field), getattr(arrays, field))
+        self.assertEqual(loaded.headquarters_fixed_cost, arrays.headquarters_fixed_cost)
+        self.assertEqual(loaded.headquarters_variable_cost, arrays.headquarters_variable_cost)
+        for field, values in result.fields.items():
+            np.testing.assert_array_equal(plan["result"][field], values)
+        # 読み込んだ入力から再計算しても同じ結果
+        np.testing.assert_array_equal(loaded.allocate()["fixed_cost"], result["fixed_cost"])
+
+    def test_versions_are_kept(self):
+        arrays = self.data_manager.get_department_arrays()
+        self.store.save("予算案", arrays)
+        self.data_manager.headquarters_fixed_cost *= 2
+        self.store.save("予算案", self.data_manager.get_department_arrays(), note="本部固定費を変更")
+
+        self.assertEqual([v["version"] for v in self.store.list_versions("予算案")], [2, 1])
+        self.assertEqual(self.store.load("予算案")["version"], 2)
+        first = self.store.load("予算案", version=1)
+        self.assertEqual(first["arrays"].headquarters_fixed_cost, arrays.headquarters_fixed_cost)
+        self.assertIsNone(first["result"])
+        with self.assertRaises(KeyError):
+            self.store.load("予算案", version=3)
+
+    def test_versions_are_immutable(self):
+        self.store.save("予算案", self.data_manager.get_department_arrays())
+        connection = sqlite3.connect(self.path)
+        try:
+            with self.assertRaises(sqlite3.DatabaseError):
+                connection.execute("UPDATE plan_versions SET note = 'x'")
+            with self.assertRaises(sqlite3.DatabaseError):
+                connection.execute("DELETE FROM plan_versions")
+        finally:
+            connection.close()
+        self.assertEqual(self.store.load("予算案")["note"], "")
+
+    def test_save_many_is_atomic(self):
+        arrays = self.data_manager.get_department_arrays()
+        with self.assertRaises(KeyError):
+            self.store.save_many([{"name": "案A", "arrays": arrays}, {"name": "案B"}])
+        self.assertEqual(self.store.list_plans(), [])
+
+    def test_list_by_owner_and_tag(self):
+        arrays = self.data_manager.get_department_arrays()
+        self.store.save_many([
+            {"name": "案A", "arrays": arrays, "owner": "alice", "tags": ["承認済"]},
+            {"name": "案B", "arrays": arrays, "owner": "alice"},
+            {"name": "案A", "arrays": arrays, "owner": "bob", "tags": ["承認済"]}
+        ])
+        self.assertEqual({plan["name"] for plan in self.store.list_plans(owner="alice")}, {"案A", "案B"})
+        self.assertEqual({plan["owner"] for plan in self.store.list_plans(tag="承認済")}, {"alice", "bob"})
+        # 最新バージョンにタグがない計画は一覧のタグ検索に含めず、タグの付いたバージョンは検索できる
+        self.store.save("案A", arrays, owner="alice")
+        self.assertEqual([plan["owner"] for plan in self.store.list_plans(tag="承認済")], ["bob"])
+        self.assertEqual([(v["owner"], v["version"]) for v in self.store.find_versions("承認済", owner="alice")],
+                         [("alice", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
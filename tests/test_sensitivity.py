@@ -0,0 +1,120 @@
+"""
+感応度分析のテスト
+compute_sensitivity の解析的な偏微分を中心差分による数値微分と比較
+"""
+
+import unittest
+
+import numpy as np
+
+from utils.allocation_engine import DepartmentArrays, break_even_point, compute_allocation, operating_profit
+from utils.data_manager import DataManager
+from utils.sensitivity import SENSITIVITY_METRICS, compute_sensitivity
+
+
+def _metrics(margin_rate, fixed_cost, variable_cost, ratios, transfers, hq_fixed, hq_variable):
+    """配賦後の指標（SENSITIVITY_METRICS の並び）を (3, N) 配列で計算"""
+    allocated = compute_allocation(margin_rate, fixed_cost, variable_cost, ratios[:, 0], ratios[:, 1],
+                                   hq_fixed, hq_variable, transfers[:, 0], transfers[:, 1])
+    values = {
+        "margin_rate": allocated["margin_rate"],
+        "break_even_point": break_even_point(allocated["fixed_cost"], allocated["margin_rate"]),
+        "operating_profit": operating_profit(allocated["implied_sales"], allocated["fixed_cost"])
+    }
+    return np.stack([values[metric] for metric in SENSITIVITY_METRICS])
+
+
+class CentralDifferenceTest(unittest.TestCase):
+    """解析的な偏微分と中心差分の比較"""
+
+    def setUp(self):
+        data_manager = DataManager()
+        data_manager.update_allocation_ratios({
+            "キャリア": {"fixed": 0.30, "variable": 0.10},
+            "インサイド": {"fixed": 0.25, "variable": 0.30},
+            "フィールド": {"fixed": 0.05, "variable": 0.15},
+            "SP": {"fixed": 0.20, "variable": 0.25},
+            "飲食": {"fixed": 0.20, "variable": 0.20}
+        })
+        data_manager.cost_transfers = {"SP_fixed": 1_500_000, "飲食_fixed": -1_500_000, "キャリア_variable": 200_000}
+        self.arrays = data_manager.get_department_arrays()
+        self.sensitivity = compute_sensitivity(self.arrays)
+
+    def _evaluate(self, ratios=None, transfers=None, hq_fixed=None, hq_variable=None) -> np.ndarray:
+        arrays = self.arrays
+        return _metrics(
+            arrays.margin_rate, arrays.fixed_cost, arrays.variable_cost,
+            arrays.ratios if ratios is None else ratios,
+            arrays.transfers if transfers is None else transfers,
+            arrays.headquarters_fixed_cost if hq_fixed is None else hq_fixed,
+            arrays.headquarters_variable_cost if hq_variable is None else hq_variable
+        )
+
+    def _assert_matches(self, analytic: np.ndarray, numeric: np.ndarray, metric: str, label: str):
+        # 指標ごとの桁の違いを吸収するため、ヤコビアン全体の大きさに対する相対誤差で比較
+        scale = max(np.abs(numeric).max(), 1e-12)
+        np.testing.assert_allclose(analytic, numeric, rtol=1e-6, atol=1e-7 * scale, err_msg=f"{metric}: {label}")
+
+    def test_ratios(self):
+        n = len(self.arrays)
+        step = 1e-6
+        numeric = np.zeros((len(SENSITIVITY_METRICS), n, 2 * n))
+        for column in range(2):
+            for j in range(n):
+                plus = self.arrays.ratios.copy()
+                minus = self.arrays.ratios.copy()
+                plus[j, column] += step
+                minus[j, column] -= step
+                numeric[:, :, column * n + j] = (self._evaluate(ratios=plus) - self._evaluate(ratios=minus)) / (2 * step)
+        for k, metric in enumerate(SENSITIVITY_METRICS):
+            self._assert_matches(self.sensitivity[metric]["ratios"], numeric[k], metric, "ratios")
+
+    def test_hq_costs(self):
+        step = 1.0
+        hq_fixed = self.arrays.headquarters_fixed_cost
+        hq_variable = self.arrays.headquarters_variable_cost
+        d_fixed = (self._evaluate(hq_fixed=hq_fixed + step) - self._evaluate(hq_fixed=hq_fixed - step)) / (2 * step)
+        d_variable = (self._evaluate(hq_variable=hq_variable + step)
+                      - self._evaluate(hq_variable=hq_variable - step)) / (2 * step)
+        for k, metric in enumerate(SENSITIVITY_METRICS):
+            numeric = np.column_stack([d_fixed[k], d_variable[k]])
+            self._assert_matches(self.sensitivity[metric]["hq_costs"], numeric, metric, "hq_costs")
+
+    def test_transfers(self):
+        n = len(self.arrays)
+        step = 1.0
+        numeric = np.zeros((len(SENSITIVITY_METRICS), n, 2 * n))
+        for column in range(2):
+            for j in range(n):
+                plus = self.arrays.transfers.copy()
+                minus = self.arrays.transfers.copy()
+                plus[j, column] += step
+                minus[j, column] -= step
+                numeric[:, :, column * n + j] = (self._evaluate(transfers=plus)
+                                                 - self._evaluate(transfers=minus)) / (2 * step)
+        for k, metric in enumerate(SENSITIVITY_METRICS):
+            self._assert_matches(self.sensitivity[metric]["transfers"], numeric[k], metric, "transfers")
+
+    def test_random_departments(self):
+        # 事業部データ・配賦割合を変えても一致すること（対角ブロック以外は0）
+        rng = np.random.default_rng(0)
+        n = 8
+        ratios = rng.dirichlet(np.ones(n), size=2).T
+        self.arrays = DepartmentArrays(
+            [f"事業部{i}" for i in range(n)],
+            rng.uniform(0.3, 0.7, n),
+            rng.uniform(1e6, 3e7, n),
+            rng.uniform(1e5, 1e7, n),
+            ratios,
+            rng.uniform(-1e5, 1e5, (n, 2)),
+            5e7,
+            1e7
+        )
+        self.sensitivity = compute_sensitivity(self.arrays)
+        self.test_ratios()
+        self.test_hq_costs()
+        self.test_transfers()
+
+
+if __name__ == "__main__":
+    unittest.main()
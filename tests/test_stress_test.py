@@ -0,0 +1,80 @@
+"""
+ストレステストのテスト
+費用の増加・限界利益率の低下のショックで営業利益が増えないこと
+"""
+
+import unittest
+
+import numpy as np
+
+from utils.allocation_engine import DepartmentArrays
+from utils.data_manager import DataManager
+from utils.stress_test import StressTester, default_shocks
+
+
+def _random_plan(rng: np.random.Generator, names) -> DepartmentArrays:
+    n = len(names)
+    return DepartmentArrays(
+        list(names),
+        rng.uniform(0.2, 0.8, n),
+        rng.uniform(1e6, 3e7, n),
+        rng.uniform(1e5, 2e7, n),
+        rng.dirichlet(np.ones(n), size=2).T,
+        rng.uniform(-1e5, 1e5, (n, 2)),
+        rng.uniform(1e7, 5e7),
+        rng.uniform(1e6, 1e7)
+    )
+
+
+class CostShockTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        data_manager = DataManager()
+        self.names = list(data_manager.departments.keys())
+        plans = {"現在の計画": data_manager.get_department_arrays()}
+        plans.update({f"計画{i}": _random_plan(rng, self.names) for i in range(4)})
+        self.tester = StressTester(plans)
+
+    def _cost_increase_shocks(self):
+        # 本部変動費の配賦額は必要な売上総利益の増加として仮の売上総利益に加算されるため対象外
+        shocks = [
+            {"name": "本部固定費 +15%", "changes": [
+                {"target": "headquarters_fixed_cost", "operation": "multiply", "value": 1.15}]},
+            {"name": "固定費 +10%", "changes": [{"target": "fixed_cost", "operation": "multiply", "value": 1.1}]},
+            {"name": "変動費 ×2", "changes": [{"target": "variable_cost", "operation": "multiply", "value": 2.0}]},
+            {"name": "変動費 +100万円", "changes": [{"target": "variable_cost", "operation": "add", "value": 1e6}]},
+            {"name": "限界利益率 -3pt・変動費 ×1.5", "changes": [
+                {"target": "margin_rate", "operation": "add", "value": -0.03},
+                {"target": "variable_cost", "operation": "multiply", "value": 1.5}]}
+        ]
+        for dept_name in self.names:
+            shocks.append({"name": f"{dept_name}の変動費 ×3", "changes": [
+                {"target": "variable_cost", "operation": "multiply", "value": 3.0, "departments": [dept_name]}]})
+        return shocks
+
+    def test_cost_increase_never_raises_profit(self):
+        result = self.tester.run(self._cost_increase_shocks())
+        base = result["base_profit"][None, :, :]
+        tolerance = 1e-6 * np.maximum(1.0, np.abs(base))
+        self.assertTrue(np.all(result["shocked_profit"] <= base + tolerance))
+
+    def test_default_department_shocks_never_raise_profit(self):
+        shocks = [shock for shock in default_shocks(self.names)
+                  if all(change["target"] != "headquarters_variable_cost" for change in shock["changes"])]
+        result = self.tester.run(shocks)
+        base = result["base_profit"][None, :, :]
+        self.assertTrue(np.all(result["shocked_profit"] <= base + 1e-6 * np.maximum(1.0, np.abs(base))))
+        # 事業部ごとのショックは対象の事業部の営業利益を下げる
+        offset = len(shocks) - len(self.names)
+        for i in range(len(self.names)):
+            self.assertTrue(np.all(result["shocked_profit"][offset + i, :, i] < result["base_profit"][:, i]))
+
+    def test_variable_cost_shock_keeps_implied_sales(self):
+        shock = {"name": "変動費 ×2", "changes": [{"target": "variable_cost", "operation": "multiply", "value": 2.0}]}
+        result = self.tester.run([shock])
+        np.testing.assert_allclose(result["shocked_profit"][0], result["base_profit"], rtol=1e-9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+配賦基準モジュール
+人員数・売上総利益・床面積・件数などの配賦基準（ドライバー）から配賦割合を行列演算で算出
+"""
+
+import numpy as np
+from typing import Dict, List, Mapping, Sequence, Union
+
+# DataManagerの事業部データから作成できる配賦基準
+BUILTIN_DRIVERS = {
+    "equal": "均等",
+    "implied_sales": "仮の売上総利益",
+    "fixed_cost": "事業部固定費",
+    "variable_cost": "事業部変動費"
+}
+
+# 配賦基準の指定: 単一の基準名、または {基準名: 重み} による複合基準
+Basis = Union[str, Mapping[str, float]]
+
+
+class AllocationBasis:
+    """事業部 × 配賦基準 の表から配賦割合を算出するクラス"""
+
+    def __init__(self, names: Sequence[str], drivers: Mapping[str, Sequence[float]]):
+        """
+        Args:
+            names: 事業部名
+            drivers: {基準名: 事業部順の値}（例: {"headcount": [12, 30, 8, 15, 10]}）
+        """
+        self.names = list(names)
+        self.driver_names = list(drivers.keys())
+        self.table = np.column_stack([np.asarray(values, dtype=float) for values in drivers.values()]) \
+            if drivers else np.empty((len(self.names), 0))
+        if self.table.shape[0] != len(self.names):
+            raise ValueError(f"配賦基準の行数が事業部数と一致しません: {self.table.shape[0]} != {len(self.names)}")
+        if np.any(self.table < 0):
+            raise ValueError("配賦基準の値は0以上である必要があります")
+
+        totals = self.table.sum(axis=0)
+        if np.any(totals <= 0):
+            empty = [name for name, total in zip(self.driver_names, totals) if total <= 0]
+            raise ValueError(f"合計が0の配賦基準があります: {empty}")
+
+        # 基準ごとの構成比 (N, D)
+        self.shares = self.table / totals
+        self._driver_index = {name: i for i, name in enumerate(self.driver_names)}
+
+    @classmethod
+    def from_department_arrays(cls, arrays, extra_drivers: Mapping[str, Sequence[float]] = None) -> "AllocationBasis":
+        """
+        事業部データから作成できる配賦基準（BUILTIN_DRIVERS）に、外部の基準表を加えて作成
+
+        Args:
+            arrays: DataManager.get_department_arrays() の結果
+            extra_drivers: 追加の配賦基準（人員数・床面積など）
+        """
+        drivers = {
+            "equal": np.ones(len(arrays)),
+            "implied_sales": arrays.variable_cost / (1 - arrays.margin_rate),
+            "fixed_cost": arrays.fixed_cost,
+            "variable_cost": arrays.variable_cost
+        }
+        if extra_drivers:
+            drivers.update(extra_drivers)
+        return cls(arrays.names, drivers)
+
+    def weight_matrix(self, bases: Sequence[Basis]) -> np.ndarray:
+        """
+        配賦基準の指定をコストプール × 基準 の重み行列 (P, D) に変換（各行の合計は1）
+
+        Args:
+            bases: コストプールごとの配賦基準
+        """
+        weights = np.zeros((len(bases), len(self.driver_names)))
+        for p, basis in enumerate(bases):
+            if isinstance(basis, str):
+                basis = {basis: 1.0}
+            for driver, weight in basis.items():
+                if driver not in self._driver_index:
+                    raise ValueError(f"未定義の配賦基準です: {driver}")
+                weights[p, self._driver_index[driver]] += weight
+        totals = weights.sum(axis=1, keepdims=True)
+        if np.any(totals <= 0):
+            raise ValueError("配賦基準の重みの合計は正である必要があります")
+        return weights / totals
+
+    def ratios(self, bases: Sequence[Basis]) -> np.ndarray:
+        """
+        コストプールごとの配賦割合を計算
+
+        各基準の構成比 (N, D) と重み行列 (P, D) の積で、複合基準も1回の行列積で求める
+
+        Returns:
+            配賦割合 (N, P)。各列の合計は1
+        """
+        return self.shares @ self.weight_matrix(bases).T
+
+    def allocation_ratios(self, fixed_basis: Basis, variable_basis: Basis) -> Dict[str, Dict[str, float]]:
+        """本部固定費・本部変動費の配賦基準から DataManager.allocation_ratios 形式の配賦割合を計算"""
+        ratios = self.ratios([fixed_basis, variable_basis])
+        return {
+            name: {"fixed": float(ratios[i, 0]), "variable": float(ratios[i, 1])}
+            for i, name in enumerate(self.names)
+        }
+
+    def available_drivers(self) -> List[str]:
+        """利用可能な配賦基準名の一覧"""
+        return list(self.driver_names)
@@ -0,0 +1,379 @@
+"""
+配賦計算エンジン
+事業部データをNumPy配列（Struct of Arrays）で保持し、配賦計算を一括で行う
+"""
+
+import numpy as np
+from typing import Dict, List
+
+# calculate_allocated_costs が返す各事業部の項目（表示順）
+ALLOCATED_FIELDS = (
+    "original_margin_rate",
+    "margin_rate",
+    "original_implied_sales",
+    "implied_sales",
+    "sales_increase",
+    "fixed_cost",
+    "variable_cost",
+    "original_fixed",
+    "original_variable",
+    "hq_fixed_allocated",
+    "hq_variable_allocated",
+    "transfer_fixed",
+    "transfer_variable"
+)
+
+
+def compute_allocation(margin_rate, fixed_cost, variable_cost,
+                       fixed_ratio, variable_ratio,
+                       hq_fixed_cost, hq_variable_cost,
+                       transfer_fixed=0.0, transfer_variable=0.0) -> Dict[str, np.ndarray]:
+    """
+    配賦後の各項目を一括で計算（売上総利益調整版）
+
+    引数はすべてNumPyのブロードキャスト規則に従うため、
+    (事業部,) だけでなく (シナリオ, 事業部) などの配列もそのまま渡せる
+
+    Returns:
+        ALLOCATED_FIELDS をキーとする配列の辞書
+    """
+    # 元の仮の売上総利益 = 変動費 / (1 - 限界利益率)
+    original_implied_sales = variable_cost / (1 - margin_rate)
+
+    # 本部費用の配賦分
+    hq_fixed_allocated = hq_fixed_cost * fixed_ratio
+    hq_variable_allocated = hq_variable_cost * variable_ratio
+
+    # 配賦後の売上総利益（本部変動費分を加算）
+    allocated_sales = original_implied_sales + hq_variable_allocated
+
+    # 総コスト
+    total_fixed = fixed_cost + hq_fixed_allocated + transfer_fixed
+    total_variable = variable_cost + hq_variable_allocated + transfer_variable
+
+    # 配賦後の限界利益率
+    new_margin_rate = (allocated_sales - total_variable) / allocated_sales
+
+    shape = np.broadcast(new_margin_rate, total_fixed, original_implied_sales).shape
+    return {
+        "original_margin_rate": np.broadcast_to(margin_rate, shape),
+        "margin_rate": new_margin_rate,
+        "original_implied_sales": np.broadcast_to(original_implied_sales, shape),
+        "implied_sales": allocated_sales,
+        "sales_increase": np.broadcast_to(hq_variable_allocated, shape),
+        "fixed_cost": total_fixed,
+        "variable_cost": total_variable,
+        "original_fixed": np.broadcast_to(fixed_cost, shape),
+        "original_variable": np.broadcast_to(variable_cost, shape),
+        "hq_fixed_allocated": np.broadcast_to(hq_fixed_allocated, shape),
+        "hq_variable_allocated": np.broadcast_to(hq_variable_allocated, shape),
+        "transfer_fixed": np.broadcast_to(transfer_fixed, shape),
+        "transfer_variable": np.broadcast_to(transfer_variable, shape)
+    }
+
+
+def round_preserving_sum(amounts) -> np.ndarray:
+    """
+    金額を円単位（int64）に丸め、丸め後の合計を丸め前の合計の四捨五入値に一致させる（最大剰余法）
+
+    各値を切り捨てたうえで、不足する円数を端数の大きい順に1円ずつ加算する。
+    端数が同じ場合は先の要素を優先するため、結果は入力の並びに対して決定的になる。
+    計算量は1行の場合 O(N)（複数行で不足する円数が行ごとに異なる場合は O(N log N)、不足がない行は切り捨てのみ）
+
+    Args:
+        amounts: 金額の配列 (..., N)。最後の軸ごとに合計を保つ
+
+    Returns:
+        円単位の金額 (..., N)
+    """
+    amounts = np.asarray(amounts, dtype=float)
+    floors = np.floor(amounts)
+    remainders = amounts - floors
+    shortfall = (np.rint(amounts.sum(axis=-1, keepdims=True)) - floors.sum(axis=-1, keepdims=True)).astype(np.int64)
+    result = floors.astype(np.int64)
+
+    # 端数の加算が必要な行のみ処理（負担調整がない場合などは切り捨てのみで合計が一致する）
+    n = amounts.shape[-1]
+    if amounts.ndim == 1:
+        return _round_up_largest(result, remainders, int(shortfall[0]))
+    rows = np.flatnonzero(shortfall > 0)
+    if rows.size == 0:
+        return result
+    remainders = remainders.reshape(-1, n)[rows]
+    shortfall = shortfall.reshape(-1, 1)[rows]
+
+    # shortfall 番目に大きい端数をしきい値とし、しきい値より大きい端数と、
+    # しきい値と同じ端数のうち先頭から不足分だけを加算。しきい値の位置が全行で同じ場合（1行のみの場合を含む）は
+    # 部分的な並べ替え（O(N)）で求める（位置が行ごとに異なる場合は複数位置の部分並べ替えより全体の並べ替えが速い）
+    kth = n - np.minimum(shortfall, n)
+    positions = np.unique(kth)
+    ordered = np.partition(remainders, positions[0], axis=-1) if positions.size == 1 else np.sort(remainders, axis=-1)
+    threshold = np.take_along_axis(ordered, kth, axis=-1)
+    above = remainders > threshold
+    ties = remainders == threshold
+    needed = shortfall - above.sum(axis=-1, keepdims=True)
+    rounded_up = above | ties
+    excess = np.flatnonzero(ties.sum(axis=-1) > needed[:, 0])
+    if excess.size > 0:
+        rounded_up[excess] = above[excess] | (ties[excess] & (np.cumsum(ties[excess], axis=-1) <= needed[excess]))
+    result.reshape(-1, n)[rows] += rounded_up
+    return result
+
+
+def _round_up_largest(result: np.ndarray, remainders: np.ndarray, shortfall: int) -> np.ndarray:
+    """1行の場合の round_preserving_sum（端数の大きい順に shortfall 円を result にそのまま加算）"""
+    if shortfall <= 0:
+        return result
+    kth = len(remainders) - min(shortfall, len(remainders))
+    threshold = np.partition(remainders, kth)[kth]
+    above = remainders > threshold
+    ties = np.flatnonzero(remainders == threshold)
+    result += above
+    result[ties[:shortfall - np.count_nonzero(above)]] += 1
+    return result
+
+
+def _round_transfers(transfers, shape) -> np.ndarray:
+    """負担調整額を円単位に丸め（負担調整がない場合は丸めを省略）"""
+    transfers = np.broadcast_to(np.asarray(transfers, dtype=float), shape)
+    if not transfers.any():
+        return np.zeros(shape, dtype=np.int64)
+    return round_preserving_sum(transfers)
+
+
+def compute_allocation_exact(margin_rate, fixed_cost, variable_cost,
+                             fixed_ratio, variable_ratio,
+                             hq_fixed_cost, hq_variable_cost,
+                             transfer_fixed=0.0, transfer_variable=0.0) -> Dict[str, np.ndarray]:
+    """
+    配賦後の各項目を円単位の整数（int64）で計算
+
+    本部費用の配賦額と負担調整額は最大剰余法で丸めるため、配賦額の合計は本部費用に
+    （配賦割合の合計が1の場合）、負担調整額の合計は丸め前の合計に1円単位で一致する。
+    金額以外（限界利益率）は浮動小数点のまま
+
+    Args:
+        compute_allocation と同じ（事業部の軸は最後の軸）
+
+    Returns:
+        ALLOCATED_FIELDS をキーとする配列の辞書
+    """
+    margin_rate = np.asarray(margin_rate, dtype=float)
+    fixed_cost = np.rint(fixed_cost).astype(np.int64)
+    variable_cost = np.rint(variable_cost).astype(np.int64)
+    shape = np.broadcast(margin_rate, fixed_cost, variable_cost,
+                         np.asarray(fixed_ratio), np.asarray(variable_ratio)).shape
+
+    # 丸め前の配列はこの関数内でのみ使うため、中間結果はその場で丸め・加算して配列の確保を減らす
+    implied_sales = variable_cost / (1 - margin_rate)
+    original_implied_sales = np.rint(implied_sales, out=implied_sales).astype(np.int64)
+    hq_fixed_allocated = round_preserving_sum(
+        np.broadcast_to(np.asarray(hq_fixed_cost, dtype=float) * fixed_ratio, shape))
+    hq_variable_allocated = round_preserving_sum(
+        np.broadcast_to(np.asarray(hq_variable_cost, dtype=float) * variable_ratio, shape))
+    transfer_fixed = _round_transfers(transfer_fixed, shape)
+    transfer_variable = _round_transfers(transfer_variable, shape)
+
+    allocated_sales = original_implied_sales + hq_variable_allocated
+    total_fixed = fixed_cost + hq_fixed_allocated
+    total_fixed += transfer_fixed
+    total_variable = variable_cost + hq_variable_allocated
+    total_variable += transfer_variable
+    new_margin_rate = np.subtract(allocated_sales, total_variable, dtype=float)
+    new_margin_rate /= allocated_sales
+
+    return {
+        "original_margin_rate": np.broadcast_to(margin_rate, shape),
+        "margin_rate": new_margin_rate,
+        "original_implied_sales": np.broadcast_to(original_implied_sales, shape),
+        "implied_sales": allocated_sales,
+        "sales_increase": hq_variable_allocated,
+        "fixed_cost": total_fixed,
+        "variable_cost": total_variable,
+        "original_fixed": np.broadcast_to(fixed_cost, shape),
+        "original_variable": np.broadcast_to(variable_cost, shape),
+        "hq_fixed_allocated": hq_fixed_allocated,
+        "hq_variable_allocated": hq_variable_allocated,
+        "transfer_fixed": transfer_fixed,
+        "transfer_variable": transfer_variable
+    }
+
+
+def break_even_point(fixed_cost, margin_rate):
+    """損益分岐点 = 固定費 / 限界利益率"""
+    return fixed_cost / margin_rate
+
+
+def operating_profit(implied_sales, fixed_cost):
+    """営業利益（仮の売上総利益から固定費を引いた額。営業利益状態の判定と同じ定義）"""
+    return implied_sales - fixed_cost
+
+
+class AllocationResult:
+    """配賦計算結果（各項目を事業部順の配列で保持）"""
+
+    def __init__(self, names: List[str], fields: Dict[str, np.ndarray]):
+        self.names = names
+        self.fields = fields
+        self._index = {name: i for i, name in enumerate(names)}
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.fields[field]
+
+    def index_of(self, dept_name: str) -> int:
+        """事業部名から配列の添字を取得"""
+        return self._index[dept_name]
+
+    def row(self, dept_name: str) -> Dict:
+        """指定した事業部の項目を辞書で取得"""
+        i = self._index[dept_name]
+        return {field: float(self.fields[field][i]) for field in ALLOCATED_FIELDS}
+
+    def freeze(self) -> "AllocationResult":
+        """各配列を読み取り専用にする（キャッシュとして共有する場合に使用）"""
+        for values in self.fields.values():
+            values.flags.writeable = False
+        return self
+
+    def to_dict(self) -> Dict:
+        """calculate_allocated_costs 互換の辞書に変換"""
+        columns = [self.fields[field].tolist() for field in ALLOCATED_FIELDS]
+        return {
+            name: dict(zip(ALLOCATED_FIELDS, values))
+            for name, values in zip(self.names, zip(*columns))
+        }
+
+
+class DepartmentArrays:
+    """事業部データと配賦条件を連続配列で保持するクラス"""
+
+    def __init__(self, names: List[str], margin_rate: np.ndarray, fixed_cost: np.ndarray,
+                 variable_cost: np.ndarray, ratios: np.ndarray, transfers: np.ndarray,
+                 headquarters_fixed_cost: float, headquarters_variable_cost: float):
+        """
+        Args:
+            names: 事業部名（配列の並び順）
+            margin_rate: 限界利益率 (N,)
+            fixed_cost: 事業部固有の固定費 (N,)
+            variable_cost: 事業部固有の変動費 (N,)
+            ratios: 本部費用の配賦割合 (N, 2)。列0が固定費、列1が変動費
+            transfers: 事業部間の負担調整額 (N, 2)。列0が固定費、列1が変動費
+            headquarters_fixed_cost: 本部固定費
+            headquarters_variable_cost: 本部変動費
+        """
+        self.names = list(names)
+        self.margin_rate = np.ascontiguousarray(margin_rate, dtype=float)
+        self.fixed_cost = np.ascontiguousarray(fixed_cost, dtype=float)
+        self.variable_cost = np.ascontiguousarray(variable_cost, dtype=float)
+        self.ratios = np.ascontiguousarray(ratios, dtype=float).reshape(len(self.names), 2)
+        self.transfers = np.ascontiguousarray(transfers, dtype=float).reshape(len(self.names), 2)
+        self.headquarters_fixed_cost = float(headquarters_fixed_cost)
+        self.headquarters_variable_cost = float(headquarters_variable_cost)
+
+    @classmethod
+    def from_dicts(cls, departments: Dict, allocation_ratios: Dict, cost_transfers: Dict,
+                   headquarters_fixed_cost: float, headquarters_variable_cost: float) -> "DepartmentArrays":
+        """DataManagerの辞書形式のデータから配列を構築"""
+        names = list(departments.keys())
+        n = len(names)
+
+        margin_rate = np.fromiter((departments[d]["margin_rate"] for d in names), dtype=float, count=n)
+        fixed_cost = np.fromiter((departments[d]["fixed_cost"] for d in names), dtype=float, count=n)
+        variable_cost = np.fromiter((departments[d]["variable_cost"] for d in names), dtype=float, count=n)
+
+        ratios = np.empty((n, 2))
+        ratios[:, 0] = np.fromiter((allocation_ratios[d]["fixed"] for d in names), dtype=float, count=n)
+        ratios[:, 1] = np.fromiter((allocation_ratios[d]["variable"] for d in names), dtype=float, count=n)
+
+        transfers = np.zeros((n, 2))
+        if cost_transfers:
+            transfers[:, 0] = np.fromiter((cost_transfers.get(f"{d}_fixed", 0) for d in names), dtype=float, count=n)
+            transfers[:, 1] = np.fromiter((cost_transfers.get(f"{d}_variable", 0) for d in names), dtype=float, count=n)
+
+        return cls(names, margin_rate, fixed_cost, variable_cost, ratios, transfers,
+                   headquarters_fixed_cost, headquarters_variable_cost)
+
+    def to_dicts(self) -> Dict:
+        """DataManagerの辞書形式（from_dicts の逆変換）に変換"""
+        departments = {
+            name: {"margin_rate": margin_rate, "fixed_cost": fixed_cost, "variable_cost": variable_cost}
+            for name, margin_rate, fixed_cost, variable_cost in zip(
+                self.names, self.margin_rate.tolist(), self.fixed_cost.tolist(), self.variable_cost.tolist())
+        }
+        allocation_ratios = {
+            name: {"fixed": fixed, "variable": variable}
+            for name, (fixed, variable) in zip(self.names, self.ratios.tolist())
+        }
+        cost_transfers = {}
+        for name, (fixed, variable) in zip(self.names, self.transfers.tolist()):
+            if fixed != 0:
+                cost_transfers[f"{name}_fixed"] = fixed
+            if variable != 0:
+                cost_transfers[f"{name}_variable"] = variable
+        return {
+            "departments": departments,
+            "allocation_ratios": allocation_ratios,
+            "cost_transfers": cost_transfers,
+            "headquarters_fixed_cost": self.headquarters_fixed_cost,
+            "headquarters_variable_cost": self.headquarters_variable_cost
+        }
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def freeze(self) -> "DepartmentArrays":
+        """各配列を読み取り専用にする（キャッシュとして共有する場合に使用）"""
+        for values in (self.margin_rate, self.fixed_cost, self.variable_cost, self.ratios, self.transfers):
+            values.flags.writeable = False
+        return self
+
+    def allocate(self, exact: bool = False) -> AllocationResult:
+        """
+        全事業部の配賦後の項目を一括で計算
+
+        Args:
+            exact: Trueの場合、金額を円単位の整数で計算（compute_allocation_exact）
+        """
+        compute = compute_allocation_exact if exact else compute_allocation
+        fields = compute(
+            self.margin_rate,
+            self.fixed_cost,
+            self.variable_cost,
+            self.ratios[:, 0],
+            self.ratios[:, 1],
+            self.headquarters_fixed_cost,
+            self.headquarters_variable_cost,
+            self.transfers[:, 0],
+            self.transfers[:, 1]
+        )
+        return AllocationResult(self.names, fields)
+
+    def reallocate(self, previous: AllocationResult, indices) -> AllocationResult:
+        """
+        指定した事業部のみ再計算し、それ以外の事業部は前回の配賦計算結果を使用
+
+        本部費用・配賦割合・負担調整が前回と同じ場合、各事業部の配賦後の項目は
+        その事業部の入力のみで決まるため、入力が変わった事業部だけ計算すればよい
+
+        Args:
+            previous: 前回の配賦計算結果（事業部の並びが同じこと）
+            indices: 再計算する事業部の添字
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        partial = compute_allocation(
+            self.margin_rate[indices],
+            self.fixed_cost[indices],
+            self.variable_cost[indices],
+            self.ratios[indices, 0],
+            self.ratios[indices, 1],
+            self.headquarters_fixed_cost,
+            self.headquarters_variable_cost,
+            self.transfers[indices, 0],
+            self.transfers[indices, 1]
+        )
+        fields = {}
+        for field in ALLOCATED_FIELDS:
+            values = np.array(previous[field], dtype=float)
+            values[indices] = partial[field]
+            fields[field] = values
+        return AllocationResult(self.names, fields)
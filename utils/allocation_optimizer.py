@@ -0,0 +1,205 @@
+"""
+配賦割合最適化モジュール
+DataManagerの配賦計算を用いて、指定した目的関数を最小化する配賦割合を探索
+"""
+
+import time
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+from utils.allocation_engine import compute_allocation
+from utils.ratio_normalizer import bounds_arrays, project_to_simplex
+
+# 利用可能な目的関数
+OBJECTIVES = {
+    "margin_dispersion": "配賦後限界利益率のばらつき（分散）",
+    "max_bep_ratio": "損益分岐点 / 配賦後売上総利益 の最大値",
+    "distance": "現在の配賦割合からの距離"
+}
+
+# max_bep_ratio の水準探索（二分法）の反復回数
+_LEVEL_SEARCH_ITERATIONS = 100
+
+
+class AllocationOptimizer:
+    """本部費用の配賦割合を最適化するクラス"""
+
+    def __init__(self, data_manager):
+        """
+        Args:
+            data_manager: 事業部データを保持するDataManager
+        """
+        self.data_manager = data_manager
+
+    def _allocate(self, ratios: np.ndarray) -> Dict[str, np.ndarray]:
+        """配賦割合 (N, 2) に対する配賦後の各項目を計算"""
+        arrays = self.data_manager.get_department_arrays()
+        return compute_allocation(
+            arrays.margin_rate,
+            arrays.fixed_cost,
+            arrays.variable_cost,
+            ratios[:, 0],
+            ratios[:, 1],
+            arrays.headquarters_fixed_cost,
+            arrays.headquarters_variable_cost,
+            arrays.transfers[:, 0],
+            arrays.transfers[:, 1]
+        )
+
+    def _evaluate(self, objective: str, ratios: np.ndarray, current: np.ndarray) -> Tuple[float, np.ndarray]:
+        """平滑な目的関数の値と配賦割合に関する勾配 (N, 2) を計算"""
+        if objective == "distance":
+            diff = ratios - current
+            return 0.5 * float(np.sum(diff * diff)), diff
+
+        if objective == "margin_dispersion":
+            # 限界利益率 m = (S - V) / S は変動費配賦率のみに依存
+            # dm/dv = -m * 本部変動費 / S
+            arrays = self.data_manager.get_department_arrays()
+            allocated = self._allocate(ratios)
+            margin_rate = allocated["margin_rate"]
+            deviation = margin_rate - margin_rate.mean()
+            d_margin_d_variable = -margin_rate * arrays.headquarters_variable_cost / allocated["implied_sales"]
+            gradient = np.zeros_like(ratios)
+            gradient[:, 1] = 2 * deviation / len(margin_rate) * d_margin_d_variable
+            return float(np.mean(deviation * deviation)), gradient
+
+        raise ValueError(f"未対応の目的関数です: {objective}")
+
+    def objective_value(self, objective: str, ratios: np.ndarray) -> float:
+        """配賦割合 (N, 2) に対する目的関数の値を計算"""
+        if objective == "max_bep_ratio":
+            allocated = self._allocate(ratios)
+            contribution = allocated["implied_sales"] - allocated["variable_cost"]
+            return float(np.max(allocated["fixed_cost"] / contribution))
+        value, _ = self._evaluate(objective, ratios, self.data_manager.get_department_arrays().ratios)
+        return value
+
+    def _level_fixed_ratios(self, lower: np.ndarray, upper: np.ndarray) -> Tuple[np.ndarray, int]:
+        """
+        損益分岐点 / 配賦後売上総利益 の最大値を最小化する固定費配賦率を計算
+
+        比率 R = (固定費 + 本部固定費 * f) / (S - V) は f について単調増加の一次式のため、
+        共通の水準 L に対して f = clip((L * (S - V) - 固定費) / 本部固定費, 下限, 上限) とし、
+        合計が1になる L を二分法で求める（上下限に達しない事業部の比率はすべて L に揃う）
+        """
+        arrays = self.data_manager.get_department_arrays()
+        contribution = arrays.variable_cost / (1 - arrays.margin_rate) - arrays.variable_cost - arrays.transfers[:, 1]
+        base_fixed = arrays.fixed_cost + arrays.transfers[:, 0]
+        hq_fixed = arrays.headquarters_fixed_cost
+
+        # 限界利益が正でない事業部は比率を下げられないため下限に固定
+        active = contribution > 0
+        slope = np.where(active, contribution / hq_fixed, 0.0)
+        offset = np.where(active, -base_fixed / hq_fixed, lower)
+
+        def fixed_ratios(level):
+            return np.clip(slope * level + offset, lower, upper)
+
+        safe_contribution = np.where(active, contribution, 1.0)
+        level_low = float(np.min(np.where(active, (lower * hq_fixed + base_fixed) / safe_contribution, np.inf)))
+        level_high = float(np.max(np.where(active, (upper * hq_fixed + base_fixed) / safe_contribution, -np.inf)))
+
+        iterations = 0
+        for iterations in range(1, _LEVEL_SEARCH_ITERATIONS + 1):
+            level = (level_low + level_high) / 2
+            if fixed_ratios(level).sum() > 1.0:
+                level_high = level
+            else:
+                level_low = level
+            if level_high - level_low <= 1e-15 * max(abs(level_high), 1.0):
+                break
+
+        # 二分法の残差は比率に応じて配分
+        ratios = fixed_ratios((level_low + level_high) / 2)
+        return project_to_simplex(ratios, lower, upper), iterations
+
+    def optimize(self, objective: str = "margin_dispersion", bounds: Optional[Dict] = None,
+                 max_iterations: int = 2000, tolerance: float = 1e-7) -> Dict:
+        """
+        目的関数を最小化する配賦割合を探索
+
+        max_bep_ratio は水準の二分探索で厳密解を求め、それ以外は加速射影勾配法で探索する。
+
+        目的関数が依存しない側の配賦割合（例: margin_dispersion における固定費配賦率）は
+        現在の値を上下限の範囲内に射影した値のまま保持する
+
+        Args:
+            objective: 目的関数名（OBJECTIVES のキー）
+            bounds: 事業部ごとの配賦割合の上下限。
+                    {事業部名: (下限, 上限)} または {事業部名: {"fixed": (下限, 上限), "variable": (下限, 上限)}}
+            max_iterations: 最大反復回数（射影勾配法）
+            tolerance: 収束判定に用いる配賦割合の変化量
+
+        Returns:
+            最適化結果（ratios, ratio_array, objective, initial_objective, iterations, elapsed_seconds, converged）
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"未対応の目的関数です: {objective}")
+
+        start_time = time.perf_counter()
+        arrays = self.data_manager.get_department_arrays()
+        names = arrays.names
+        current = np.array(arrays.ratios)
+        lower, upper = bounds_arrays(names, bounds)
+
+        ratios = project_to_simplex(current.T, lower.T, upper.T).T
+        initial_objective = self.objective_value(objective, current)
+
+        iterations = 0
+        converged = False
+        if objective == "max_bep_ratio":
+            ratios[:, 0], iterations = self._level_fixed_ratios(lower[:, 0], upper[:, 0])
+            converged = True
+        else:
+            # 加速射影勾配法（FISTA、目的関数が増加した場合は慣性をリセット）
+            value, _ = self._evaluate(objective, ratios, current)
+            momentum_point = ratios
+            momentum = 1.0
+            step = 1.0
+            while iterations < max_iterations:
+                iterations += 1
+                point_value, gradient = self._evaluate(objective, momentum_point, current)
+
+                # 配賦割合を1以上動かすステップは不要なため上限を設ける
+                max_gradient = float(np.max(np.abs(gradient)))
+                if max_gradient == 0.0:
+                    converged = True
+                    break
+                step = min(step * 2.0, 1.0 / max_gradient)
+
+                # バックトラッキングでステップ幅を決定
+                while True:
+                    candidate = project_to_simplex((momentum_point - step * gradient).T, lower.T, upper.T).T
+                    delta = candidate - momentum_point
+                    candidate_value, _ = self._evaluate(objective, candidate, current)
+                    bound = point_value + np.sum(gradient * delta) + np.sum(delta * delta) / (2 * step)
+                    if candidate_value <= bound + 1e-15 * abs(bound) or step < 1e-15:
+                        break
+                    step *= 0.5
+
+                change = float(np.max(np.abs(candidate - ratios)))
+                next_momentum = (1 + np.sqrt(1 + 4 * momentum * momentum)) / 2
+                if candidate_value > value:
+                    momentum_point = ratios
+                    momentum = 1.0
+                else:
+                    momentum_point = candidate + (momentum - 1) / next_momentum * (candidate - ratios)
+                    ratios, value = candidate, candidate_value
+                    momentum = next_momentum
+                if change < tolerance:
+                    converged = True
+                    break
+
+        return {
+            "ratios": {
+                dept_name: {"fixed": float(ratios[i, 0]), "variable": float(ratios[i, 1])}
+                for i, dept_name in enumerate(names)
+            },
+            "ratio_array": ratios,
+            "objective": self.objective_value(objective, ratios),
+            "initial_objective": initial_objective,
+            "iterations": iterations,
+            "elapsed_seconds": time.perf_counter() - start_time,
+            "converged": converged
+        }
@@ -7,6 +7,9 @@ import plotly.graph_objects as go
 import numpy as np
 from typing import Dict, List
 
+from utils.parameter_sweep import SWEEP_METRICS, SWEEP_PARAMETERS
+from utils.pareto_frontier import PARETO_METRICS
+
 class ChartGenerator:
     """損益分岐点分析のグラフを生成するクラス"""
     
@@ -332,4 +335,150 @@ class ChartGenerator:
             )
         )
         
+        return fig
+    
+    def create_sweep_heatmap(self, sweep_result: Dict) -> go.Figure:
+        """パラメータスイープの結果をヒートマップで可視化"""
+        metric = sweep_result["metric"]
+        x_label = SWEEP_PARAMETERS[sweep_result["x_parameter"]]
+        y_label = SWEEP_PARAMETERS[sweep_result["y_parameter"]]
+        metric_label = SWEEP_METRICS[metric]
+        
+        fig = go.Figure()
+        
+        # ヒートマップ（values は (x, y) の並びのため転置して描画）
+        fig.add_trace(go.Heatmap(
+            x=sweep_result["x_values"],
+            y=sweep_result["y_values"],
+            z=sweep_result["values"].T,
+            colorscale="RdYlGn_r" if metric == "break_even_point" else "RdYlGn",
+            colorbar=dict(title=metric_label),
+            hovertemplate=f'<b>{x_label}:</b> %{{x:,.4g}}<br><b>{y_label}:</b> %{{y:,.4g}}<br><b>{metric_label}:</b> %{{z:,.4g}}<extra></extra>'
+        ))
+        
+        # 等高線（指定された水準との交点）
+        if sweep_result["contour"]:
+            contour_x, contour_y = zip(*sweep_result["contour"])
+            fig.add_trace(go.Scatter(
+                x=contour_x,
+                y=contour_y,
+                mode='markers',
+                name=f'{metric_label} = {sweep_result["contour_level"]:,.4g}',
+                marker=dict(color='black', size=3)
+            ))
+        
+        fig.update_layout(
+            title_text=f"{sweep_result['department']}事業部：{metric_label}の感応度（{x_label} × {y_label}）",
+            xaxis_title=x_label,
+            yaxis_title=y_label,
+            template="plotly_white",
+            height=600
+        )
+        
+        return fig
+    
+    def create_monthly_chart(self, monthly_result: Dict, departments: List[str], month_labels: List[str]) -> go.Figure:
+        """月次の営業利益（棒）と累計営業利益（線）のチャートを作成"""
+        
+        fig = go.Figure()
+        
+        for i, dept_name in enumerate(departments):
+            color = self.colors.get(dept_name, "#1f77b4")
+            monthly_profit = monthly_result["operating_profit"][:, i] / 1_000_000
+            cumulative_profit = monthly_result["cumulative_operating_profit"][:, i] / 1_000_000
+            
+            # 月次営業利益
+            fig.add_trace(go.Bar(
+                name=f'{dept_name}事業部: 月次営業利益',
+                x=month_labels,
+                y=monthly_profit,
+                marker_color=color,
+                opacity=0.4,
+                legendgroup=dept_name,
+                hovertemplate=f'<b>{dept_name}</b> %{{x}}<br>月次営業利益: %{{y:,.1f}}百万円<extra></extra>'
+            ))
+            
+            # 累計営業利益
+            fig.add_trace(go.Scatter(
+                name=f'{dept_name}事業部: 累計営業利益',
+                x=month_labels,
+                y=cumulative_profit,
+                mode='lines+markers',
+                line=dict(color=color, width=2),
+                legendgroup=dept_name,
+                hovertemplate=f'<b>{dept_name}</b> %{{x}}<br>累計営業利益: %{{y:,.1f}}百万円<extra></extra>'
+            ))
+            
+            # 累計で損益分岐に達した月
+            break_even_month = int(monthly_result["break_even_month"][i])
+            if break_even_month >= 0:
+                fig.add_trace(go.Scatter(
+                    x=[month_labels[break_even_month]],
+                    y=[cumulative_profit[break_even_month]],
+                    mode='markers',
+                    name=f'{dept_name}事業部: 累計損益分岐月',
+                    marker=dict(color='green', size=12, symbol='star'),
+                    legendgroup=dept_name,
+                    showlegend=False,
+                    hovertemplate=f'<b>{dept_name}</b> 累計損益分岐: %{{x}}<extra></extra>'
+                ))
+        
+        fig.add_hline(y=0, line=dict(color="grey", width=2, dash="dot"))
+        
+        fig.update_layout(
+            title_text="事業部別：月次営業利益と累計営業利益",
+            xaxis_title="月",
+            yaxis_title="営業利益 (百万円)",
+            barmode='group',
+            template="plotly_white",
+            height=500,
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="right",
+                x=1
+            )
+        )
+        
+        return fig 
+    
+    def create_pareto_chart(self, pareto_result: Dict) -> go.Figure:
+        """配賦割合の案の評価点とパレートフロンティアの散布図を作成"""
+        x_label = PARETO_METRICS[pareto_result["x_metric"]]
+        y_label = PARETO_METRICS[pareto_result["y_metric"]]
+        points = pareto_result["points"]
+        frontier = pareto_result["frontier"]
+        
+        fig = go.Figure()
+        
+        # 評価した案
+        fig.add_trace(go.Scatter(
+            x=points[:, 0],
+            y=points[:, 1],
+            mode='markers',
+            name='配賦割合の案',
+            marker=dict(color='lightgray', size=4),
+            hoverinfo='skip'
+        ))
+        
+        # パレートフロンティア
+        fig.add_trace(go.Scatter(
+            x=frontier[:, 0],
+            y=frontier[:, 1],
+            mode='lines+markers',
+            name='パレートフロンティア',
+            line=dict(color='#d62728', width=2, shape='hv'),
+            marker=dict(size=6),
+            hovertemplate=f'<b>{x_label}:</b> %{{x:,.4g}}<br><b>{y_label}:</b> %{{y:,.4g}}<extra></extra>'
+        ))
+        
+        fig.update_layout(
+            title_text=f"配賦割合のトレードオフ（{pareto_result['n_evaluated']:,}案）",
+            xaxis_title=x_label,
+            yaxis_title=y_label,
+            template="plotly_white",
+            height=600
+        )
+        
         return fig 
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""
+本部コストプールモジュール
+本部費用をIT・人事・賃料・管理・マーケティングなどのコストプールに分け、
+プール × 事業部 の配賦行列で配賦後の費用とプール別の内訳を一度に計算
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Mapping, Sequence
+
+from utils.allocation_drivers import AllocationBasis
+
+# コストプールの費用区分（配賦後に本部固定費・本部変動費のどちらとして扱うか）
+POOL_COST_TYPES = {
+    "fixed": "固定費",
+    "variable": "変動費"
+}
+
+
+class CostPools:
+    """本部コストプール（プール名・費用区分・金額・配賦基準）を保持するクラス"""
+
+    def __init__(self, pools: Sequence[Mapping]):
+        """
+        Args:
+            pools: [{"name": プール名, "cost_type": "fixed" または "variable",
+                     "amount": 金額, "basis": 配賦基準}, ...]
+                   配賦基準は基準名、または {基準名: 重み} の複合基準
+        """
+        self.names: List[str] = []
+        self.bases = []
+        amounts = []
+        cost_types = []
+        for pool in pools:
+            if pool["cost_type"] not in POOL_COST_TYPES:
+                raise ValueError(f"未対応の費用区分です: {pool['name']}: {pool['cost_type']}")
+            if pool["amount"] < 0:
+                raise ValueError(f"コストプールの金額は0以上である必要があります: {pool['name']}")
+            self.names.append(pool["name"])
+            self.bases.append(pool["basis"])
+            amounts.append(float(pool["amount"]))
+            cost_types.append(pool["cost_type"])
+        if len(set(self.names)) != len(self.names):
+            raise ValueError("コストプール名が重複しています")
+
+        self.amounts = np.array(amounts, dtype=float)
+        self.cost_types = cost_types
+        # プール × 費用区分（固定費・変動費）の金額行列 (P, 2)
+        self.type_amounts = np.zeros((len(self.names), 2))
+        for p, cost_type in enumerate(cost_types):
+            self.type_amounts[p, 0 if cost_type == "fixed" else 1] = amounts[p]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def totals(self) -> np.ndarray:
+        """本部固定費・本部変動費の合計 (2,)"""
+        return self.type_amounts.sum(axis=0)
+
+    def to_list(self) -> List[Dict]:
+        """コンストラクタに渡せる形式に変換"""
+        return [
+            {"name": name, "cost_type": cost_type, "amount": float(amount), "basis": basis}
+            for name, cost_type, amount, basis in zip(self.names, self.cost_types, self.amounts, self.bases)
+        ]
+
+    def allocate(self, basis: AllocationBasis) -> Dict:
+        """
+        各プールをそれぞれの配賦基準で事業部に配賦
+
+        配賦行列 R (N, P) と金額行列 (P, 2) の積で事業部ごとの本部固定費・本部変動費を求め、
+        プール別の内訳 R * 金額 も同じ R から計算する（プールごとの再計算は行わない）
+
+        Args:
+            basis: 事業部 × 配賦基準 の表
+
+        Returns:
+            {"names": 事業部名, "pool_names": プール名, "ratios": 配賦行列 (N, P),
+             "allocated": プール別の配賦額 (N, P), "by_cost_type": 費用区分別の配賦額 (N, 2),
+             "allocation_ratios": DataManager.allocation_ratios 形式の配賦割合}
+        """
+        ratios = basis.ratios(self.bases)
+        by_cost_type = ratios @ self.type_amounts
+
+        # 費用区分ごとの配賦割合（区分の合計が0の場合は0とする）
+        totals = self.totals()
+        type_ratios = np.divide(by_cost_type, totals, out=np.zeros_like(by_cost_type), where=totals > 0)
+
+        return {
+            "names": list(basis.names),
+            "pool_names": list(self.names),
+            "ratios": ratios,
+            "allocated": ratios * self.amounts,
+            "by_cost_type": by_cost_type,
+            "allocation_ratios": {
+                name: {"fixed": float(type_ratios[i, 0]), "variable": float(type_ratios[i, 1])}
+                for i, name in enumerate(basis.names)
+            }
+        }
+
+    @staticmethod
+    def drilldown(result: Dict) -> pd.DataFrame:
+        """
+        プール別の配賦額を 事業部 × プール の表に変換（合計の行・列を含む）
+
+        Args:
+            result: allocate の結果
+        """
+        table = pd.DataFrame(result["allocated"], index=result["names"], columns=result["pool_names"])
+        table["合計"] = table.sum(axis=1)
+        table.loc["合計"] = table.sum(axis=0)
+        return table
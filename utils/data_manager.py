@@ -3,57 +3,377 @@
 事業部の基本データと本部費用の配賦ロジックを管理
 """
 
+import os
 import pandas as pd
-from typing import Dict, List, Tuple
+import numpy as np
+from typing import Callable, Dict, List, Tuple
+
+from utils.allocation_engine import (
+    AllocationResult,
+    DepartmentArrays,
+    break_even_point,
+    compute_allocation,
+    operating_profit
+)
+from utils.sensitivity import compute_sensitivity
+from utils.department_hierarchy import DepartmentHierarchy
+from utils.monthly_model import MonthlyPlan
+from utils.cost_transfer import TransferGraph
+from utils.allocation_drivers import AllocationBasis, Basis
+from utils.cost_pools import CostPools
+from utils.goal_seek import GoalSeeker
+from utils.kpi_formulas import DEFAULT_KPIS, evaluate_kpis
+from utils.scenario_diff import ScenarioDiff, stack_results
+from utils.ratio_normalizer import bounds_arrays, normalize_ratios
+from utils.stress_test import CURRENT_PLAN, StressTester, default_shocks
+from utils.safety_analytics import allocation_safety_metrics
+from utils.master_data import DepartmentMaster, load_department_master, load_headquarters_master
+from utils.gl_ingestion import DEFAULT_CHUNK_SIZE, AccountMapping, GLAggregator, ingest_general_ledger
+from utils.gl_incremental import IncrementalGLIngestor
+from utils.scenario_store import ScenarioStore
+from utils.result_cache import (
+    dump_allocation,
+    dump_dataframe,
+    dump_figure,
+    load_allocation,
+    load_dataframe,
+    load_figure,
+    scenario_hash
+)
+
+# 事業部・本部費用の初期値（概要.mdの値）
+_DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+DEFAULT_DEPARTMENT_MASTER = os.path.join(_DATA_DIRECTORY, "departments.csv")
+DEFAULT_HEADQUARTERS_MASTER = os.path.join(_DATA_DIRECTORY, "headquarters.csv")
+
+# 事業部のグループ（概要.md: ワークス事業部はインサイド・フィールド・SPで構成）
+DEFAULT_DEPARTMENT_GROUPS = {
+    "インサイド": "ワークス",
+    "フィールド": "ワークス",
+    "SP": "ワークス"
+}
+
+def default_hierarchy(names) -> DepartmentHierarchy:
+    """
+    事業部名から階層を作成（DEFAULT_DEPARTMENT_GROUPS の事業部はグループの下、それ以外は最上位）
+    
+    Args:
+        names: 事業部名（departments のキー順）
+    """
+    parents = {}
+    for name in names:
+        group = DEFAULT_DEPARTMENT_GROUPS.get(name)
+        if group is not None and group not in parents:
+            parents[group] = None
+        parents[name] = group
+    return DepartmentHierarchy(parents)
+
+class _TrackedDict(dict):
+    """変更時にコールバックを呼び出す辞書（ネストした辞書も追跡）"""
+    
+    def __init__(self, data: Dict, on_change):
+        super().__init__()
+        self._on_change = on_change
+        for key, value in data.items():
+            dict.__setitem__(self, key, self._wrap(value))
+    
+    def _wrap(self, value):
+        if isinstance(value, dict):
+            return _TrackedDict(value, self._on_change)
+        return value
+    
+    def to_dict(self) -> Dict:
+        """追跡なしの通常の辞書（ネストも含む）に変換"""
+        return {
+            key: value.to_dict() if isinstance(value, _TrackedDict) else value
+            for key, value in self.items()
+        }
+    
+    def _notify(self):
+        # 復元（pickle/deepcopy）中はコールバックが未設定のため通知しない
+        on_change = getattr(self, "_on_change", None)
+        if on_change is not None:
+            on_change()
+    
+    def __setitem__(self, key, value):
+        if key in self and self[key] == value:
+            return
+        dict.__setitem__(self, key, self._wrap(value))
+        self._notify()
+    
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._notify()
+    
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+    
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+    
+    def pop(self, key, *default):
+        had_key = key in self
+        value = dict.pop(self, key, *default)
+        if had_key:
+            self._notify()
+        return value
+    
+    def popitem(self):
+        item = dict.popitem(self)
+        self._notify()
+        return item
+    
+    def clear(self):
+        if self:
+            dict.clear(self)
+            self._notify()
+    
+    def __ior__(self, other):
+        self.update(other)
+        return self
 
 class DataManager:
     """事業部データと本部費用配賦を管理するクラス"""
     
+    # 変更を追跡する属性（変更時に配賦計算のキャッシュを無効化）
+    _TRACKED_ATTRIBUTES = (
+        "departments",
+        "allocation_ratios",
+        "cost_transfers",
+        "headquarters_fixed_cost",
+        "headquarters_variable_cost",
+        "exact_yen"
+    )
+    
     def __init__(self):
-        # 事業部の基本データ（概要.mdから取得）
-        self.departments = {
-            "キャリア": {
-                "margin_rate": 0.6025,
-                "fixed_cost": 25_572_000,
-                "variable_cost": 10_430_800
-            },
-            "インサイド": {
-                "margin_rate": 0.6483,
-                "fixed_cost": 30_516_360,
-                "variable_cost": 7_014_000
-            },
-            "フィールド": {
-                "margin_rate": 0.4512,
-                "fixed_cost": 4_830_000,
-                "variable_cost": 374_600
-            },
-            "SP": {
-                "margin_rate": 0.5421,
-                "fixed_cost": 15_112_000,
-                "variable_cost": 2_985_600
-            },
-            "飲食": {
-                "margin_rate": 0.5478,
-                "fixed_cost": 9_862_800,
-                "variable_cost": 1_619_400
-            }
-        }
+        # 配賦計算結果のキャッシュ（data_versionが一致する間のみ有効）
+        self._data_version = 0
+        self._arrays_cache = None
+        self._result_cache = None
+        self._scenario_key_cache = None
+        
+        # ディスク上の計算結果キャッシュ（ResultCache。未設定時は使用しない）
+        self.result_cache = None
+        
+        # 事業部の基本データと本部費用（概要.mdの値を data/ のマスターデータから読み込み）
+        self.departments = load_department_master(DEFAULT_DEPARTMENT_MASTER).to_dict()
+        headquarters = load_headquarters_master(DEFAULT_HEADQUARTERS_MASTER)
+        self.headquarters_fixed_cost = headquarters.fixed_cost
+        self.headquarters_variable_cost = headquarters.variable_cost
+        
+        # 円単位の厳密計算（金額をint64で保持し、配賦額の合計を本部費用に1円単位で一致させる）
+        self.exact_yen = False
         
-        # 本部費用
-        self.headquarters_fixed_cost = 53_013_900
-        self.headquarters_variable_cost = 11_649_400
+        # 計算式で定義したKPI {KPI名: 計算式}
+        self.kpi_definitions = dict(DEFAULT_KPIS)
+        
+        # 保存したシナリオ {シナリオ名: 配賦計算結果} と、その入力 {シナリオ名: 事業部データと配賦条件}
+        self.saved_scenarios = {}
+        self.saved_scenario_inputs = {}
+        
+        # 本部費用のコストプール別の配賦結果（apply_cost_pools で設定。未設定時は None）
+        self.headquarters_cost_pools = None
         
         # 本部費用の配賦割合（初期値：均等配賦）
+        equal_ratio = 1.0 / len(self.departments)
         self.allocation_ratios = {
-            "キャリア": {"fixed": 0.2, "variable": 0.2},
-            "インサイド": {"fixed": 0.2, "variable": 0.2},
-            "フィールド": {"fixed": 0.2, "variable": 0.2},
-            "SP": {"fixed": 0.2, "variable": 0.2},
-            "飲食": {"fixed": 0.2, "variable": 0.2}
+            name: {"fixed": equal_ratio, "variable": equal_ratio} for name in self.departments
         }
         
         # 事業部間の負担調整（初期値：なし）
         self.cost_transfers = {}
+        
+        # 事業部の階層（読み込んだ事業部から作成）
+        self.hierarchy = default_hierarchy(self.departments.keys())
+    
+    def __setattr__(self, name, value):
+        if name in self._TRACKED_ATTRIBUTES:
+            # 値が変わらない再代入ではキャッシュを無効化しない
+            if name in self.__dict__ and self.__dict__[name] == value:
+                return
+            if isinstance(value, dict):
+                value = _TrackedDict(value, self._mark_dirty)
+            object.__setattr__(self, name, value)
+            self._mark_dirty()
+            return
+        object.__setattr__(self, name, value)
+    
+    def __getstate__(self):
+        # 追跡用の辞書は通常の辞書として保存し、キャッシュは保存しない
+        state = {}
+        for name, value in self.__dict__.items():
+            if name in ("_arrays_cache", "_result_cache", "_scenario_key_cache", "result_cache"):
+                continue
+            state[name] = value.to_dict() if isinstance(value, _TrackedDict) else value
+        return state
+    
+    def __setstate__(self, state):
+        object.__setattr__(self, "_data_version", state.get("_data_version", 0))
+        object.__setattr__(self, "_arrays_cache", None)
+        object.__setattr__(self, "_result_cache", None)
+        object.__setattr__(self, "_scenario_key_cache", None)
+        object.__setattr__(self, "result_cache", None)
+        for name, value in state.items():
+            if isinstance(value, dict) and name in self._TRACKED_ATTRIBUTES:
+                value = _TrackedDict(value, self._mark_dirty)
+            object.__setattr__(self, name, value)
+    
+    def _mark_dirty(self):
+        """入力データの変更を記録し、配賦計算のキャッシュを無効化"""
+        self._data_version += 1
+        self._arrays_cache = None
+        self._result_cache = None
+        self._scenario_key_cache = None
+        # 本部費用・配賦割合・事業部が変わるとコストプール別の内訳と一致しなくなるため破棄
+        self.headquarters_cost_pools = None
+    
+    @property
+    def data_version(self) -> int:
+        """入力データのバージョン（変更のたびに増加）"""
+        return self._data_version
+    
+    def scenario_key(self) -> str:
+        """配賦計算の入力（事業部データ・本部費用・配賦割合・負担調整・計算方法）のハッシュ"""
+        if self._scenario_key_cache is None:
+            self._scenario_key_cache = scenario_hash(self.get_department_arrays(), self.exact_yen)
+        return self._scenario_key_cache
+    
+    def cached_figure(self, name: str, build: Callable[[], object]):
+        """
+        現在の入力に対するグラフをディスク上のキャッシュから取得（ない場合は作成して保存）
+        
+        Args:
+            name: グラフの名前（同じ入力で異なるグラフを区別する）
+            build: グラフを作成する関数（現在の入力のみから作成すること）
+        """
+        if self.result_cache is None:
+            return build()
+        return self.result_cache.get_or_create(self.scenario_key(), f"figure-{name}", build, dump_figure, load_figure)
+    
+    def load_master_data(self, department_source, headquarters_source=None, file_format: str = None,
+                         headquarters_format: str = None) -> Dict:
+        """
+        事業部マスター・本部費用マスター（CSV / Excel / Parquet）を読み込んで事業部データを置き換え
+        
+        事業部の構成が変わった場合、配賦割合は均等配賦、事業部階層は階層なしに戻し、
+        存在しない事業部の負担調整は削除する
+        
+        Args:
+            department_source: 事業部マスターのファイルパスまたは内容
+            headquarters_source: 本部費用マスターのファイルパスまたは内容（省略時は本部費用を変更しない）
+            file_format: "csv" / "excel" / "parquet"。省略時は拡張子から判定
+            headquarters_format: 本部費用マスターの形式。省略時は file_format と同じ
+        
+        Returns:
+            {"departments": DepartmentMaster, "headquarters": HeadquartersMaster または None}
+        """
+        departments = load_department_master(department_source, file_format)
+        headquarters = None
+        if headquarters_source is not None:
+            headquarters = load_headquarters_master(headquarters_source, headquarters_format or file_format)
+        
+        self._replace_departments(departments)
+        
+        if headquarters is not None:
+            self.headquarters_fixed_cost = headquarters.fixed_cost
+            self.headquarters_variable_cost = headquarters.variable_cost
+        return {"departments": departments, "headquarters": headquarters}
+    
+    def load_general_ledger(self, source, mapping: AccountMapping = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                            file_format: str = None, department_map: Dict[str, str] = None) -> GLAggregator:
+        """
+        仕訳明細（総勘定元帳）を集計し、事業部ごとの限界利益率・固定費・変動費を置き換え
+        
+        事業部の構成が変わった場合の扱いは load_master_data と同じ
+        
+        Args:
+            source: 仕訳明細のファイルパスまたは内容（CSV / Parquet）
+            mapping: 勘定科目の対応表。省略時は勘定科目コードの先頭で分類
+            chunk_size: 1チャンクあたりの行数
+            file_format: "csv" / "parquet"。省略時は拡張子から判定
+            department_map: {仕訳明細の部門: 事業部名}
+        
+        Returns:
+            集計結果（未分類の仕訳行数・金額を含む）
+        """
+        aggregator = ingest_general_ledger(source, mapping, chunk_size, file_format, department_map)
+        self._replace_departments(aggregator.to_department_master())
+        return aggregator
+    
+    def update_general_ledger(self, source, state_path: str, mapping: AccountMapping = None,
+                              watermark_column: str = "line_id", chunk_size: int = DEFAULT_CHUNK_SIZE,
+                              file_format: str = None, department_map: Dict[str, str] = None) -> Dict:
+        """
+        前回の取込以降の仕訳のみを集計に加算し、事業部データが集計と異なる事業部のみ更新
+        
+        状態ファイルが存在しない場合はすべての仕訳を取り込む（load_general_ledger と同じ結果）。
+        状態ファイルは事業部データへの反映が成功した場合のみ保存する
+        
+        Args:
+            source: 仕訳明細のファイルパスまたは内容（ウォーターマークの列を含むこと）
+            state_path: 状態ファイル（JSON）のパス（ユーザーごとに分ける。gl_incremental.state_path_for）
+            mapping: 勘定科目の対応表（前回の取込と同じであること）
+            watermark_column: "line_id"（仕訳行番号）または "posting_date"（計上日）
+            chunk_size: 1チャンクあたりの行数
+            file_format: "csv" / "parquet"。省略時は拡張子から判定
+            department_map: {仕訳明細の部門: 事業部名}
+        
+        Returns:
+            IncrementalGLIngestor.update の結果に "aggregator"（更新後の集計）を加えた辞書
+        """
+        ingestor = IncrementalGLIngestor(state_path, mapping, watermark_column, department_map)
+        result = ingestor.update(source, chunk_size, file_format, save=False)
+        master = ingestor.aggregator.to_department_master()
+        if set(master.names) == set(self.departments.keys()):
+            # 新しいセッションなどで事業部データが前回の集計と一致しない場合があるため、集計全体を反映する
+            # （update_departments は値が変わった事業部のみ更新するため、一致している場合は changed のみ更新される）
+            self.update_departments(master.to_dict())
+        else:
+            self._replace_departments(master)
+        ingestor.save()
+        result["aggregator"] = ingestor.aggregator
+        return result
+    
+    def update_departments(self, updates: Dict[str, Dict]) -> List[str]:
+        """
+        既存の事業部の基本データを更新し、配賦計算結果は値が変わった事業部のみ再計算
+        
+        Args:
+            updates: {事業部名: {"margin_rate", "fixed_cost", "variable_cost"}}
+        
+        Returns:
+            値が変わった事業部名
+        """
+        previous = self._result_cache
+        changed = [name for name, values in updates.items() if self.departments[name] != values]
+        for name in changed:
+            self.departments[name] = dict(updates[name])
+        
+        # 円単位の厳密計算は配賦額の丸めを全事業部まとめて行うため、次回の計算時に全体を再計算
+        if changed and previous is not None and not self.exact_yen:
+            arrays = self.get_department_arrays()
+            indices = [previous.index_of(name) for name in changed]
+            self._result_cache = arrays.reallocate(previous, indices).freeze()
+        return changed
+    
+    def _replace_departments(self, departments: DepartmentMaster):
+        """事業部データを置き換え（事業部の構成が変わった場合は配賦割合・負担調整・階層も作り直す）"""
+        new_departments = departments.to_dict()
+        if set(self.departments.keys()) == set(departments.names):
+            # 同じ事業部構成の場合は現在の並び順を保つ
+            self.departments = {name: new_departments[name] for name in self.departments.keys()}
+            return
+        equal_ratio = 1.0 / len(departments)
+        self.allocation_ratios = {name: {"fixed": equal_ratio, "variable": equal_ratio} for name in departments.names}
+        self.cost_transfers = {
+            key: value for key, value in self.cost_transfers.items()
+            if key.rsplit("_", 1)[0] in set(departments.names)
+        }
+        self.hierarchy = default_hierarchy(departments.names)
+        self.departments = new_departments
     
     def get_department_data(self) -> Dict:
         """事業部の基本データを取得"""
@@ -67,10 +387,51 @@ class DataManager:
         """本部費用の配賦割合を取得"""
         return self.allocation_ratios.copy()
     
-    def update_allocation_ratios(self, new_ratios: Dict):
-        """本部費用の配賦割合を更新"""
+    def update_allocation_ratios(self, new_ratios: Dict, normalize: str = None,
+                                 locked: List[str] = None, bounds: Dict = None):
+        """
+        本部費用の配賦割合を更新
+        
+        Args:
+            new_ratios: 配賦割合 {事業部名: {"fixed": 割合, "variable": 割合}}
+            normalize: 合計を1にする正規化の方法（NORMALIZATION_MODES のキー）。省略時はそのまま更新
+            locked: 正規化で値を固定する事業部（編集した事業部など）
+            bounds: 事業部ごとの配賦割合の上下限
+        """
+        if normalize is not None:
+            new_ratios = self.normalize_allocation_ratios(new_ratios, normalize, locked, bounds)
         self.allocation_ratios = new_ratios
     
+    def normalize_allocation_ratios(self, ratios: Dict, mode: str = "project",
+                                    locked: List[str] = None, bounds: Dict = None) -> Dict:
+        """
+        配賦割合を固定費・変動費それぞれ合計1に正規化（配賦割合は更新しない）
+        
+        Args:
+            ratios: 配賦割合 {事業部名: {"fixed": 割合, "variable": 割合}}
+            mode: 正規化の方法（NORMALIZATION_MODES のキー）
+            locked: 値を固定する事業部名のリスト、または {"fixed": [...], "variable": [...]}
+            bounds: 事業部ごとの配賦割合の上下限
+        
+        Returns:
+            正規化後の配賦割合
+        """
+        names = list(ratios.keys())
+        values = np.array([[ratios[name]["fixed"], ratios[name]["variable"]] for name in names], dtype=float)
+        lower, upper = bounds_arrays(names, bounds)
+        
+        locked_mask = np.zeros((len(names), 2), dtype=bool)
+        if locked:
+            for col, key in enumerate(("fixed", "variable")):
+                locked_names = locked.get(key, []) if isinstance(locked, dict) else locked
+                locked_mask[:, col] = [name in locked_names for name in names]
+        
+        normalized = normalize_ratios(values.T, mode, locked_mask.T, lower.T, upper.T).T
+        return {
+            name: {"fixed": float(normalized[i, 0]), "variable": float(normalized[i, 1])}
+            for i, name in enumerate(names)
+        }
+    
     def calculate_implied_sales(self, dept_name: str) -> float:
         """限界利益率から仮の売上総利益を逆算"""
         dept_data = self.departments[dept_name]
@@ -83,62 +444,349 @@ class DataManager:
         
         return implied_sales
     
+    def get_department_arrays(self) -> DepartmentArrays:
+        """事業部データと配賦条件を配列形式で取得（読み取り専用、キャッシュ済み）"""
+        if self._arrays_cache is None:
+            self._arrays_cache = DepartmentArrays.from_dicts(
+                self.departments,
+                self.allocation_ratios,
+                self.cost_transfers,
+                self.headquarters_fixed_cost,
+                self.headquarters_variable_cost
+            ).freeze()
+        return self._arrays_cache
+    
+    def calculate_allocated_arrays(self) -> AllocationResult:
+        """配賦後の各事業部のコストを配列形式で一括計算（読み取り専用、キャッシュ済み）"""
+        if self._result_cache is None:
+            if self.result_cache is not None:
+                result = self.result_cache.get_or_create(
+                    self.scenario_key(), "allocation",
+                    lambda: self.get_department_arrays().allocate(exact=self.exact_yen),
+                    dump_allocation, load_allocation
+                )
+            else:
+                result = self.get_department_arrays().allocate(exact=self.exact_yen)
+            self._result_cache = result.freeze()
+        return self._result_cache
+    
     def calculate_allocated_costs(self) -> Dict:
         """配賦後の各事業部のコストを計算（売上総利益調整版）"""
-        allocated_costs = {}
-        
-        for dept_name, dept_data in self.departments.items():
-            # 元の仮の売上総利益を計算
-            original_implied_sales = self.calculate_implied_sales(dept_name)
-            
-            # 本部費用の配賦分を計算
-            hq_fixed_allocated = self.headquarters_fixed_cost * self.allocation_ratios[dept_name]["fixed"]
-            hq_variable_allocated = self.headquarters_variable_cost * self.allocation_ratios[dept_name]["variable"]
-            
-            # 事業部固有のコスト
-            dept_fixed = dept_data["fixed_cost"]
-            dept_variable = dept_data["variable_cost"]
-            
-            # 事業部間の負担調整を適用
-            transfer_fixed = self.cost_transfers.get(f"{dept_name}_fixed", 0)
-            transfer_variable = self.cost_transfers.get(f"{dept_name}_variable", 0)
-            
-            # 配賦後の売上総利益（本部変動費分を加算）
-            allocated_sales = original_implied_sales + hq_variable_allocated
-            
-            # 総コストを計算
-            total_fixed = dept_fixed + hq_fixed_allocated + transfer_fixed
-            total_variable = dept_variable + hq_variable_allocated + transfer_variable
-            
-            # 配賦後の限界利益率を再計算
-            new_margin_rate = (allocated_sales - total_variable) / allocated_sales
-            
-            allocated_costs[dept_name] = {
-                "original_margin_rate": dept_data["margin_rate"],
-                "margin_rate": new_margin_rate,  # 再計算された限界利益率
-                "original_implied_sales": original_implied_sales,  # 元の仮の売上総利益
-                "implied_sales": allocated_sales,  # 配賦後の売上総利益
-                "sales_increase": hq_variable_allocated,  # 売上総利益増加額
-                "fixed_cost": total_fixed,
-                "variable_cost": total_variable,
-                "original_fixed": dept_fixed,
-                "original_variable": dept_variable,
-                "hq_fixed_allocated": hq_fixed_allocated,
-                "hq_variable_allocated": hq_variable_allocated,
-                "transfer_fixed": transfer_fixed,
-                "transfer_variable": transfer_variable
-            }
-        
-        return allocated_costs
+        return self.calculate_allocated_arrays().to_dict()
     
     def calculate_break_even_point(self, dept_name: str) -> float:
         """指定した事業部の損益分岐点を計算"""
-        allocated_costs = self.calculate_allocated_costs()
-        dept_data = allocated_costs[dept_name]
+        allocated = self.calculate_allocated_arrays()
+        i = allocated.index_of(dept_name)
         
         # 損益分岐点 = 固定費 / 限界利益率
-        bep = dept_data["fixed_cost"] / dept_data["margin_rate"]
-        return bep
+        bep = allocated["fixed_cost"][i] / allocated["margin_rate"][i]
+        return float(bep)
+    
+    def allocate_scenarios(self, ratios: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        複数の配賦割合シナリオの配賦後の全項目を一括計算（現在の配賦割合は変更しない）
+        
+        Args:
+            ratios: 配賦割合の配列 (K, N, 2)。列0が固定費、列1が変動費。
+                    事業部の並びは departments のキー順
+        
+        Returns:
+            ALLOCATED_FIELDS をキーとする (K, N) 配列の辞書
+        """
+        arrays = self.get_department_arrays()
+        ratios = np.asarray(ratios, dtype=float)
+        if ratios.ndim != 3 or ratios.shape[1:] != (len(arrays), 2):
+            raise ValueError(f"ratiosの形状は (K, {len(arrays)}, 2) である必要があります: {ratios.shape}")
+        
+        return compute_allocation(
+            arrays.margin_rate,
+            arrays.fixed_cost,
+            arrays.variable_cost,
+            ratios[:, :, 0],
+            ratios[:, :, 1],
+            arrays.headquarters_fixed_cost,
+            arrays.headquarters_variable_cost,
+            arrays.transfers[:, 0],
+            arrays.transfers[:, 1]
+        )
+    
+    def evaluate_scenarios(self, ratios: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        複数の配賦割合シナリオを一括評価（現在の配賦割合は変更しない）
+        
+        Args:
+            ratios: 配賦割合の配列 (K, N, 2)。列0が固定費、列1が変動費。
+                    事業部の並びは departments のキー順
+        
+        Returns:
+            各指標の (K, N) 配列の辞書
+            （margin_rate, fixed_cost, variable_cost, break_even_point, operating_profit）
+        """
+        allocated = self.allocate_scenarios(ratios)
+        
+        return {
+            "margin_rate": allocated["margin_rate"],
+            "fixed_cost": allocated["fixed_cost"],
+            "variable_cost": allocated["variable_cost"],
+            "break_even_point": break_even_point(allocated["fixed_cost"], allocated["margin_rate"]),
+            "operating_profit": operating_profit(allocated["implied_sales"], allocated["fixed_cost"])
+        }
+    
+    def calculate_kpis(self, definitions: Dict[str, str] = None, ratios: np.ndarray = None) -> Dict[str, np.ndarray]:
+        """
+        計算式で定義したKPIを全事業部（・全シナリオ）について計算
+        
+        Args:
+            definitions: {KPI名: 計算式}。省略時は kpi_definitions
+            ratios: 配賦割合のシナリオ (K, N, 2)。省略時は現在の配賦割合
+        
+        Returns:
+            {KPI名: (N,) または (K, N) の配列}
+        """
+        if definitions is None:
+            definitions = self.kpi_definitions
+        if ratios is None:
+            return evaluate_kpis(definitions, self.calculate_allocated_arrays())
+        return evaluate_kpis(definitions, self.allocate_scenarios(ratios))
+    
+    def save_scenario(self, name: str):
+        """
+        現在の配賦計算結果をシナリオとして保存（キャッシュ済みの読み取り専用の結果をそのまま保持）
+        
+        Args:
+            name: シナリオ名（同名のシナリオは上書き）
+        """
+        self.saved_scenarios[name] = self.calculate_allocated_arrays()
+        self.saved_scenario_inputs[name] = self.get_department_arrays()
+    
+    def save_plan(self, store: ScenarioStore, name: str, owner: str = "", tags: List[str] = (),
+                  note: str = "") -> Dict:
+        """
+        現在の配賦条件と配賦計算結果を計画の新しいバージョンとして保存
+        
+        Args:
+            store: 保存先
+            name: 計画名
+            owner: 保存したユーザー
+            tags: タグ
+            note: メモ
+        
+        Returns:
+            {"owner", "name", "version", "created_at"}
+        """
+        return store.save(name, self.get_department_arrays(), self.calculate_allocated_arrays(),
+                          owner=owner, tags=tags, note=note, exact_yen=self.exact_yen)
+    
+    def load_plan(self, store: ScenarioStore, name: str, owner: str = "", version: int = None) -> Dict:
+        """
+        保存した計画を読み込み、事業部データ・配賦割合・負担調整・本部費用を置き換え
+        
+        保存時と計算方法（円単位の厳密計算の有無）が同じ場合は、保存した配賦計算結果をそのまま使用する
+        
+        Args:
+            store: 保存先
+            name: 計画名
+            owner: 保存したユーザー
+            version: バージョン。省略時は最新
+        
+        Returns:
+            ScenarioStore.load の結果
+        """
+        plan = store.load(name, owner, version)
+        arrays = plan["arrays"]
+        state = arrays.to_dicts()
+        self._replace_departments(DepartmentMaster(
+            list(arrays.names), arrays.margin_rate.copy(), arrays.fixed_cost.copy(), arrays.variable_cost.copy()))
+        self.allocation_ratios = state["allocation_ratios"]
+        self.cost_transfers = state["cost_transfers"]
+        self.headquarters_fixed_cost = state["headquarters_fixed_cost"]
+        self.headquarters_variable_cost = state["headquarters_variable_cost"]
+        
+        if (plan["result"] is not None and not plan["exact_yen"] and not self.exact_yen
+                and arrays.names == list(self.departments.keys())):
+            self._result_cache = plan["result"].freeze()
+        return plan
+    
+    def diff_scenarios(self, baseline: str, compared: List[str] = None) -> ScenarioDiff:
+        """
+        保存したシナリオ同士の差分を計算
+        
+        Args:
+            baseline: 基準シナリオ名
+            compared: 比較シナリオ名のリスト。省略時は基準以外のすべての保存シナリオ
+        
+        Returns:
+            事業部・項目ごとの差額と変化率
+        """
+        if compared is None:
+            compared = [name for name in self.saved_scenarios if name != baseline]
+        if not compared:
+            raise ValueError("比較するシナリオがありません")
+        base = self.saved_scenarios[baseline]
+        results = [self.saved_scenarios[name] for name in compared]
+        for name, result in zip(compared, results):
+            if result.names != base.names:
+                raise ValueError(f"事業部構成が基準シナリオと異なります: {name}")
+        return ScenarioDiff(base.names, base, stack_results(results), compared)
+    
+    def run_stress_test(self, shocks: List[Dict] = None) -> Dict:
+        """
+        現在の計画と保存したすべての計画にショックを適用し、黒字から赤字に転落する事業部を抽出
+        
+        Args:
+            shocks: ショックの一覧。省略時は default_shocks
+        
+        Returns:
+            StressTester.run の結果
+        """
+        arrays = self.get_department_arrays()
+        plans = {CURRENT_PLAN: arrays}
+        plans.update(self.saved_scenario_inputs)
+        if shocks is None:
+            shocks = default_shocks(arrays.names)
+        return StressTester(plans).run(shocks)
+    
+    def diff_ratio_scenarios(self, ratios: np.ndarray, scenario_names: List = None) -> ScenarioDiff:
+        """
+        現在の配賦計算結果を基準として、複数の配賦割合シナリオとの差分を一括計算
+        
+        Args:
+            ratios: 配賦割合のシナリオ (K, N, 2)
+            scenario_names: シナリオ名。省略時は 0 始まりの番号
+        """
+        baseline = self.calculate_allocated_arrays()
+        return ScenarioDiff(baseline.names, baseline, self.allocate_scenarios(ratios), scenario_names)
+    
+    def calculate_sensitivity(self) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        限界利益率・損益分岐点・営業利益の感応度（解析的な偏微分）を計算
+        
+        Returns:
+            {指標: {"ratios": (N, 2N), "hq_costs": (N, 2), "transfers": (N, 2N)}}
+        """
+        return compute_sensitivity(self.get_department_arrays())
+    
+    def update_hierarchical_allocation_ratios(self, local_ratios: Dict):
+        """
+        階層ごとの配賦割合（親の配賦額に対する割合）から各事業部の配賦割合を更新
+        
+        Args:
+            local_ratios: {ノード名: {"fixed": 割合, "variable": 割合}}
+                          例: ワークスに全体の50%、インサイドにワークス分の40%
+        """
+        self.update_allocation_ratios(self.hierarchy.cascade_allocation_ratios(local_ratios))
+    
+    def calculate_hierarchy_rollup(self) -> Dict[str, np.ndarray]:
+        """
+        配賦後の固定費・変動費・仮の売上総利益・損益分岐点を階層の各ノードに集計
+        
+        Returns:
+            各指標のノード数の配列（並びは hierarchy.names）
+        """
+        return self.hierarchy.rollup_allocation(self.calculate_allocated_arrays())
+    
+    def get_monthly_plan(self, seasonality: np.ndarray = None, hq_seasonality: np.ndarray = None) -> MonthlyPlan:
+        """
+        年間の事業部データ・本部費用を月次に按分した月次計画を取得
+        
+        Args:
+            seasonality: 事業部コストの月別構成比 (12,) または (12, N)。省略時は均等
+            hq_seasonality: 本部費用の月別構成比 (12,)。省略時は事業部の構成比の平均
+        """
+        return MonthlyPlan.from_department_arrays(self.get_department_arrays(), seasonality, hq_seasonality)
+    
+    def apply_transfer_graph(self, graph: TransferGraph, method: str = "reciprocal",
+                             order: List[str] = None) -> Dict[str, np.ndarray]:
+        """
+        事業部間の振替グラフを解き、振替後の差額を事業部間の負担調整（cost_transfers）に反映
+        
+        Args:
+            graph: 事業部間の振替グラフ（事業部名は departments と同じもの）
+            method: "reciprocal"（相互配賦法）または "step_down"（階梯式配賦法）
+            order: 階梯式配賦の配賦順
+        
+        Returns:
+            TransferGraph.solve の結果（固定費・変動費の2列）
+        """
+        direct_costs = np.array([
+            [self.departments[name]["fixed_cost"], self.departments[name]["variable_cost"]]
+            for name in graph.names
+        ], dtype=float)
+        result = graph.solve(direct_costs, method, order)
+        
+        # 振替でコストの合計が変わる場合（循環して解けない振替など）は反映しない
+        tolerance = 1e-6 * max(1.0, float(np.abs(direct_costs).sum()))
+        if not np.all(np.abs(result["conservation_error"]) <= tolerance):
+            raise ValueError(f"振替前後でコストの合計が一致しません: {result['conservation_error']}")
+        
+        transfers = {}
+        for i, dept_name in enumerate(graph.names):
+            transfers[f"{dept_name}_fixed"] = float(result["net_transfer"][i, 0])
+            transfers[f"{dept_name}_variable"] = float(result["net_transfer"][i, 1])
+        self.cost_transfers = transfers
+        return result
+    
+    def get_allocation_basis(self, extra_drivers: Dict = None) -> AllocationBasis:
+        """
+        配賦基準表を取得（事業部データから作成できる基準 + 追加の基準）
+        
+        Args:
+            extra_drivers: 追加の配賦基準 {基準名: 事業部順の値}（人員数・床面積など）
+        """
+        return AllocationBasis.from_department_arrays(self.get_department_arrays(), extra_drivers)
+    
+    def apply_driver_allocation(self, fixed_basis: Basis, variable_basis: Basis, extra_drivers: Dict = None) -> Dict:
+        """
+        配賦基準から本部費用の配賦割合を算出して更新
+        
+        Args:
+            fixed_basis: 本部固定費の配賦基準（基準名、または {基準名: 重み} の複合基準）
+            variable_basis: 本部変動費の配賦基準
+            extra_drivers: 追加の配賦基準
+        
+        Returns:
+            更新後の配賦割合
+        """
+        ratios = self.get_allocation_basis(extra_drivers).allocation_ratios(fixed_basis, variable_basis)
+        self.update_allocation_ratios(ratios)
+        return ratios
+    
+    def apply_cost_pools(self, pools: List[Dict], extra_drivers: Dict = None) -> Dict:
+        """
+        本部費用をコストプールごとの配賦基準で配賦し、本部費用と配賦割合を更新
+        
+        本部固定費・本部変動費はプールの合計、配賦割合は事業部ごとの配賦額の構成比となるため、
+        以降の配賦計算（calculate_allocated_costs など）の結果はプール別の配賦と一致する
+        （その後に本部費用・配賦割合・事業部データを変更した場合、プール別の内訳は破棄される）
+        
+        Args:
+            pools: CostPools 形式のコストプール定義
+            extra_drivers: 追加の配賦基準 {基準名: 事業部順の値}
+        
+        Returns:
+            CostPools.allocate の結果
+        """
+        cost_pools = CostPools(pools)
+        result = cost_pools.allocate(self.get_allocation_basis(extra_drivers))
+        
+        hq_fixed, hq_variable = cost_pools.totals()
+        self.headquarters_fixed_cost = float(hq_fixed)
+        self.headquarters_variable_cost = float(hq_variable)
+        self.update_allocation_ratios(result["allocation_ratios"])
+        self.headquarters_cost_pools = result
+        return result
+    
+    def get_cost_pool_breakdown(self) -> pd.DataFrame:
+        """
+        apply_cost_pools で配賦した 事業部 × プール の配賦額の内訳を取得
+        
+        Returns:
+            内訳の表（コストプール未設定時、または適用後に入力データを変更した場合は空の DataFrame）
+        """
+        if self.headquarters_cost_pools is None:
+            return pd.DataFrame()
+        return CostPools.drilldown(self.headquarters_cost_pools)
     
     def validate_allocation_ratios(self) -> bool:
         """配賦割合の合計が1.0になることを確認"""
@@ -150,6 +798,7 @@ class DataManager:
     def get_allocation_impact_analysis(self) -> Dict:
         """配賦の影響分析を取得（売上総利益調整版）"""
         impact_data = {}
+        allocated_costs = self.calculate_allocated_costs()
         
         for dept_name, dept_data in self.departments.items():
             # 配賦前のデータ
@@ -159,7 +808,7 @@ class DataManager:
             original_implied_sales = self.calculate_implied_sales(dept_name)
             
             # 配賦後のデータ
-            allocated = self.calculate_allocated_costs()[dept_name]
+            allocated = allocated_costs[dept_name]
             
             impact_data[dept_name] = {
                 "配賦前": {
@@ -191,11 +840,17 @@ class DataManager:
     
     def get_summary_data(self) -> pd.DataFrame:
         """サマリーデータをDataFrameで取得"""
+        if self.result_cache is not None:
+            return self.result_cache.get_or_create(
+                self.scenario_key(), "summary", self._build_summary_data, dump_dataframe, load_dataframe)
+        return self._build_summary_data()
+    
+    def _build_summary_data(self) -> pd.DataFrame:
         allocated_costs = self.calculate_allocated_costs()
         
         summary_data = []
         for dept_name, costs in allocated_costs.items():
-            bep = self.calculate_break_even_point(dept_name)
+            bep = costs["fixed_cost"] / costs["margin_rate"]
             summary_data.append({
                 "事業部": dept_name,
                 "元の限界利益率": f"{costs['original_margin_rate']:.1%}",
@@ -249,7 +904,7 @@ class DataManager:
                 profit_increase_rate = 0
             
             # 損益分岐点との差額を計算
-            break_even_point = self.calculate_break_even_point(dept_name)
+            break_even_point = costs["fixed_cost"] / costs["margin_rate"]
             
             contribution_data[dept_name] = {
                 "売上総利益増加額": sales_increase,
@@ -298,6 +953,50 @@ class DataManager:
         
         return pd.DataFrame(summary_data)
     
+    def calculate_required_sales(self, target_profit: float, max_growth: Dict = None,
+                                 shares: Dict = None) -> Dict:
+        """
+        全社の営業利益目標から各事業部に必要な仮の売上総利益を逆算
+        
+        Args:
+            target_profit: 全社の営業利益目標
+            max_growth: {事業部名: 仮の売上総利益の最大伸び率}
+            shares: {事業部名: 営業利益の不足額に対する負担割合}
+        
+        Returns:
+            各事業部の必要売上総利益と、目標の達成可否
+        """
+        result = GoalSeeker(self).solve([target_profit], max_growth, shares)
+        required_data = {}
+        for i, dept_name in enumerate(result["names"]):
+            required_data[dept_name] = {
+                "必要売上総利益": float(result["required_implied_sales"][0, i]),
+                "売上総利益増加額": float(result["sales_increase"][0, i]),
+                "必要伸び率": float(result["growth_rate"][0, i]),
+                "目標達成時営業利益": float(result["operating_profit"][0, i]),
+                "伸び率上限超過": bool(result["cap_exceeded"][0, i])
+            }
+        return {
+            "departments": required_data,
+            "current_profit": result["current_profit"],
+            "achieved_profit": float(result["achieved_profit"][0]),
+            "shortfall": float(result["shortfall"][0]),
+            "feasible": bool(result["feasible"][0])
+        }
+    
+    def calculate_safety_analytics(self, ratios: np.ndarray = None) -> Dict[str, np.ndarray]:
+        """
+        安全余裕額・安全余裕率・営業レバレッジ係数などを全事業部（・全シナリオ）について計算
+        
+        Args:
+            ratios: 配賦割合のシナリオ (K, N, 2)。省略時は現在の配賦割合
+        
+        Returns:
+            SAFETY_METRICS をキーとする (N,) または (K, N) 配列の辞書
+        """
+        allocated = self.calculate_allocated_arrays() if ratios is None else self.allocate_scenarios(ratios)
+        return allocation_safety_metrics(allocated)
+    
     def calculate_sales_profit_elasticity(self) -> Dict:
         """
         売上総利益-営業利益弾性を計算
@@ -306,43 +1005,22 @@ class DataManager:
         Returns:
             各事業部の売上総利益-営業利益弾性
         """
-        allocated_costs = self.calculate_allocated_costs()
-        elasticity_data = {}
+        allocated = self.calculate_allocated_arrays()
+        metrics = allocation_safety_metrics(allocated)
+        profit = operating_profit(allocated["implied_sales"], allocated["fixed_cost"])
         
-        for dept_name, costs in allocated_costs.items():
-            current_profit = costs["implied_sales"] - costs["fixed_cost"]
-            
-            # 売上総利益を1%増加させた場合の営業利益
-            increased_sales = costs["implied_sales"] * 1.01
-            increased_profit = increased_sales - costs["fixed_cost"]
-            
-            # 営業利益の増加率（営業利益が負の値の場合の処理を改善）
-            if current_profit > 0:
-                profit_increase_rate = (increased_profit - current_profit) / current_profit
-            elif current_profit < 0:
-                # 営業利益が負の値の場合、損失改善率として計算
-                if increased_profit > current_profit:
-                    profit_increase_rate = (increased_profit - current_profit) / abs(current_profit)
-                else:
-                    profit_increase_rate = 0
-            else:
-                # 営業利益が0の場合
-                profit_increase_rate = 0
-            
-            # 売上総利益-営業利益弾性 = 営業利益増加率 / 売上総利益増加率（1%）
-            elasticity = profit_increase_rate / 0.01
-            
-            # 営業利益マージン
-            if costs["implied_sales"] > 0:
-                profit_margin = current_profit / costs["implied_sales"]
-            else:
-                profit_margin = 0
-            
+        # 営業利益は売上総利益に対して傾き1の1次式のため、弾性は閉じた式で求まる
+        # （売上総利益1%増加時の営業利益増加率 = 弾性 × 1%）
+        elasticity = metrics["sales_profit_elasticity"]
+        
+        elasticity_data = {}
+        for i, dept_name in enumerate(allocated.names):
+            current_profit = profit[i]
             elasticity_data[dept_name] = {
-                "営業利益増加率": profit_increase_rate,
-                "売上総利益-営業利益弾性": elasticity,
-                "限界利益率": costs["margin_rate"],
+                "営業利益増加率": float(elasticity[i]) * 0.01,
+                "売上総利益-営業利益弾性": float(elasticity[i]),
+                "限界利益率": float(allocated["margin_rate"][i]),
                 "営業利益状態": "黒字" if current_profit > 0 else "赤字" if current_profit < 0 else "損益分岐"
             }
         
-        return elasticity_data 
\ No newline at end of file
+        return elasticity_data
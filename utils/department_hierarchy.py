@@ -0,0 +1,163 @@
+"""
+事業部階層モジュール
+親子関係を持つ事業部ツリーで、配賦割合の按分と各階層の集計を配列演算で行う
+"""
+
+import numpy as np
+from typing import Dict, List, Optional
+
+from utils.allocation_engine import AllocationResult
+
+
+class DepartmentHierarchy:
+    """
+    事業部の親子関係を保持するクラス
+
+    ノードを行きがけ順（pre-order）に並べると各ノードの部分木は連続した区間になるため、
+    部分木の合計は累積和の差として全ノード分を一度に計算できる（ツリーの深さに依存しない）
+    """
+
+    def __init__(self, parents: Dict[str, Optional[str]]):
+        """
+        Args:
+            parents: {ノード名: 親ノード名}。最上位のノードの親は None
+        """
+        for node, parent in parents.items():
+            if parent is not None and parent not in parents:
+                raise ValueError(f"親ノードが定義されていません: {node} -> {parent}")
+
+        names = list(parents.keys())
+        index = {name: i for i, name in enumerate(names)}
+        parent_index = np.array([index[p] if p is not None else -1 for p in parents.values()], dtype=np.int64)
+
+        # 子ノードの一覧（定義順）を作り、スタックで行きがけ順を求める
+        children: List[List[int]] = [[] for _ in names]
+        roots = []
+        for i, p in enumerate(parent_index):
+            (children[p] if p >= 0 else roots).append(i)
+
+        order = []
+        stack = roots[::-1]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(children[node][::-1])
+        if len(order) != len(names):
+            raise ValueError("事業部階層に循環があります")
+
+        order = np.array(order, dtype=np.int64)
+        position = np.empty(len(names), dtype=np.int64)
+        position[order] = np.arange(len(names))
+
+        # 部分木のサイズ（子から親へ加算。行きがけ順の逆順に処理すれば1回で済む）
+        subtree_size = np.ones(len(names), dtype=np.int64)
+        for node in order[::-1]:
+            if parent_index[node] >= 0:
+                subtree_size[parent_index[node]] += subtree_size[node]
+
+        self.names = names
+        self.parent_index = parent_index
+        self.order = order
+        self.position = position
+        self.subtree_end = position + subtree_size
+        self.is_leaf = np.array([not c for c in children])
+        self._index = index
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def index_of(self, node: str) -> int:
+        """ノード名から配列の添字を取得"""
+        return self._index[node]
+
+    def leaves(self) -> List[str]:
+        """末端ノード（配賦計算を行う事業部）の一覧"""
+        return [name for name, leaf in zip(self.names, self.is_leaf) if leaf]
+
+    def rollup(self, values: np.ndarray) -> np.ndarray:
+        """
+        各ノードの部分木の合計を計算
+
+        Args:
+            values: ノードごとの値 (..., ノード数)。集計済みでない値（通常は末端のみ非ゼロ）
+
+        Returns:
+            部分木の合計 (..., ノード数)
+        """
+        values = np.asarray(values, dtype=float)
+        ordered = values[..., self.order]
+        prefix = np.concatenate([np.zeros(values.shape[:-1] + (1,)), np.cumsum(ordered, axis=-1)], axis=-1)
+        return prefix[..., self.subtree_end] - prefix[..., self.position]
+
+    def cascade(self, local_ratios: np.ndarray) -> np.ndarray:
+        """
+        各階層で定義した配賦割合（親の配賦額に対する割合）を掛け合わせ、全体に対する割合を計算
+
+        根から各ノードまでの積は、行きがけ順で入る位置に +log、出る位置に -log を置いた
+        累積和として求める（0の割合は別途個数を数えて扱う）
+
+        Args:
+            local_ratios: ノードごとの親に対する割合 (..., ノード数)
+
+        Returns:
+            全体に対する割合 (..., ノード数)
+        """
+        local_ratios = np.asarray(local_ratios, dtype=float)
+        n = len(self.names)
+        zero = local_ratios <= 0
+        log_ratio = np.log(np.where(zero, 1.0, local_ratios))
+
+        # 複数のノードが同じ位置で部分木を抜けるため np.add.at で加算（ノード軸を先頭に移動）
+        events_shape = (n + 1,) + local_ratios.shape[:-1]
+        log_events = np.zeros(events_shape)
+        zero_events = np.zeros(events_shape)
+        np.add.at(log_events, self.position, np.moveaxis(log_ratio, -1, 0))
+        np.add.at(log_events, self.subtree_end, -np.moveaxis(log_ratio, -1, 0))
+        np.add.at(zero_events, self.position, np.moveaxis(zero, -1, 0).astype(float))
+        np.add.at(zero_events, self.subtree_end, -np.moveaxis(zero, -1, 0).astype(float))
+
+        path_log = np.moveaxis(np.cumsum(log_events, axis=0)[self.position], 0, -1)
+        path_zero = np.moveaxis(np.cumsum(zero_events, axis=0)[self.position], 0, -1)
+        return np.where(path_zero > 0.5, 0.0, np.exp(path_log))
+
+    def cascade_allocation_ratios(self, local_ratios: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+        """
+        各階層の配賦割合から末端ノードの配賦割合（DataManager.allocation_ratios 形式）を計算
+
+        Args:
+            local_ratios: {ノード名: {"fixed": 親に対する割合, "variable": 親に対する割合}}
+        """
+        local = np.zeros((2, len(self.names)))
+        for node, ratios in local_ratios.items():
+            i = self._index[node]
+            local[0, i] = ratios["fixed"]
+            local[1, i] = ratios["variable"]
+        effective = self.cascade(local)
+        return {
+            name: {"fixed": float(effective[0, i]), "variable": float(effective[1, i])}
+            for i, name in enumerate(self.names) if self.is_leaf[i]
+        }
+
+    def rollup_allocation(self, allocated: AllocationResult) -> Dict[str, np.ndarray]:
+        """
+        配賦後の固定費・変動費・仮の売上総利益を各ノードに集計し、ノード単位の損益分岐点を計算
+
+        Returns:
+            {"fixed_cost", "variable_cost", "implied_sales", "margin_rate", "break_even_point"}
+            のノード数の配列
+        """
+        leaf_index = np.array([self._index[name] for name in allocated.names], dtype=np.int64)
+        values = np.zeros((3, len(self.names)))
+        values[0, leaf_index] = allocated["fixed_cost"]
+        values[1, leaf_index] = allocated["variable_cost"]
+        values[2, leaf_index] = allocated["implied_sales"]
+        fixed_cost, variable_cost, implied_sales = self.rollup(values)
+
+        margin_rate = (implied_sales - variable_cost) / implied_sales
+        return {
+            "fixed_cost": fixed_cost,
+            "variable_cost": variable_cost,
+            "implied_sales": implied_sales,
+            "margin_rate": margin_rate,
+            "break_even_point": fixed_cost / margin_rate
+        }
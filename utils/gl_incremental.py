@@ -0,0 +1,361 @@
+"""
+仕訳明細の差分取込モジュール
+前回取り込んだ仕訳の位置（ウォーターマーク・CSV の読み込み済みバイト数）と事業部ごとの集計を
+状態ファイルに保存し、新しい仕訳のみを読み込んで集計を更新
+"""
+
+import hashlib
+import io
+import json
+import os
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.gl_ingestion import (
+    DEFAULT_CHUNK_SIZE,
+    GL_COLUMN_ALIASES,
+    GL_COLUMNS,
+    AccountMapping,
+    GLAggregator,
+    GLIngestionError,
+    Source,
+    classify_chunks,
+    read_gl_chunks
+)
+
+# ウォーターマークに使用できる列
+WATERMARK_COLUMNS = {
+    "line_id": "仕訳行番号",
+    "posting_date": "計上日"
+}
+
+# 状態ファイルの形式のバージョン
+STATE_VERSION = 2
+
+# ユーザーごとの状態ファイルの保存先
+DEFAULT_STATE_DIR = "data/gl_state"
+
+# 取込元が前回と同じ仕訳明細か（追記されただけか）を確認する CSV の先頭のバイト数
+SOURCE_PREFIX_BYTES = 64 * 1024
+
+
+def state_path_for(owner: str, directory: str = DEFAULT_STATE_DIR) -> str:
+    """
+    ユーザーごとの状態ファイルのパス
+
+    Args:
+        owner: ユーザー名（ハッシュ化してファイル名に使用）
+        directory: 保存先のディレクトリ
+    """
+    digest = hashlib.sha256(owner.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory, f"{digest}.json")
+
+
+def configuration_fingerprint(mapping: AccountMapping, watermark_column: str,
+                              department_map: Optional[Dict[str, str]] = None) -> str:
+    """集計結果に影響する取込条件（勘定科目の対応表・ウォーターマークの列・部門の対応）のハッシュ"""
+    payload = {
+        "accounts": sorted(mapping.accounts.items()),
+        "prefixes": sorted(mapping.prefixes.items()),
+        "watermark_column": watermark_column,
+        "department_map": sorted((department_map or {}).items())
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _watermark_values(values: pd.Series, column: str) -> pd.Series:
+    """ウォーターマークの列を比較できる値（仕訳行番号は整数、計上日は日時）に変換"""
+    if column == "posting_date":
+        converted = pd.to_datetime(values, errors="coerce")
+    else:
+        converted = pd.to_numeric(values, errors="coerce")
+    if converted.isna().any():
+        raise GLIngestionError(f"仕訳明細の{WATERMARK_COLUMNS[column]}に変換できない値があります（{int(converted.isna().sum())}件）")
+    return converted
+
+
+def _json_value(value):
+    """ウォーターマーク・統計情報の値を状態ファイルに保存できる値に変換"""
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).isoformat()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return value.item() if hasattr(value, "item") else value
+
+
+def _watermark_scalar(value, column: str):
+    """ウォーターマーク（状態ファイル・統計情報の値）を比較できる値に変換"""
+    if value is None:
+        return None
+    return _watermark_values(pd.Series([value]), column).iloc[0]
+
+
+class _CSVRange(io.RawIOBase):
+    """CSV のヘッダー行に続けて、ファイルの指定した範囲（前回の取込以降に追記された行）を読み込むストリーム"""
+
+    def __init__(self, file: BinaryIO, header: bytes, start: int, end: int):
+        """
+        Args:
+            file: CSV ファイル（バイナリ）
+            header: ヘッダー行（改行を含む）
+            start: 読み込みを始める位置（バイト）
+            end: 読み込みを終える位置（バイト）
+        """
+        self._file = file
+        self._header = header
+        self._start = start
+        self._length = len(header) + end - start
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._length}[whence]
+        self._position = min(max(base + offset, 0), self._length)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._length - self._position)
+        if size <= 0:
+            return 0
+        if self._position < len(self._header):
+            data = self._header[self._position:self._position + size]
+        else:
+            self._file.seek(self._start + self._position - len(self._header))
+            data = self._file.read(size)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+@contextmanager
+def _open_binary(source: Source) -> Iterator[BinaryIO]:
+    if isinstance(source, bytes):
+        yield io.BytesIO(source)
+    else:
+        with open(source, "rb") as f:
+            yield f
+
+
+def _prefix_digest(file: BinaryIO, length: int) -> str:
+    file.seek(0)
+    return hashlib.sha256(file.read(length)).hexdigest()
+
+
+def _parquet_identity(source: Source, watermark_column: str) -> Dict:
+    """Parquet の取込元の同一性（列名と最初の行グループの行数・ウォーターマークの列の範囲）"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise GLIngestionError("Parquet形式の読み込みには pyarrow が必要です") from e
+    parquet_file = pq.ParquetFile(io.BytesIO(source) if isinstance(source, bytes) else source)
+    identity = {"format": "parquet", "columns": parquet_file.schema_arrow.names, "first_row_group": None}
+    if parquet_file.num_row_groups > 0:
+        row_group = parquet_file.metadata.row_group(0)
+        statistics = None
+        for i in range(row_group.num_columns):
+            column = row_group.column(i)
+            name = GL_COLUMN_ALIASES.get(column.path_in_schema.strip(), column.path_in_schema.strip())
+            if name == watermark_column and column.statistics is not None and column.statistics.has_min_max:
+                statistics = [_json_value(column.statistics.min), _json_value(column.statistics.max)]
+        identity["first_row_group"] = {"num_rows": row_group.num_rows, "watermark": statistics}
+    return identity
+
+
+def filter_new_lines(chunks: Iterable[pd.DataFrame], column: str, watermark=None) -> Iterator[pd.DataFrame]:
+    """
+    ウォーターマークより後の仕訳のみを通す
+
+    Args:
+        chunks: read_gl_chunks の出力（column の列を含む）
+        column: ウォーターマークの列（WATERMARK_COLUMNS のキー）
+        watermark: 前回取り込んだ最後の値。None の場合はすべての仕訳を通す
+    """
+    for chunk in chunks:
+        values = _watermark_values(chunk[column], column)
+        new = chunk if watermark is None else chunk[(values > watermark).to_numpy()]
+        if len(new) > 0:
+            yield new
+
+
+class IncrementalGLIngestor:
+    """
+    ウォーターマークと事業部ごとの集計を状態ファイルに保存して仕訳明細を差分取込するクラス
+
+    CSV は前回読み込んだバイト数以降（追記された行）のみを読み込み、Parquet はウォーターマーク以前の
+    仕訳のみの行グループを統計情報から判定して読み飛ばす（どちらも読み込んだ仕訳はウォーターマークで絞り込む）。
+    状態ファイルには取込条件と取込元のハッシュを保存し、異なる条件・仕訳明細での更新はエラーとする
+    """
+
+    def __init__(self, state_path: str, mapping: Optional[AccountMapping] = None,
+                 watermark_column: str = "line_id", department_map: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            state_path: 状態ファイル（JSON）のパス（state_path_for でユーザーごとに分ける）。
+                        存在しない場合は最初からすべて取り込む
+            mapping: 勘定科目の対応表。省略時は勘定科目コードの先頭で分類
+            watermark_column: ウォーターマークの列（WATERMARK_COLUMNS のキー）。
+                              仕訳はこの列の昇順に追記されること（計上日の場合は取込済みの日付に
+                              仕訳が追加されないこと）を前提とする
+            department_map: {仕訳明細の部門: 事業部名}
+
+        Raises:
+            GLIngestionError: 状態ファイルの形式・取込条件が異なる場合
+        """
+        if watermark_column not in WATERMARK_COLUMNS:
+            raise GLIngestionError(f"未対応のウォーターマークの列です: {watermark_column}")
+        self.state_path = state_path
+        self.mapping = mapping or AccountMapping()
+        self.watermark_column = watermark_column
+        self.department_map = department_map
+        self.fingerprint = configuration_fingerprint(self.mapping, watermark_column, department_map)
+        self.aggregator = GLAggregator()
+        self.watermark = None
+        # 取込元の同一性と読み込み済みの位置（update で設定）
+        self.source = None
+
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") != STATE_VERSION:
+                raise GLIngestionError(f"状態ファイルの形式が異なります: {state_path}")
+            if state["watermark_column"] != watermark_column:
+                raise GLIngestionError(
+                    f"状態ファイルのウォーターマークの列（{state['watermark_column']}）が指定と異なります")
+            if state["fingerprint"] != self.fingerprint:
+                raise GLIngestionError(
+                    "勘定科目の対応表・部門の対応が前回の取込と異なります（最初から取り込む場合は状態ファイルを削除してください）")
+            self.aggregator = GLAggregator.from_state(state["aggregate"])
+            self.watermark = _watermark_scalar(state["watermark"], watermark_column)
+            self.source = state["source"]
+
+    def _keep_row_group(self, statistics: Dict[str, tuple]) -> bool:
+        """ウォーターマーク以前の仕訳のみの行グループは読み飛ばす"""
+        if self.watermark is None or self.watermark_column not in statistics:
+            return True
+        return _watermark_scalar(statistics[self.watermark_column][1], self.watermark_column) > self.watermark
+
+    def _track_watermark(self, chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """通過した仕訳のウォーターマークの列の最大値を記録"""
+        for chunk in chunks:
+            latest = _watermark_values(chunk[self.watermark_column], self.watermark_column).max()
+            if self.watermark is None or latest > self.watermark:
+                self.watermark = latest
+            yield chunk
+
+    def _source_mismatch(self):
+        return GLIngestionError(
+            "前回の取込と異なる仕訳明細です（追記以外の変更がある場合は状態ファイルを削除して最初から取り込んでください）")
+
+    def _consume(self, chunks: Iterable[pd.DataFrame]):
+        chunks = self._track_watermark(filter_new_lines(chunks, self.watermark_column, self.watermark))
+        self.aggregator.consume(classify_chunks(chunks, self.mapping, self.department_map))
+
+    def _update_csv(self, source: Source, chunk_size: int, columns: tuple):
+        """前回読み込んだバイト数以降の行のみを読み込む（ファイルの先頭が前回と一致すること）"""
+        with _open_binary(source) as f:
+            size = f.seek(0, io.SEEK_END)
+            start = None
+            if self.source is not None:
+                if (self.source.get("format") != "csv" or size < self.source["offset"]
+                        or _prefix_digest(f, self.source["prefix_bytes"]) != self.source["prefix_sha256"]):
+                    raise self._source_mismatch()
+                start = self.source["offset"]
+            f.seek(0)
+            header = f.readline()
+            if start is None:
+                start = len(header)
+            stream = io.BufferedReader(_CSVRange(f, header, start, size))
+            self._consume(read_gl_chunks(stream, chunk_size, "csv", columns))
+
+            prefix_bytes = min(size, SOURCE_PREFIX_BYTES)
+            self.source = {
+                "format": "csv",
+                "prefix_bytes": prefix_bytes,
+                "prefix_sha256": _prefix_digest(f, prefix_bytes),
+                "offset": size
+            }
+
+    def _update_parquet(self, source: Source, chunk_size: int, columns: tuple):
+        """ウォーターマーク以前の仕訳のみの行グループを読み飛ばす（最初の行グループが前回と一致すること）"""
+        identity = _parquet_identity(source, self.watermark_column)
+        if self.source is not None and self.source != identity:
+            raise self._source_mismatch()
+        self._consume(read_gl_chunks(source, chunk_size, "parquet", columns, row_group_filter=self._keep_row_group))
+        self.source = identity
+
+    def update(self, source: Source, chunk_size: int = DEFAULT_CHUNK_SIZE, file_format: Optional[str] = None,
+               save: bool = True) -> Dict:
+        """
+        ウォーターマークより後の仕訳を集計に加算し、ウォーターマークを進める
+
+        Args:
+            source: 仕訳明細のファイルパスまたは内容（ウォーターマークの列を含むこと）。
+                    CSV は行単位で末尾に追記されること（取込済みの行を変更しないこと）を前提とする
+            chunk_size: 1チャンクあたりの行数
+            file_format: "csv" / "parquet"。省略時は拡張子から判定
+            save: Trueの場合、更新後の状態を状態ファイルに保存
+
+        Returns:
+            {"new_lines": 取り込んだ仕訳行数, "changed": 集計が変わった事業部名,
+             "added": 新しく現れた事業部名, "watermark": 更新後のウォーターマーク}
+
+        Raises:
+            GLIngestionError: 前回の取込と異なる仕訳明細の場合
+        """
+        if file_format is None:
+            is_parquet = not isinstance(source, bytes) and os.fspath(source).lower().endswith(".parquet")
+            file_format = "parquet" if is_parquet else "csv"
+        previous_names = list(self.aggregator.names)
+        previous_totals = self.aggregator.totals.copy()
+        previous_lines = int(self.aggregator.line_counts.sum()) + self.aggregator.unmapped_lines
+
+        columns = GL_COLUMNS + (self.watermark_column,)
+        if file_format == "csv":
+            self._update_csv(source, chunk_size, columns)
+        elif file_format == "parquet":
+            self._update_parquet(source, chunk_size, columns)
+        else:
+            raise GLIngestionError(f"未対応のファイル形式です: {file_format}")
+
+        n_previous = len(previous_names)
+        changed_rows = np.any(self.aggregator.totals[:n_previous] != previous_totals, axis=1)
+        changed = [name for name, flag in zip(previous_names, changed_rows) if flag]
+        added = self.aggregator.names[n_previous:]
+        if save:
+            self.save()
+        return {
+            "new_lines": int(self.aggregator.line_counts.sum()) + self.aggregator.unmapped_lines - previous_lines,
+            "changed": changed + added,
+            "added": list(added),
+            "watermark": self.watermark
+        }
+
+    def save(self):
+        """状態ファイルに保存（一時ファイルに書き込んでから置き換える）"""
+        state = {
+            "version": STATE_VERSION,
+            "fingerprint": self.fingerprint,
+            "watermark_column": self.watermark_column,
+            "watermark": None if self.watermark is None else _json_value(self.watermark),
+            "source": self.source,
+            "aggregate": self.aggregator.to_state()
+        }
+        directory = os.path.dirname(os.path.abspath(self.state_path))
+        os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{self.state_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temporary_path, self.state_path)
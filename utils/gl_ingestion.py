@@ -0,0 +1,395 @@
+"""
+総勘定元帳（仕訳明細）取込モジュール
+仕訳明細をチャンク単位で読み込み、勘定科目コードで売上・変動費・固定費に分類して事業部ごとに集計
+（読み込み → 分類 → 集計 をジェネレーターでつなぎ、ファイルの大きさによらずメモリ使用量を一定に保つ）
+"""
+
+import io
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from utils.master_data import DepartmentMaster, csv_encoding
+
+# 勘定科目の区分（集計配列の列の並び）
+GL_CATEGORIES = {
+    "sales": "売上",
+    "variable": "変動費",
+    "fixed": "固定費"
+}
+_CATEGORY_INDEX = {category: i for i, category in enumerate(GL_CATEGORIES)}
+_CATEGORY_ALIASES = {**{category: category for category in GL_CATEGORIES},
+                     **{label: category for category, label in GL_CATEGORIES.items()}}
+
+# 勘定科目コードの先頭による標準の分類（4: 売上高、5: 売上原価、6・7: 販売費及び一般管理費）
+DEFAULT_ACCOUNT_PREFIXES = {
+    "4": "sales",
+    "5": "variable",
+    "6": "fixed",
+    "7": "fixed"
+}
+
+# 列名の別名（日本語の列名でも読み込めるようにする）
+GL_COLUMN_ALIASES = {
+    "部門": "department",
+    "事業部": "department",
+    "勘定科目": "account",
+    "勘定科目コード": "account",
+    "金額": "amount",
+    "計上日": "posting_date",
+    "仕訳行番号": "line_id"
+}
+
+GL_COLUMNS = ("department", "account", "amount")
+
+# 1チャンクあたりの仕訳行数
+DEFAULT_CHUNK_SIZE = 500_000
+
+Source = Union[str, bytes, os.PathLike]
+
+
+class GLIngestionError(ValueError):
+    """仕訳明細・勘定科目の対応表の形式・値が不正な場合のエラー"""
+
+
+class AccountMapping:
+    """勘定科目コード → 区分（売上・変動費・固定費）の対応表"""
+
+    def __init__(self, accounts: Optional[Dict[str, str]] = None, prefixes: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            accounts: {勘定科目コード: 区分}（完全一致。prefixes より優先）
+            prefixes: {勘定科目コードの先頭: 区分}（長い先頭ほど優先）。
+                      accounts・prefixes とも省略した場合は DEFAULT_ACCOUNT_PREFIXES
+        """
+        if accounts is None and prefixes is None:
+            prefixes = DEFAULT_ACCOUNT_PREFIXES
+        self.accounts = {str(code).strip(): self._category_index(category)
+                         for code, category in (accounts or {}).items()}
+        self.prefixes = {str(prefix).strip(): self._category_index(category)
+                         for prefix, category in (prefixes or {}).items()}
+
+    @staticmethod
+    def _category_index(category: str) -> int:
+        if category not in _CATEGORY_ALIASES:
+            raise GLIngestionError(f"未対応の区分です: {category}（sales / variable / fixed）")
+        return _CATEGORY_INDEX[_CATEGORY_ALIASES[category]]
+
+    def classify_code(self, account: str) -> int:
+        """1つの勘定科目コードを区分の番号に変換（対応しないコードは -1）"""
+        account = str(account).strip()
+        if account in self.accounts:
+            return self.accounts[account]
+        for length in range(len(account), 0, -1):
+            if account[:length] in self.prefixes:
+                return self.prefixes[account[:length]]
+        return -1
+
+    def classify(self, accounts: pd.Series) -> np.ndarray:
+        """
+        勘定科目コードを区分の番号（GL_CATEGORIES の並び。対応しないコードは -1）に変換
+
+        勘定科目コードの種類は仕訳行数に比べて少ないため、重複を除いたコードのみ分類して展開する
+
+        Args:
+            accounts: 勘定科目コード
+        """
+        codes, uniques = pd.factorize(accounts)
+        table = np.array([self.classify_code(account) for account in uniques] + [-1], dtype=np.int8)
+        # 欠損（codes == -1）は末尾の -1 を参照
+        return table[codes]
+
+
+# CSVの文字コードの判定に使用する先頭のバイト数
+_ENCODING_SAMPLE_BYTES = 1024 * 1024
+
+# CSVの読み込みで発生する pandas・文字コードのエラー（GLIngestionError に変換する）
+_CSV_ERRORS = (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError)
+
+
+def _source_label(source) -> str:
+    """エラーメッセージに表示する取込元の名前"""
+    if isinstance(source, bytes):
+        return "アップロードされたファイル"
+    name = getattr(source, "name", source)
+    return os.path.basename(os.fspath(name)) if isinstance(name, (str, os.PathLike)) else "仕訳明細"
+
+
+def _detect_encoding(buffer) -> str:
+    """ファイルパスまたはファイルオブジェクトの先頭から CSV の文字コードを判定"""
+    if hasattr(buffer, "read"):
+        buffer.seek(0)
+        sample = buffer.read(_ENCODING_SAMPLE_BYTES)
+        buffer.seek(0)
+    else:
+        with open(buffer, "rb") as f:
+            sample = f.read(_ENCODING_SAMPLE_BYTES)
+    return csv_encoding(sample)
+
+
+def load_account_mapping(source: Source) -> AccountMapping:
+    """
+    勘定科目の対応表（CSV）を読み込み
+
+    列: 区分（category）と、勘定科目コード（account）または勘定科目コードの先頭（prefix）
+
+    Args:
+        source: ファイルパスまたはファイルの内容（UTF-8 または Shift_JIS）
+
+    Raises:
+        GLIngestionError: 読み込めない場合、区分が空または未対応の行がある場合
+    """
+    if isinstance(source, bytes):
+        content = source
+    else:
+        with open(source, "rb") as f:
+            content = f.read()
+    try:
+        table = pd.read_csv(io.BytesIO(content), dtype=str, encoding=csv_encoding(content))
+    except _CSV_ERRORS as e:
+        raise GLIngestionError(f"勘定科目の対応表を読み込めません（{_source_label(source)}）: {e}") from e
+    table.columns = [{"区分": "category", "先頭": "prefix"}.get(column, GL_COLUMN_ALIASES.get(column, column))
+                     for column in (str(column).strip() for column in table.columns)]
+    if "category" not in table.columns or not {"account", "prefix"} & set(table.columns):
+        raise GLIngestionError("勘定科目の対応表には 区分 と 勘定科目コード（または 先頭）の列が必要です")
+
+    accounts = {}
+    prefixes = {}
+    for line, row in enumerate(table.to_dict("records"), start=2):
+        if pd.isna(row.get("account")) and pd.isna(row.get("prefix")):
+            continue
+        category = row["category"]
+        if pd.isna(category) or category.strip() not in _CATEGORY_ALIASES:
+            raise GLIngestionError(
+                f"勘定科目の対応表の{line}行目の区分が空または未対応です: {category}（sales / variable / fixed）")
+        if pd.notna(row.get("account")):
+            accounts[row["account"]] = category.strip()
+        else:
+            prefixes[row["prefix"]] = category.strip()
+    return AccountMapping(accounts, prefixes)
+
+
+def read_gl_chunks(source: Source, chunk_size: int = DEFAULT_CHUNK_SIZE, file_format: Optional[str] = None,
+                   columns: Iterable[str] = GL_COLUMNS,
+                   row_group_filter: Optional[Callable[[Dict[str, tuple]], bool]] = None) -> Iterator[pd.DataFrame]:
+    """
+    仕訳明細をチャンク単位で読み込み（必要な列のみ、列名は正規化済み）
+
+    Args:
+        source: ファイルパス、ファイルの内容、またはバイナリのファイルオブジェクト（先頭から読み込む）。
+                CSV は UTF-8 または Shift_JIS
+        chunk_size: 1チャンクあたりの行数
+        file_format: "csv" / "parquet"。省略時は拡張子から判定（内容を渡す場合は csv）
+        columns: 読み込む列（正規化後の列名）
+        row_group_filter: Parquet の行グループの統計情報 {列: (最小値, 最大値)} を受け取り、
+                          読み込む場合に True を返す関数（CSV では使用しない）
+    """
+    if file_format is None:
+        is_parquet = not isinstance(source, bytes) and os.fspath(source).lower().endswith(".parquet")
+        file_format = "parquet" if is_parquet else "csv"
+    columns = list(columns)
+    buffer = io.BytesIO(source) if isinstance(source, bytes) else source
+
+    if file_format == "csv":
+        # UTF-8 で読めない場合は Shift_JIS（cp932）として読み込む（文字コードは先頭から判定）
+        encoding = _detect_encoding(buffer)
+        lines_read = 0
+        try:
+            header = pd.read_csv(buffer, nrows=0, encoding=encoding).columns
+            renames = {column: GL_COLUMN_ALIASES.get(column.strip(), column.strip()) for column in header}
+            usecols = [column for column in header if renames[column] in columns]
+            _require_gl_columns([renames[column] for column in usecols], columns)
+            if hasattr(buffer, "seek"):
+                buffer.seek(0)
+            dtypes = {column: str for column in usecols if renames[column] in ("department", "account")}
+            reader = pd.read_csv(buffer, usecols=usecols, dtype=dtypes, chunksize=chunk_size, encoding=encoding)
+            for chunk in reader:
+                lines_read += len(chunk)
+                yield chunk.rename(columns=renames)
+        except _CSV_ERRORS as e:
+            raise GLIngestionError(
+                f"仕訳明細を読み込めません（{_source_label(source)}、{lines_read + 2}行目以降）: {e}") from e
+    elif file_format == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise GLIngestionError("Parquet形式の読み込みには pyarrow が必要です") from e
+        parquet_file = pq.ParquetFile(buffer)
+        header = parquet_file.schema_arrow.names
+        renames = {column: GL_COLUMN_ALIASES.get(column.strip(), column.strip()) for column in header}
+        usecols = [column for column in header if renames[column] in columns]
+        _require_gl_columns([renames[column] for column in usecols], columns)
+        row_groups = [i for i in range(parquet_file.num_row_groups)
+                      if row_group_filter is None or row_group_filter(_row_group_statistics(parquet_file, i, renames))]
+        if not row_groups:
+            return
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, row_groups=row_groups, columns=usecols):
+            yield batch.to_pandas().rename(columns=renames)
+    else:
+        raise GLIngestionError(f"未対応のファイル形式です: {file_format}")
+
+
+def _row_group_statistics(parquet_file, index: int, renames: Dict[str, str]) -> Dict[str, tuple]:
+    """Parquet の行グループの列ごとの (最小値, 最大値)（統計情報がない列は含めない）"""
+    row_group = parquet_file.metadata.row_group(index)
+    statistics = {}
+    for i in range(row_group.num_columns):
+        column = row_group.column(i)
+        if column.statistics is not None and column.statistics.has_min_max:
+            name = renames.get(column.path_in_schema, column.path_in_schema)
+            statistics[name] = (column.statistics.min, column.statistics.max)
+    return statistics
+
+
+def _require_gl_columns(found: List[str], columns: List[str]):
+    missing = [column for column in columns if column not in found]
+    if missing:
+        raise GLIngestionError(f"仕訳明細に必要な列がありません: {missing}")
+
+
+def classify_chunks(chunks: Iterable[pd.DataFrame], mapping: AccountMapping,
+                    department_map: Optional[Dict[str, str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    チャンクごとに区分（category 列）を付与し、金額を数値に変換
+
+    Args:
+        chunks: read_gl_chunks の出力
+        mapping: 勘定科目の対応表
+        department_map: {仕訳明細の部門: 事業部名}。対応しない部門はそのままの名前で集計
+    """
+    for chunk in chunks:
+        amounts = pd.to_numeric(chunk["amount"], errors="coerce")
+        if amounts.isna().any():
+            raise GLIngestionError(f"仕訳明細の金額に数値でない値があります（{int(amounts.isna().sum())}件）")
+        codes, uniques = pd.factorize(chunk["department"])
+        names = np.array([str(name).strip() for name in uniques], dtype=object)
+        if department_map:
+            names = np.array([department_map.get(name, name) for name in names], dtype=object)
+        # 部門が空の行は未分類として扱う
+        categories = np.where(codes >= 0, mapping.classify(chunk["account"]), -1).astype(np.int8)
+        departments = pd.Series(np.append(names, "")[codes], index=chunk.index)
+        yield chunk.assign(department=departments, amount=amounts.to_numpy(dtype=float), category=categories)
+
+
+class GLAggregator:
+    """事業部 × 区分 の金額合計（事業部は出現順に番号を振り、チャンクごとに bincount で加算）"""
+
+    def __init__(self):
+        self.names: List[str] = []
+        self._index: Dict[str, int] = {}
+        self.totals = np.zeros((0, len(GL_CATEGORIES)))
+        self.line_counts = np.zeros(0, dtype=np.int64)
+        self.unmapped_lines = 0
+        self.unmapped_amount = 0.0
+
+    def _department_codes(self, departments: pd.Series) -> np.ndarray:
+        """事業部名を通し番号に変換（新しい事業部は末尾に追加）"""
+        codes, uniques = pd.factorize(departments)
+        for name in uniques:
+            if name not in self._index:
+                self._index[name] = len(self.names)
+                self.names.append(name)
+        n = len(self.names)
+        if n > len(self.totals):
+            self.totals = np.vstack([self.totals, np.zeros((n - len(self.totals), len(GL_CATEGORIES)))])
+            self.line_counts = np.concatenate([self.line_counts, np.zeros(n - len(self.line_counts), dtype=np.int64)])
+        lookup = np.array([self._index[name] for name in uniques], dtype=np.int64)
+        return lookup[codes]
+
+    def add(self, chunk: pd.DataFrame):
+        """区分付きのチャンク（classify_chunks の出力）を集計に加算"""
+        categories = chunk["category"].to_numpy()
+        amounts = chunk["amount"].to_numpy(dtype=float)
+        mapped = categories >= 0
+        self.unmapped_lines += int(np.count_nonzero(~mapped))
+        self.unmapped_amount += float(amounts[~mapped].sum())
+
+        codes = self._department_codes(chunk["department"][mapped])
+        n = len(self.names)
+        n_categories = len(GL_CATEGORIES)
+        self.totals += np.bincount(codes * n_categories + categories[mapped],
+                                   weights=amounts[mapped], minlength=n * n_categories).reshape(n, n_categories)
+        self.line_counts += np.bincount(codes, minlength=n)
+
+    def consume(self, chunks: Iterable[pd.DataFrame]) -> "GLAggregator":
+        """チャンクをすべて集計に加算"""
+        for chunk in chunks:
+            self.add(chunk)
+        return self
+
+    def to_state(self) -> Dict:
+        """JSONで保存できる形式に変換"""
+        return {
+            "names": list(self.names),
+            "totals": self.totals.tolist(),
+            "line_counts": self.line_counts.tolist(),
+            "unmapped_lines": self.unmapped_lines,
+            "unmapped_amount": self.unmapped_amount
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "GLAggregator":
+        """to_state の結果から集計を復元"""
+        aggregator = cls()
+        aggregator.names = list(state["names"])
+        aggregator._index = {name: i for i, name in enumerate(aggregator.names)}
+        aggregator.totals = np.array(state["totals"], dtype=float).reshape(len(aggregator.names), len(GL_CATEGORIES))
+        aggregator.line_counts = np.array(state["line_counts"], dtype=np.int64)
+        aggregator.unmapped_lines = int(state["unmapped_lines"])
+        aggregator.unmapped_amount = float(state["unmapped_amount"])
+        return aggregator
+
+    def column(self, category: str) -> np.ndarray:
+        """区分ごとの金額合計 (N,)"""
+        return self.totals[:, _CATEGORY_INDEX[category]]
+
+    @property
+    def margin_rate(self) -> np.ndarray:
+        """限界利益率 = (売上 - 変動費) / 売上（売上が0の事業部は NaN）"""
+        sales = self.column("sales")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(sales != 0, 1.0 - self.column("variable") / sales, np.nan)
+
+    def to_department_master(self) -> DepartmentMaster:
+        """
+        事業部マスター形式に変換（限界利益率・固定費・変動費）
+
+        Raises:
+            GLIngestionError: 売上がない、または限界利益率が0より大きく1未満にならない事業部がある場合
+        """
+        margin_rate = self.margin_rate
+        invalid = ~((margin_rate > 0) & (margin_rate < 1))
+        invalid |= (self.column("fixed") < 0) | (self.column("variable") < 0)
+        if invalid.any():
+            names = [name for name, flag in zip(self.names, invalid) if flag]
+            raise GLIngestionError(f"売上・費用から限界利益率を計算できない事業部があります: {names}")
+        return DepartmentMaster(list(self.names), margin_rate.copy(), self.column("fixed").copy(),
+                                self.column("variable").copy())
+
+    def get_summary_data(self) -> pd.DataFrame:
+        """事業部ごとの集計結果をDataFrameで取得"""
+        summary = pd.DataFrame(self.totals, index=self.names, columns=list(GL_CATEGORIES.values()))
+        summary["限界利益率"] = self.margin_rate
+        summary["仕訳行数"] = self.line_counts
+        return summary
+
+
+def ingest_general_ledger(source: Source, mapping: Optional[AccountMapping] = None,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE, file_format: Optional[str] = None,
+                          department_map: Optional[Dict[str, str]] = None) -> GLAggregator:
+    """
+    仕訳明細を読み込み、事業部ごとの売上・変動費・固定費を集計
+
+    金額は区分ごとの通常の符号（売上・費用とも正）で記録されていることを前提とする
+
+    Args:
+        source: ファイルパスまたはファイルの内容（列: 部門, 勘定科目コード, 金額）
+        mapping: 勘定科目の対応表。省略時は DEFAULT_ACCOUNT_PREFIXES
+        chunk_size: 1チャンクあたりの行数
+        file_format: "csv" / "parquet"。省略時は拡張子から判定
+        department_map: {仕訳明細の部門: 事業部名}
+    """
+    chunks = read_gl_chunks(source, chunk_size, file_format)
+    return GLAggregator().consume(classify_chunks(chunks, mapping or AccountMapping(), department_map))
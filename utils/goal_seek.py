@@ -0,0 +1,143 @@
+"""
+目標逆算モジュール
+全社の営業利益目標から、各事業部に必要な仮の売上総利益を逆算（複数の目標値を一括で計算）
+"""
+
+import numpy as np
+from typing import Dict, Mapping, Optional, Sequence
+
+from utils.allocation_engine import operating_profit
+
+
+class GoalSeeker:
+    """
+    営業利益目標を達成するための事業部ごとの仮の売上総利益を求めるクラス
+
+    営業利益は operating_profit と同じく 仮の売上総利益 − 固定費 とするため、
+    営業利益の増加額は売上総利益増加額と等しい（固定費は変わらないものとする）
+    """
+
+    def __init__(self, data_manager):
+        """
+        Args:
+            data_manager: 事業部データを保持するDataManager
+        """
+        self.data_manager = data_manager
+
+    def _current(self):
+        """配賦後の仮の売上総利益・固定費・営業利益"""
+        allocated = self.data_manager.calculate_allocated_arrays()
+        implied_sales = allocated["implied_sales"]
+        fixed_cost = allocated["fixed_cost"]
+        return allocated.names, implied_sales, fixed_cost, operating_profit(implied_sales, fixed_cost)
+
+    @staticmethod
+    def _fill(gaps: np.ndarray, weights: np.ndarray, caps: np.ndarray) -> np.ndarray:
+        """
+        上限付きの按分: 増加額 = min(上限, λ × 重み) として Σ 増加額 = 不足額 となる λ を求める
+
+        Σ の値は λ について区分線形の単調増加関数であり、折れ点（λ = 上限 / 重み）を並べ替えておけば
+        各目標値の λ は二分探索（searchsorted）と1次式で厳密に求まる
+
+        Args:
+            gaps: 営業利益の不足額 (K,)
+            weights: 按分の重み (N,)。0の事業部には按分しない
+            caps: 売上総利益増加額の上限 (N,)。上限なしは inf
+
+        Returns:
+            売上総利益増加額 (K, N)。上限に達しても不足する場合は上限の値
+        """
+        active = weights > 0
+        breakpoints = np.full(len(weights), np.inf)
+        breakpoints[active] = caps[active] / weights[active]
+        order = np.argsort(breakpoints)
+        sorted_breaks = breakpoints[order]
+
+        # λ が k 番目の折れ点を超えると、その事業部は上限で固定され傾きから外れる
+        slope_terms = np.where(active, weights, 0.0)[order]
+        capped_terms = np.where(np.isfinite(sorted_breaks), caps[order], 0.0)
+        slopes = np.concatenate([np.cumsum(slope_terms[::-1])[::-1], [0.0]])
+        capped_sums = np.concatenate([[0.0], np.cumsum(capped_terms)])
+
+        finite = np.isfinite(sorted_breaks)
+        break_lambdas = sorted_breaks[finite]
+        break_values = capped_sums[:len(break_lambdas)] + break_lambdas * slopes[:len(break_lambdas)]
+
+        segment = np.searchsorted(break_values, gaps, side="left")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lam = np.where(slopes[segment] > 0, (gaps - capped_sums[segment]) / slopes[segment], np.inf)
+        with np.errstate(invalid="ignore"):
+            increase = np.minimum(caps[None, :], lam[:, None] * weights[None, :])
+        return np.where(active[None, :], increase, 0.0)
+
+    def solve(self, targets: Sequence[float], max_growth: Optional[Mapping[str, float]] = None,
+              shares: Optional[Mapping[str, float]] = None,
+              weights: Optional[Mapping[str, float]] = None) -> Dict:
+        """
+        全社の営業利益目標ごとに、各事業部に必要な仮の売上総利益を計算
+
+        shares で指定した事業部は不足額のうち固定の割合を負担し、残りの不足額は他の事業部に
+        重み（省略時は現在の仮の売上総利益、つまり同じ伸び率）で按分する。
+        max_growth を超える事業部は上限で止め、超過分は他の事業部に回す
+
+        Args:
+            targets: 全社の営業利益目標 (K,)
+            max_growth: {事業部名: 仮の売上総利益の最大伸び率}（例: 0.2 は20%増まで）
+            shares: {事業部名: 不足額に対する負担割合}
+            weights: {事業部名: 按分の重み}（shares を指定していない事業部が対象）
+
+        Returns:
+            {"names", "targets", "current_profit": 現在の全社営業利益,
+             "required_implied_sales" / "sales_increase" / "growth_rate" / "operating_profit": (K, N),
+             "achieved_profit": (K,), "shortfall": 目標に届かない額 (K,), "feasible": (K,),
+             "cap_exceeded": 負担割合の事業部が伸び率上限を超える箇所 (K, N)}
+        """
+        names, implied_sales, fixed_cost, profit = self._current()
+        index = {name: i for i, name in enumerate(names)}
+        targets = np.atleast_1d(np.asarray(targets, dtype=float))
+        n = len(names)
+
+        caps = np.full(n, np.inf)
+        for dept_name, rate in (max_growth or {}).items():
+            caps[index[dept_name]] = rate * implied_sales[index[dept_name]]
+
+        fixed_shares = np.zeros(n)
+        for dept_name, share in (shares or {}).items():
+            fixed_shares[index[dept_name]] = share
+        if fixed_shares.sum() > 1.0 + 1e-9:
+            raise ValueError(f"負担割合の合計が1を超えています: {fixed_shares.sum()}")
+
+        fill_weights = implied_sales.copy() if weights is None else np.zeros(n)
+        for dept_name, weight in (weights or {}).items():
+            fill_weights[index[dept_name]] = weight
+        fill_weights[fixed_shares > 0] = 0.0
+
+        current_profit = float(profit.sum())
+        gaps = targets - current_profit
+
+        # 負担割合を指定した事業部: 増加額 = 不足額 × 割合
+        increase = gaps[:, None] * fixed_shares[None, :]
+        cap_exceeded = increase > caps[None, :]
+
+        remaining = gaps * (1.0 - fixed_shares.sum())
+        if np.any(fill_weights > 0):
+            increase = increase + self._fill(remaining, fill_weights, caps)
+
+        required_implied_sales = implied_sales + increase
+        department_profit = operating_profit(required_implied_sales, fixed_cost)
+        achieved = department_profit.sum(axis=1)
+        shortfall = np.maximum(targets - achieved, 0.0)
+        tolerance = 1e-9 * np.maximum(1.0, np.abs(targets))
+        return {
+            "names": list(names),
+            "targets": targets,
+            "current_profit": current_profit,
+            "required_implied_sales": required_implied_sales,
+            "sales_increase": increase,
+            "growth_rate": increase / implied_sales,
+            "operating_profit": department_profit,
+            "achieved_profit": achieved,
+            "shortfall": shortfall,
+            "feasible": (shortfall <= tolerance) & ~cap_exceeded.any(axis=1),
+            "cap_exceeded": cap_exceeded
+        }
@@ -0,0 +1,213 @@
+"""
+KPI計算式モジュール
+配賦後の項目を変数とする計算式を安全に解析し、全事業部・全シナリオをまとめて計算するNumPyの関数に変換
+"""
+
+import ast
+import json
+import operator
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Mapping
+
+import numpy as np
+
+from utils.allocation_engine import ALLOCATED_FIELDS, break_even_point, operating_profit
+
+# 計算式で使用できる項目（配賦後の項目 + 損益分岐点・営業利益）
+KPI_FIELDS = ALLOCATED_FIELDS + ("break_even_point", "operating_profit")
+
+# 計算式で使用できる関数（total / average は事業部の軸で集計し、各事業部に同じ値を返す）
+KPI_FUNCTIONS = {
+    "abs": np.abs,
+    "sqrt": np.sqrt,
+    "log": np.log,
+    "exp": np.exp,
+    "min": np.minimum,
+    "max": np.maximum,
+    "where": np.where,
+    "total": lambda values: np.sum(values, axis=-1, keepdims=True),
+    "average": lambda values: np.mean(values, axis=-1, keepdims=True)
+}
+
+# 関数ごとの引数の数
+_FUNCTION_ARITY = {
+    "abs": 1,
+    "sqrt": 1,
+    "log": 1,
+    "exp": 1,
+    "min": 2,
+    "max": 2,
+    "where": 3,
+    "total": 1,
+    "average": 1
+}
+
+# 計算式の例（既存の分析指標を計算式で定義したもの）
+DEFAULT_KPIS = {
+    "営業利益貢献額": "sales_increase * margin_rate",
+    "営業利益貢献度": "sales_increase * margin_rate / abs(operating_profit)",
+    "売上総利益-営業利益弾性": "implied_sales / abs(operating_profit)",
+    "本部費用負担率": "(hq_fixed_allocated + hq_variable_allocated) / (fixed_cost + variable_cost)",
+    "損益分岐点の全社構成比": "break_even_point / total(break_even_point)"
+}
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow
+}
+
+_UNARY_OPERATORS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos
+}
+
+_COMPARE_OPERATORS = {
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne
+}
+
+Evaluator = Callable[[Mapping[str, np.ndarray]], np.ndarray]
+
+
+class KPIFormula:
+    """解析済みの計算式（項目の辞書を受け取り、NumPyの配列演算で値を計算する）"""
+
+    def __init__(self, formula: str, evaluator: Evaluator, fields: FrozenSet[str]):
+        self.formula = formula
+        self.fields = fields
+        self._evaluator = evaluator
+
+    def __call__(self, values: Mapping[str, np.ndarray]) -> np.ndarray:
+        """
+        計算式を評価
+
+        Args:
+            values: 項目名 → 配列 (..., N)。事業部 (N,) でもシナリオ × 事業部 (K, N) でもよい
+
+        Returns:
+            計算結果（入力と同じ形状）。0除算は inf / nan として返す
+        """
+        shape = np.shape(values[KPI_FIELDS[0]])
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            result = np.asarray(self._evaluator(values), dtype=float)
+        # 定数や total / average のみの計算式も各事業部に同じ値を返す
+        return np.broadcast_to(result, np.broadcast_shapes(result.shape, shape))
+
+
+def _compile_node(node: ast.AST, fields: set) -> Evaluator:
+    """構文木のノードを関数に変換（許可したノード以外はエラー）"""
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body, fields)
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        value = float(node.value)
+        return lambda values: value
+
+    if isinstance(node, ast.Name):
+        if node.id not in KPI_FIELDS:
+            raise ValueError(f"未定義の項目です: {node.id}")
+        name = node.id
+        fields.add(name)
+        return lambda values: values[name]
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        op = _BINARY_OPERATORS[type(node.op)]
+        left, right = _compile_node(node.left, fields), _compile_node(node.right, fields)
+        return lambda values: op(left(values), right(values))
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        op = _UNARY_OPERATORS[type(node.op)]
+        operand = _compile_node(node.operand, fields)
+        return lambda values: op(operand(values))
+
+    if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in _COMPARE_OPERATORS:
+        op = _COMPARE_OPERATORS[type(node.ops[0])]
+        left, right = _compile_node(node.left, fields), _compile_node(node.comparators[0], fields)
+        return lambda values: op(left(values), right(values))
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        if node.func.id not in KPI_FUNCTIONS:
+            raise ValueError(f"使用できない関数です: {node.func.id}")
+        if len(node.args) != _FUNCTION_ARITY[node.func.id]:
+            raise ValueError(
+                f"関数 {node.func.id} の引数は{_FUNCTION_ARITY[node.func.id]}個です（{len(node.args)}個指定されています）")
+        function = KPI_FUNCTIONS[node.func.id]
+        args = [_compile_node(arg, fields) for arg in node.args]
+        return lambda values: function(*(arg(values) for arg in args))
+
+    raise ValueError(f"計算式に使用できない構文です: {ast.dump(node)}")
+
+
+@lru_cache(maxsize=256)
+def compile_formula(formula: str) -> KPIFormula:
+    """
+    計算式を解析して KPIFormula に変換（同じ計算式は解析結果を再利用）
+
+    使用できるのは数値、KPI_FIELDS の項目、四則演算と累乗、比較、KPI_FUNCTIONS の関数のみ
+
+    Args:
+        formula: 計算式（例: "sales_increase * margin_rate / abs(operating_profit)"）
+    """
+    try:
+        tree = ast.parse(formula.strip(), mode="eval")
+        fields = set()
+        compiled = KPIFormula(formula, _compile_node(tree, fields), frozenset(fields))
+    except SyntaxError as e:
+        raise ValueError(f"計算式の構文エラー: {formula}: {e.msg}") from e
+    except RecursionError as e:
+        raise ValueError(f"計算式の入れ子が深すぎます: {formula[:50]}") from e
+    except ArithmeticError as e:
+        # 浮動小数点数に変換できない大きさの数値（例: 10 の400桁の整数）
+        raise ValueError(f"計算式の数値が大きすぎます: {formula[:50]}: {e}") from e
+
+    # 1事業部分の仮の値で評価し、評価時のエラーも保存前に検出する
+    try:
+        compiled({field: np.ones(1) for field in KPI_FIELDS})
+    except (ArithmeticError, RecursionError, TypeError, ValueError) as e:
+        raise ValueError(f"計算式を評価できません: {formula[:50]}: {e}") from e
+    return compiled
+
+
+def kpi_inputs(allocated: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """配賦後の項目に、計算式で使用できる損益分岐点・営業利益を加えた辞書を作成"""
+    values = {field: allocated[field] for field in ALLOCATED_FIELDS}
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        values["break_even_point"] = break_even_point(values["fixed_cost"], values["margin_rate"])
+    values["operating_profit"] = operating_profit(values["implied_sales"], values["fixed_cost"])
+    return values
+
+
+def evaluate_kpis(definitions: Mapping[str, str], allocated: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    複数のKPIをまとめて計算
+
+    Args:
+        definitions: {KPI名: 計算式}
+        allocated: 配賦後の項目（compute_allocation の結果など）
+
+    Returns:
+        {KPI名: 計算結果の配列}
+    """
+    values = kpi_inputs(allocated)
+    return {name: compile_formula(formula)(values) for name, formula in definitions.items()}
+
+
+def load_kpi_definitions(path: str) -> Dict[str, str]:
+    """
+    JSONファイルからKPIの定義を読み込み、すべての計算式を検証
+
+    Args:
+        path: {KPI名: 計算式} を記述したJSONファイルのパス
+    """
+    with open(path, encoding="utf-8") as f:
+        definitions = json.load(f)
+    for formula in definitions.values():
+        compile_formula(formula)
+    return definitions
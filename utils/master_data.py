@@ -0,0 +1,256 @@
+"""
+マスターデータ読み込みモジュール
+事業部マスター・本部費用マスターを CSV / Excel / Parquet から読み込み、検証済みの列配列に変換
+（解析結果はファイル内容のハッシュをキーにプロセス内でキャッシュ）
+"""
+
+import codecs
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+# 対応するファイル形式（拡張子 → 形式）
+MASTER_FORMATS = {
+    ".csv": "csv",
+    ".xlsx": "excel",
+    ".parquet": "parquet"
+}
+
+# 列名の別名（日本語の列名でも読み込めるようにする）
+COLUMN_ALIASES = {
+    "事業部": "name",
+    "事業部名": "name",
+    "限界利益率": "margin_rate",
+    "固定費": "fixed_cost",
+    "変動費": "variable_cost",
+    "費用区分": "cost_type",
+    "金額": "amount",
+    "コストプール": "pool",
+    "配賦基準": "basis"
+}
+
+# 本部費用マスターの費用区分の別名
+_COST_TYPE_ALIASES = {
+    "fixed": "fixed",
+    "固定費": "fixed",
+    "variable": "variable",
+    "変動費": "variable"
+}
+
+DEPARTMENT_COLUMNS = ("name", "margin_rate", "fixed_cost", "variable_cost")
+HEADQUARTERS_COLUMNS = ("cost_type", "amount")
+
+# 解析結果のキャッシュに保持するファイル数
+_CACHE_SIZE = 16
+
+Source = Union[str, bytes, os.PathLike]
+
+
+class MasterDataError(ValueError):
+    """マスターデータの形式・値が不正な場合のエラー"""
+
+
+class DepartmentMaster:
+    """事業部マスター（列ごとの配列で保持、読み取り専用）"""
+
+    def __init__(self, names: List[str], margin_rate: np.ndarray, fixed_cost: np.ndarray,
+                 variable_cost: np.ndarray):
+        self.names = names
+        self.margin_rate = margin_rate
+        self.fixed_cost = fixed_cost
+        self.variable_cost = variable_cost
+        for values in (margin_rate, fixed_cost, variable_cost):
+            values.flags.writeable = False
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        """DataManager.departments 形式の辞書に変換"""
+        columns = zip(self.margin_rate.tolist(), self.fixed_cost.tolist(), self.variable_cost.tolist())
+        return {
+            name: {"margin_rate": margin_rate, "fixed_cost": fixed_cost, "variable_cost": variable_cost}
+            for name, (margin_rate, fixed_cost, variable_cost) in zip(self.names, columns)
+        }
+
+
+class HeadquartersMaster:
+    """本部費用マスター（コストプールごとの費用区分・金額・配賦基準）"""
+
+    def __init__(self, pools: List[Dict]):
+        self.pools = pools
+
+    @property
+    def fixed_cost(self) -> float:
+        return float(sum(pool["amount"] for pool in self.pools if pool["cost_type"] == "fixed"))
+
+    @property
+    def variable_cost(self) -> float:
+        return float(sum(pool["amount"] for pool in self.pools if pool["cost_type"] == "variable"))
+
+
+_cache: "OrderedDict[tuple, object]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _read_source(source: Source, file_format: Optional[str]) -> tuple:
+    """ファイルパスまたはバイト列から (内容, 形式) を取得"""
+    if isinstance(source, bytes):
+        if file_format is None:
+            raise MasterDataError("バイト列から読み込む場合は形式（csv / excel / parquet）を指定してください")
+        return source, file_format
+    path = os.fspath(source)
+    if file_format is None:
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in MASTER_FORMATS:
+            raise MasterDataError(f"未対応のファイル形式です: {path}")
+        file_format = MASTER_FORMATS[extension]
+    with open(path, "rb") as f:
+        return f.read(), file_format
+
+
+def csv_encoding(sample: bytes) -> str:
+    """
+    CSVの文字コードを判定（UTF-8 として読めない場合は Shift_JIS（cp932））
+
+    Args:
+        sample: ファイルの先頭（末尾で途中まで含まれる文字は判定に使わない）
+    """
+    try:
+        codecs.getincrementaldecoder("utf-8-sig")().decode(sample, final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp932"
+
+
+def _read_csv(content: bytes) -> pd.DataFrame:
+    """CSVを読み込み（UTF-8 で読めない場合は Shift_JIS（cp932）として読み込む）"""
+    return pd.read_csv(io.BytesIO(content), encoding=csv_encoding(content))
+
+
+def _read_table(content: bytes, file_format: str) -> pd.DataFrame:
+    """内容をDataFrameとして読み込み、列名を正規化（読み込みの失敗は MasterDataError とする）"""
+    readers = {
+        "csv": _read_csv,
+        "excel": lambda content: pd.read_excel(io.BytesIO(content), engine="openpyxl"),
+        "parquet": lambda content: pd.read_parquet(io.BytesIO(content))
+    }
+    if file_format not in readers:
+        raise MasterDataError(f"未対応のファイル形式です: {file_format}")
+    try:
+        table = readers[file_format](content)
+    except ImportError as e:
+        raise MasterDataError(f"{file_format}形式の読み込みに必要なライブラリがありません: {e.name or e}") from e
+    except (UnicodeDecodeError, ValueError, OSError) as e:
+        # pandas の ParserError・EmptyDataError、Excel・Parquet の形式エラーを含む
+        raise MasterDataError(f"ファイルを{file_format}形式として読み込めません: {e}") from e
+    table.columns = [COLUMN_ALIASES.get(str(column).strip(), str(column).strip()) for column in table.columns]
+    return table
+
+
+def _require_columns(table: pd.DataFrame, columns: tuple, label: str):
+    missing = [column for column in columns if column not in table.columns]
+    if missing:
+        raise MasterDataError(f"{label}に必要な列がありません: {missing}")
+
+
+def _numeric_column(table: pd.DataFrame, column: str, label: str) -> np.ndarray:
+    """数値列を float64 の配列に変換（数値に変換できない行・欠損はエラー）"""
+    values = pd.to_numeric(table[column], errors="coerce").to_numpy(dtype=float)
+    invalid = np.flatnonzero(~np.isfinite(values))
+    if len(invalid) > 0:
+        rows = (invalid[:5] + 2).tolist()  # ヘッダー行を含めた行番号
+        raise MasterDataError(f"{label}の {column} に数値でない値があります（{len(invalid)}件、行: {rows}）")
+    return values
+
+
+def _check_rows(condition: np.ndarray, message: str):
+    """条件を満たさない行があればエラー"""
+    invalid = np.flatnonzero(~condition)
+    if len(invalid) > 0:
+        rows = (invalid[:5] + 2).tolist()
+        raise MasterDataError(f"{message}（{len(invalid)}件、行: {rows}）")
+
+
+def _parse_departments(table: pd.DataFrame) -> DepartmentMaster:
+    label = "事業部マスター"
+    _require_columns(table, DEPARTMENT_COLUMNS, label)
+    names = table["name"].astype(str).str.strip()
+    _check_rows((table["name"].notna() & (names != "")).to_numpy(), f"{label}に事業部名が空の行があります")
+    _check_rows(~names.duplicated().to_numpy(), f"{label}に重複した事業部名があります")
+
+    margin_rate = _numeric_column(table, "margin_rate", label)
+    fixed_cost = _numeric_column(table, "fixed_cost", label)
+    variable_cost = _numeric_column(table, "variable_cost", label)
+    _check_rows((margin_rate > 0) & (margin_rate < 1), f"{label}の限界利益率は0より大きく1未満である必要があります")
+    _check_rows(fixed_cost >= 0, f"{label}の固定費は0以上である必要があります")
+    _check_rows(variable_cost >= 0, f"{label}の変動費は0以上である必要があります")
+    return DepartmentMaster(names.tolist(), margin_rate, fixed_cost, variable_cost)
+
+
+def _parse_headquarters(table: pd.DataFrame) -> HeadquartersMaster:
+    label = "本部費用マスター"
+    _require_columns(table, HEADQUARTERS_COLUMNS, label)
+    cost_types = table["cost_type"].astype(str).str.strip().map(_COST_TYPE_ALIASES)
+    _check_rows(cost_types.notna().to_numpy(), f"{label}の費用区分は fixed / variable（固定費 / 変動費）である必要があります")
+    amounts = _numeric_column(table, "amount", label)
+    _check_rows(amounts >= 0, f"{label}の金額は0以上である必要があります")
+
+    pool_names = (table["pool"].astype(str).tolist() if "pool" in table.columns
+                  else [f"{cost_type}_{i + 1}" for i, cost_type in enumerate(cost_types)])
+    bases = table["basis"].fillna("equal").astype(str).tolist() if "basis" in table.columns else ["equal"] * len(table)
+    return HeadquartersMaster([
+        {"name": name, "cost_type": cost_type, "amount": float(amount), "basis": basis}
+        for name, cost_type, amount, basis in zip(pool_names, cost_types, amounts, bases)
+    ])
+
+
+def _load(source: Source, file_format: Optional[str], kind: str, parser):
+    """内容のハッシュをキーにキャッシュを確認し、未解析の場合のみ解析"""
+    content, file_format = _read_source(source, file_format)
+    key = (kind, file_format, hashlib.sha256(content).hexdigest())
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    parsed = parser(_read_table(content, file_format))
+    with _cache_lock:
+        _cache[key] = parsed
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return parsed
+
+
+def load_department_master(source: Source, file_format: Optional[str] = None) -> DepartmentMaster:
+    """
+    事業部マスターを読み込み（列: name, margin_rate, fixed_cost, variable_cost。日本語の列名も可）
+
+    Args:
+        source: ファイルパス、またはファイルの内容（アップロードされたファイルなど）
+        file_format: "csv" / "excel" / "parquet"。省略時は拡張子から判定
+    """
+    return _load(source, file_format, "departments", _parse_departments)
+
+
+def load_headquarters_master(source: Source, file_format: Optional[str] = None) -> HeadquartersMaster:
+    """
+    本部費用マスターを読み込み（列: cost_type, amount。任意で pool, basis）
+
+    Args:
+        source: ファイルパス、またはファイルの内容
+        file_format: "csv" / "excel" / "parquet"。省略時は拡張子から判定
+    """
+    return _load(source, file_format, "headquarters", _parse_headquarters)
+
+
+def clear_master_cache():
+    """マスターデータのキャッシュを破棄"""
+    with _cache_lock:
+        _cache.clear()
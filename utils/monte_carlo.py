@@ -0,0 +1,195 @@
+"""
+モンテカルロシミュレーションモジュール
+限界利益率・事業部コスト・本部費用の不確実性を考慮した損益分岐点の分布を推定
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Sequence, Union
+
+from utils.allocation_engine import break_even_point, compute_allocation, operating_profit
+
+# 分布を推定する指標
+SIMULATED_METRICS = ("break_even_point", "margin_rate", "operating_profit")
+
+# サンプリングした限界利益率の下限・上限（0以下や1以上では仮の売上総利益が定義できないため）
+_MARGIN_RATE_LIMITS = (0.01, 0.99)
+
+# ヒストグラムの範囲を決める試行サンプルの要素数（サンプル数 × 事業部数）の目安
+_PILOT_ELEMENTS = 200_000
+
+
+class _StreamingHistogram:
+    """事業部ごとの固定幅ヒストグラムでチャンク単位に分位点を推定するクラス"""
+
+    def __init__(self, lower: np.ndarray, upper: np.ndarray, bins: int):
+        self.bins = bins
+        self.lower = lower
+        self.width = np.where(upper > lower, (upper - lower) / bins, 1.0)
+        self.counts = np.zeros((len(lower), bins), dtype=np.int64)
+        self._offsets = np.arange(len(lower)) * bins
+
+    def add(self, values: np.ndarray):
+        """(サンプル, 事業部) の値を集計（範囲外の値は両端のビンに含める）"""
+        position = (np.nan_to_num(values, nan=np.inf) - self.lower) / self.width
+        index = np.clip(position, 0, self.bins - 1).astype(np.int64) + self._offsets
+        self.counts += np.bincount(index.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+
+    def quantile(self, q: float) -> np.ndarray:
+        """各事業部の分位点を推定（ビン内は線形補間）"""
+        cumulative = np.cumsum(self.counts, axis=1)
+        target = q * cumulative[:, -1]
+        k = np.minimum((cumulative < target[:, None]).sum(axis=1), self.bins - 1)
+        rows = np.arange(len(k))
+        before = np.where(k > 0, cumulative[rows, k - 1], 0)
+        in_bin = np.maximum(self.counts[rows, k], 1)
+        fraction = np.clip((target - before) / in_bin, 0.0, 1.0)
+        return self.lower + (k + fraction) * self.width
+
+
+class MonteCarloSimulator:
+    """入力値の相関付き摂動から損益分岐点等の分位点を推定するクラス"""
+
+    def __init__(self, data_manager, margin_rate_sd: float = 0.02, cost_cv: float = 0.1,
+                 hq_cost_cv: float = 0.05, correlation: Union[float, np.ndarray] = 0.3,
+                 seed: int = 0, chunk_elements: int = 50_000, bins: int = 2048):
+        """
+        Args:
+            data_manager: 事業部データを保持するDataManager
+            margin_rate_sd: 限界利益率の標準偏差（ポイント、0.02 = 2pt）
+            cost_cv: 事業部の固定費・変動費の変動係数
+            hq_cost_cv: 本部固定費・変動費の変動係数
+            correlation: 摂動間の相関。数値の場合は全変数共通の相関（1因子モデル）、
+                         配列の場合は (3N+2, 3N+2) の相関行列
+                         （並びは 限界利益率N, 固定費N, 変動費N, 本部固定費, 本部変動費）
+            seed: 乱数シード
+            chunk_elements: 1チャンクで計算する要素数（サンプル数 × 事業部数）の目安
+            bins: 分位点推定に使うヒストグラムのビン数
+        """
+        self.data_manager = data_manager
+        self.margin_rate_sd = margin_rate_sd
+        self.cost_cv = cost_cv
+        self.hq_cost_cv = hq_cost_cv
+        self.correlation = correlation
+        self.seed = seed
+        self.chunk_elements = chunk_elements
+        self.bins = bins
+
+    def _standard_normals(self, rng: np.random.Generator, size: int, dimension: int) -> np.ndarray:
+        """相関付きの標準正規乱数 (size, dimension) を生成"""
+        if np.ndim(self.correlation) == 0:
+            rho = float(self.correlation)
+            if not 0.0 <= rho < 1.0:
+                raise ValueError(f"相関は0以上1未満である必要があります: {rho}")
+            common = rng.standard_normal((size, 1))
+            return np.sqrt(rho) * common + np.sqrt(1 - rho) * rng.standard_normal((size, dimension))
+
+        correlation = np.asarray(self.correlation, dtype=float)
+        if correlation.shape != (dimension, dimension):
+            raise ValueError(f"相関行列の形状は ({dimension}, {dimension}) である必要があります: {correlation.shape}")
+        cholesky = np.linalg.cholesky(correlation)
+        return rng.standard_normal((size, dimension)) @ cholesky.T
+
+    def _simulate_chunk(self, rng: np.random.Generator, size: int) -> Dict[str, np.ndarray]:
+        """1チャンク分のサンプルを生成し、(サンプル, 事業部) の指標を計算"""
+        arrays = self.data_manager.get_department_arrays()
+        n = len(arrays)
+        z = self._standard_normals(rng, size, 3 * n + 2)
+
+        # 共通因子が正のとき「限界利益率の低下・コストの増加」となる向きに揃える
+        margin_rate = np.clip(arrays.margin_rate - self.margin_rate_sd * z[:, :n], *_MARGIN_RATE_LIMITS)
+        fixed_cost = arrays.fixed_cost * np.maximum(1 + self.cost_cv * z[:, n:2 * n], 0.0)
+        variable_cost = arrays.variable_cost * np.maximum(1 + self.cost_cv * z[:, 2 * n:3 * n], 0.0)
+        hq_fixed = arrays.headquarters_fixed_cost * np.maximum(1 + self.hq_cost_cv * z[:, 3 * n:3 * n + 1], 0.0)
+        hq_variable = arrays.headquarters_variable_cost * np.maximum(1 + self.hq_cost_cv * z[:, 3 * n + 1:], 0.0)
+
+        allocated = compute_allocation(
+            margin_rate,
+            fixed_cost,
+            variable_cost,
+            arrays.ratios[:, 0],
+            arrays.ratios[:, 1],
+            hq_fixed,
+            hq_variable,
+            arrays.transfers[:, 0],
+            arrays.transfers[:, 1]
+        )
+        return {
+            "break_even_point": break_even_point(allocated["fixed_cost"], allocated["margin_rate"]),
+            "margin_rate": allocated["margin_rate"],
+            "operating_profit": operating_profit(allocated["implied_sales"], allocated["fixed_cost"])
+        }
+
+    def run(self, n_samples: int = 100_000, quantiles: Sequence[float] = (0.1, 0.5, 0.9),
+            n_chunks: Optional[int] = None) -> Dict:
+        """
+        シミュレーションを実行
+
+        サンプルはチャンク単位で生成・集計するため、使用メモリはサンプル数に依存しない。
+        分位点は、本番とは別の乱数で生成した試行サンプル（チャンクの大きさ・サンプル数に依存しない）の
+        範囲から決めたヒストグラムで推定する（範囲外は両端に含める）
+
+        Args:
+            n_samples: サンプル数
+            quantiles: 推定する分位点
+            n_chunks: チャンク数（省略時は chunk_elements から決定）
+
+        Returns:
+            {"quantiles": {指標: {分位点: (N,) 配列}}, "mean": {指標: (N,) 配列},
+             "loss_probability": (N,) 配列, "n_samples": int, "departments": 事業部名リスト}
+        """
+        arrays = self.data_manager.get_department_arrays()
+        n = len(arrays)
+        if n_chunks is None:
+            chunk_size = max(1, self.chunk_elements // max(n, 1))
+        else:
+            chunk_size = -(-n_samples // n_chunks)
+
+        rng = np.random.default_rng(self.seed)
+        # 試行サンプルの範囲を両側に広げてビンの範囲とする（本番のサンプルの乱数列は変えない）
+        pilot = self._simulate_chunk(rng.spawn(1)[0], max(1, _PILOT_ELEMENTS // max(n, 1)))
+        histograms = {}
+        for metric, values in pilot.items():
+            finite = np.where(np.isfinite(values), values, np.nan)
+            low = np.nanmin(finite, axis=0)
+            high = np.nanmax(finite, axis=0)
+            span = np.nan_to_num(high - low)
+            histograms[metric] = _StreamingHistogram(
+                np.nan_to_num(low - 0.5 * span), np.nan_to_num(high + 0.5 * span), self.bins
+            )
+        sums = {metric: np.zeros(n) for metric in SIMULATED_METRICS}
+        loss_count = np.zeros(n, dtype=np.int64)
+
+        remaining = n_samples
+        while remaining > 0:
+            size = min(chunk_size, remaining)
+            remaining -= size
+            chunk = self._simulate_chunk(rng, size)
+
+            for metric, values in chunk.items():
+                histograms[metric].add(values)
+                sums[metric] += np.nan_to_num(values, posinf=0.0, neginf=0.0).sum(axis=0)
+            loss_count += (chunk["operating_profit"] < 0).sum(axis=0)
+
+        return {
+            "quantiles": {
+                metric: {q: histograms[metric].quantile(q) for q in quantiles}
+                for metric in SIMULATED_METRICS
+            },
+            "mean": {metric: sums[metric] / n_samples for metric in SIMULATED_METRICS},
+            "loss_probability": loss_count / n_samples,
+            "n_samples": n_samples,
+            "departments": list(arrays.names)
+        }
+
+    def get_summary_data(self, result: Dict) -> pd.DataFrame:
+        """シミュレーション結果の損益分岐点の分位点をDataFrameで取得"""
+        bep_quantiles = result["quantiles"]["break_even_point"]
+        summary_data = []
+        for i, dept_name in enumerate(result["departments"]):
+            row = {"事業部": dept_name}
+            for q, values in bep_quantiles.items():
+                row[f"損益分岐点 P{q * 100:.0f}"] = f"{values[i]:,.0f}円"
+            row["赤字確率"] = f"{result['loss_probability'][i]:.1%}"
+            summary_data.append(row)
+        return pd.DataFrame(summary_data)
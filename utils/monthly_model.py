@@ -0,0 +1,130 @@
+"""
+月次計画モジュール
+固定費・変動費・本部費用・配賦割合を (月, 事業部) の配列で保持し、全月分を一括で計算
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+from utils.allocation_engine import DepartmentArrays, break_even_point, compute_allocation, operating_profit
+
+# 計画期間の月数
+MONTHS_PER_YEAR = 12
+
+
+class MonthlyPlan:
+    """(月, 事業部) 配列による月次の配賦モデル"""
+
+    def __init__(self, names: List[str], margin_rate: np.ndarray, fixed_cost: np.ndarray,
+                 variable_cost: np.ndarray, headquarters_fixed_cost: np.ndarray,
+                 headquarters_variable_cost: np.ndarray, ratios: np.ndarray,
+                 transfers: Optional[np.ndarray] = None, month_labels: Optional[Sequence[str]] = None):
+        """
+        Args:
+            names: 事業部名
+            margin_rate: 限界利益率 (N,) または (月, N)
+            fixed_cost: 月次の事業部固定費 (月, N)
+            variable_cost: 月次の事業部変動費 (月, N)
+            headquarters_fixed_cost: 月次の本部固定費 (月,)
+            headquarters_variable_cost: 月次の本部変動費 (月,)
+            ratios: 月次の配賦割合 (月, N, 2)。列0が固定費、列1が変動費
+            transfers: 月次の負担調整額 (月, N, 2)。省略時は0
+            month_labels: 月の表示名
+        """
+        self.names = list(names)
+        self.fixed_cost = np.asarray(fixed_cost, dtype=float)
+        periods, n = self.fixed_cost.shape
+        self.margin_rate = np.asarray(margin_rate, dtype=float)
+        self.variable_cost = np.asarray(variable_cost, dtype=float)
+        self.headquarters_fixed_cost = np.asarray(headquarters_fixed_cost, dtype=float).reshape(periods)
+        self.headquarters_variable_cost = np.asarray(headquarters_variable_cost, dtype=float).reshape(periods)
+        self.ratios = np.array(ratios, dtype=float).reshape(periods, n, 2)
+        self.transfers = (np.zeros((periods, n, 2)) if transfers is None
+                          else np.array(transfers, dtype=float).reshape(periods, n, 2))
+        self.month_labels = list(month_labels) if month_labels is not None else [f"{m}月目" for m in range(1, periods + 1)]
+
+    @classmethod
+    def from_department_arrays(cls, arrays: DepartmentArrays, seasonality: Optional[np.ndarray] = None,
+                               hq_seasonality: Optional[np.ndarray] = None,
+                               periods: int = MONTHS_PER_YEAR) -> "MonthlyPlan":
+        """
+        年間の値を月次に按分して月次計画を作成
+
+        Args:
+            arrays: 年間の事業部データと配賦条件
+            seasonality: 月別の構成比 (月,) または (月, N)。省略時は均等（各月 1/12）
+            hq_seasonality: 本部費用の月別の構成比 (月,)。省略時は事業部の構成比の平均
+            periods: 月数
+        """
+        n = len(arrays)
+        if seasonality is None:
+            weights = np.full((periods, 1), 1.0 / periods)
+        else:
+            weights = np.asarray(seasonality, dtype=float)
+            weights = weights.reshape(periods, -1) / weights.reshape(periods, -1).sum(axis=0)
+        if hq_seasonality is None:
+            hq_weights = weights.mean(axis=1)
+        else:
+            hq_weights = np.asarray(hq_seasonality, dtype=float).reshape(periods)
+            hq_weights = hq_weights / hq_weights.sum()
+
+        return cls(
+            arrays.names,
+            arrays.margin_rate,
+            arrays.fixed_cost * weights,
+            arrays.variable_cost * weights,
+            arrays.headquarters_fixed_cost * hq_weights,
+            arrays.headquarters_variable_cost * hq_weights,
+            np.broadcast_to(arrays.ratios, (periods, n, 2)),
+            arrays.transfers[None, :, :] * weights[:, :, None]
+        )
+
+    @property
+    def periods(self) -> int:
+        return self.fixed_cost.shape[0]
+
+    def set_ratios_from(self, month_index: int, allocation_ratios: Dict[str, Dict[str, float]]):
+        """
+        指定した月以降の配賦割合を変更（期中での配賦割合の見直し）
+
+        Args:
+            month_index: 変更を適用する最初の月（0始まり）
+            allocation_ratios: DataManager.allocation_ratios 形式の配賦割合
+        """
+        for i, dept_name in enumerate(self.names):
+            if dept_name in allocation_ratios:
+                self.ratios[month_index:, i, 0] = allocation_ratios[dept_name]["fixed"]
+                self.ratios[month_index:, i, 1] = allocation_ratios[dept_name]["variable"]
+
+    def calculate(self) -> Dict[str, np.ndarray]:
+        """
+        全月・全事業部の配賦後の項目を一括で計算
+
+        Returns:
+            配賦後の各項目と break_even_point, operating_profit, cumulative_operating_profit の
+            (月, N) 配列、および break_even_month（累計営業利益が初めて0以上になる月の添字、
+            到達しない場合は -1）の (N,) 配列
+        """
+        allocated = compute_allocation(
+            self.margin_rate,
+            self.fixed_cost,
+            self.variable_cost,
+            self.ratios[:, :, 0],
+            self.ratios[:, :, 1],
+            self.headquarters_fixed_cost[:, None],
+            self.headquarters_variable_cost[:, None],
+            self.transfers[:, :, 0],
+            self.transfers[:, :, 1]
+        )
+        monthly_profit = operating_profit(allocated["implied_sales"], allocated["fixed_cost"])
+        cumulative_profit = np.cumsum(monthly_profit, axis=0)
+
+        reached = cumulative_profit >= 0
+        break_even_month = np.where(reached.any(axis=0), reached.argmax(axis=0), -1)
+
+        result = dict(allocated)
+        result["break_even_point"] = break_even_point(allocated["fixed_cost"], allocated["margin_rate"])
+        result["operating_profit"] = monthly_profit
+        result["cumulative_operating_profit"] = cumulative_profit
+        result["break_even_month"] = break_even_month
+        return result
@@ -0,0 +1,155 @@
+"""
+パラメータスイープモジュール
+2つのパラメータを格子状に変化させた場合の指標を計算（感応度ヒートマップ用）
+"""
+
+import numpy as np
+from typing import Dict, Optional, Sequence
+
+from utils.allocation_engine import break_even_point, compute_allocation, operating_profit
+
+# スイープ可能なパラメータ（本部費用以外は対象事業部の値を変更）
+SWEEP_PARAMETERS = {
+    "headquarters_fixed_cost": "本部固定費",
+    "headquarters_variable_cost": "本部変動費",
+    "margin_rate": "限界利益率",
+    "fixed_cost": "事業部固定費",
+    "variable_cost": "事業部変動費",
+    "fixed_ratio": "固定費配賦率",
+    "variable_ratio": "変動費配賦率"
+}
+
+# 計算可能な指標
+SWEEP_METRICS = {
+    "break_even_point": "損益分岐点",
+    "margin_rate": "配賦後限界利益率",
+    "operating_profit": "営業利益",
+    "profit_state": "営業利益状態（1: 黒字, 0: 損益分岐, -1: 赤字）"
+}
+
+
+class ParameterSweep:
+    """DataManagerの配賦計算式を用いて2次元のパラメータスイープを行うクラス"""
+
+    def __init__(self, data_manager, chunk_elements: int = 200_000):
+        """
+        Args:
+            data_manager: 事業部データを保持するDataManager
+            chunk_elements: 1チャンクで計算する格子点数の目安（ピークメモリを制御）
+        """
+        self.data_manager = data_manager
+        self.chunk_elements = chunk_elements
+
+    def _base_inputs(self, department: str) -> Dict[str, float]:
+        """対象事業部の現在の入力値"""
+        arrays = self.data_manager.get_department_arrays()
+        i = arrays.names.index(department)
+        return {
+            "margin_rate": arrays.margin_rate[i],
+            "fixed_cost": arrays.fixed_cost[i],
+            "variable_cost": arrays.variable_cost[i],
+            "fixed_ratio": arrays.ratios[i, 0],
+            "variable_ratio": arrays.ratios[i, 1],
+            "headquarters_fixed_cost": arrays.headquarters_fixed_cost,
+            "headquarters_variable_cost": arrays.headquarters_variable_cost,
+            "transfer_fixed": arrays.transfers[i, 0],
+            "transfer_variable": arrays.transfers[i, 1]
+        }
+
+    @staticmethod
+    def _metric(inputs: Dict, metric: str) -> np.ndarray:
+        """入力値（スカラーまたは格子の配列）から指標を計算"""
+        allocated = compute_allocation(
+            inputs["margin_rate"],
+            inputs["fixed_cost"],
+            inputs["variable_cost"],
+            inputs["fixed_ratio"],
+            inputs["variable_ratio"],
+            inputs["headquarters_fixed_cost"],
+            inputs["headquarters_variable_cost"],
+            inputs["transfer_fixed"],
+            inputs["transfer_variable"]
+        )
+        if metric == "break_even_point":
+            return break_even_point(allocated["fixed_cost"], allocated["margin_rate"])
+        if metric == "margin_rate":
+            return allocated["margin_rate"]
+        profit = operating_profit(allocated["implied_sales"], allocated["fixed_cost"])
+        if metric == "operating_profit":
+            return profit
+        return np.sign(profit)
+
+    def sweep(self, department: str, x_parameter: str, x_values: Sequence[float],
+              y_parameter: str, y_values: Sequence[float], metric: str = "break_even_point",
+              contour_level: Optional[float] = None, stop_at_contour: bool = False) -> Dict:
+        """
+        2つのパラメータの格子上で指標を計算
+
+        x方向をチャンクに分割して計算するため、作業用メモリは chunk_elements に比例する。
+        配賦割合を変更しても他の事業部の配賦割合は調整しない（対象事業部のみの感応度）
+
+        Args:
+            department: 指標を計算する事業部（事業部単位のパラメータもこの事業部に適用）
+            x_parameter: x軸のパラメータ（SWEEP_PARAMETERS のキー）
+            x_values: x軸の値
+            y_parameter: y軸のパラメータ（SWEEP_PARAMETERS のキー）
+            y_values: y軸の値
+            metric: 指標（SWEEP_METRICS のキー）
+            contour_level: 等高線の水準（例: 営業利益 = 0）。指定時はy方向の交点を求める
+            stop_at_contour: Trueの場合、等高線が見つかったチャンクで計算を打ち切る
+
+        Returns:
+            {"values": (len(x), len(y)) 配列（未計算の行はNaN）, "x_values", "y_values",
+             "contour": [(x, y), ...], "rows_evaluated": int, "stopped_early": bool, ...}
+        """
+        for parameter in (x_parameter, y_parameter):
+            if parameter not in SWEEP_PARAMETERS:
+                raise ValueError(f"未対応のパラメータです: {parameter}")
+        if x_parameter == y_parameter:
+            raise ValueError("x軸とy軸には異なるパラメータを指定してください")
+        if metric not in SWEEP_METRICS:
+            raise ValueError(f"未対応の指標です: {metric}")
+
+        x_values = np.asarray(x_values, dtype=float)
+        y_values = np.asarray(y_values, dtype=float)
+        base = self._base_inputs(department)
+        values = np.full((len(x_values), len(y_values)), np.nan)
+        chunk_rows = max(1, self.chunk_elements // max(len(y_values), 1))
+
+        contour = []
+        rows_evaluated = 0
+        stopped_early = False
+        for start in range(0, len(x_values), chunk_rows):
+            stop = min(start + chunk_rows, len(x_values))
+            inputs = dict(base)
+            inputs[x_parameter] = x_values[start:stop, None]
+            inputs[y_parameter] = y_values[None, :]
+            chunk = self._metric(inputs, metric)
+            values[start:stop] = chunk
+            rows_evaluated = stop
+
+            if contour_level is not None:
+                # y方向に隣接する格子点で符号が変わる位置を線形補間
+                shifted = chunk - contour_level
+                rows, cols = np.nonzero(np.signbit(shifted[:, :-1]) != np.signbit(shifted[:, 1:]))
+                low, high = shifted[rows, cols], shifted[rows, cols + 1]
+                weight = np.where(high != low, low / (low - high), 0.0)
+                y_cross = y_values[cols] + weight * (y_values[cols + 1] - y_values[cols])
+                contour.extend(zip(x_values[start + rows].tolist(), y_cross.tolist()))
+                if stop_at_contour and len(rows) > 0:
+                    stopped_early = stop < len(x_values)
+                    break
+
+        return {
+            "department": department,
+            "metric": metric,
+            "x_parameter": x_parameter,
+            "y_parameter": y_parameter,
+            "x_values": x_values,
+            "y_values": y_values,
+            "values": values,
+            "contour_level": contour_level,
+            "contour": contour,
+            "rows_evaluated": rows_evaluated,
+            "stopped_early": stopped_early
+        }
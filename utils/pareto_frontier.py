@@ -0,0 +1,171 @@
+"""
+パレートフロンティアモジュール
+多数の配賦割合の案を評価し、2つの全社指標のトレードオフで優越されない案（パレート最適解）を抽出
+"""
+
+import numpy as np
+from typing import Dict, Optional
+
+from utils.allocation_engine import break_even_point
+
+# 計算可能な指標（いずれも小さいほど良い）
+PARETO_METRICS = {
+    "margin_dispersion": "配賦後限界利益率のばらつき（分散）",
+    "max_bep_gap": "損益分岐点 - 配賦後売上総利益 の最大値（最も厳しい事業部）",
+    "deviation_from_equal": "均等配賦からの乖離（二乗和）"
+}
+
+
+def pareto_front(points: np.ndarray) -> np.ndarray:
+    """
+    2指標（いずれも最小化）で優越されない点の添字を取得
+
+    x の昇順（同じ x は y の昇順）に並べ、それまでの y の最小値を下回る点だけを残す
+    スカイライン法（並べ替えが支配的で O(n log n)）。同じ値の点は1つだけ残す
+
+    Args:
+        points: 指標の配列 (n, 2)
+
+    Returns:
+        パレート最適な点の添字（x の昇順）
+    """
+    points = np.asarray(points, dtype=float)
+    if points.ndim != 2 or points.shape[1] != 2:
+        raise ValueError(f"pointsの形状は (n, 2) である必要があります: {points.shape}")
+    if len(points) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    order = np.lexsort((points[:, 1], points[:, 0]))
+    y = points[order, 1]
+    previous_min = np.concatenate([[np.inf], np.minimum.accumulate(y)[:-1]])
+    return order[y < previous_min]
+
+
+class ParetoFrontier:
+    """DataManagerの配賦計算式で配賦割合の案を評価し、パレートフロンティアを求めるクラス"""
+
+    def __init__(self, data_manager, chunk_size: int = 20_000):
+        """
+        Args:
+            data_manager: 事業部データを保持するDataManager
+            chunk_size: 1回に評価する案の数（ピークメモリを制御）
+        """
+        self.data_manager = data_manager
+        self.chunk_size = chunk_size
+
+    def _metrics(self, ratios: np.ndarray) -> Dict[str, np.ndarray]:
+        """配賦割合の案 (K, N, 2) に対する各指標 (K,)"""
+        allocated = self.data_manager.allocate_scenarios(ratios)
+        margin_rate = allocated["margin_rate"]
+        bep = break_even_point(allocated["fixed_cost"], margin_rate)
+        equal_share = 1.0 / ratios.shape[1]
+        return {
+            "margin_dispersion": margin_rate.var(axis=1),
+            "max_bep_gap": np.max(bep - allocated["implied_sales"], axis=1),
+            "deviation_from_equal": np.sum((ratios - equal_share) ** 2, axis=(1, 2))
+        }
+
+    def sample_ratios(self, n_samples: int, concentration: float = 1.0, seed: Optional[int] = 0,
+                      cost_type: Optional[str] = None) -> np.ndarray:
+        """
+        単体（合計1の配賦割合）上から配賦割合の案を一様（ディリクレ分布）に抽出
+
+        Args:
+            n_samples: 案の数
+            concentration: ディリクレ分布の集中度（大きいほど均等配賦の近くに集まる）
+            seed: 乱数シード
+            cost_type: "fixed" または "variable" を指定すると、その列のみ変化させ他方は現在の値
+
+        Returns:
+            配賦割合の案 (n_samples, N, 2)
+        """
+        current = self.data_manager.get_department_arrays().ratios
+        rng = np.random.default_rng(seed)
+        samples = rng.dirichlet(np.full(len(current), concentration), size=(n_samples, 2)).transpose(0, 2, 1)
+        if cost_type is not None:
+            keep = 1 if cost_type == "fixed" else 0
+            samples[:, :, keep] = current[:, keep]
+        return samples
+
+    def enumerate_ratios(self, step: float = 0.05, cost_type: Optional[str] = None) -> np.ndarray:
+        """
+        刻み幅 step の格子上にある配賦割合の案をすべて列挙
+
+        Args:
+            step: 配賦割合の刻み幅（1 / step は整数）
+            cost_type: "fixed" または "variable" を指定するとその列のみ変化させ他方は現在の値。
+                       省略時は固定費・変動費に同じ配賦割合を用いる
+
+        Returns:
+            配賦割合の案 (K, N, 2)。K は重複組合せの数 C(1/step + N - 1, N - 1)
+        """
+        current = self.data_manager.get_department_arrays().ratios
+        n = len(current)
+        units = int(round(1.0 / step))
+
+        # 合計 units の非負整数の組を、N - 1 個の仕切りの位置から作る
+        compositions = np.zeros((1, 0), dtype=np.int64)
+        for _ in range(n - 1):
+            used = compositions.sum(axis=1)
+            counts = units - used + 1
+            repeated = np.repeat(compositions, counts, axis=0)
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            compositions = np.column_stack([repeated, offsets])
+        compositions = np.column_stack([compositions, units - compositions.sum(axis=1)])
+        shares = compositions / units
+
+        ratios = np.repeat(shares[:, :, None], 2, axis=2)
+        if cost_type is not None:
+            keep = 1 if cost_type == "fixed" else 0
+            ratios[:, :, keep] = current[:, keep]
+        return ratios
+
+    def frontier(self, ratios: np.ndarray, x_metric: str = "margin_dispersion",
+                 y_metric: str = "max_bep_gap", keep_points: int = 5_000) -> Dict:
+        """
+        配賦割合の案を評価してパレートフロンティアを求める
+
+        チャンクごとに評価し、それまでのフロンティアとチャンクの点を合わせて再抽出するため、
+        作業用メモリは chunk_size とフロンティアの大きさに比例する
+
+        Args:
+            ratios: 配賦割合の案 (K, N, 2)
+            x_metric: x軸の指標（PARETO_METRICS のキー）
+            y_metric: y軸の指標（PARETO_METRICS のキー）
+            keep_points: 描画用に残す評価点の数（先頭から）
+
+        Returns:
+            {"x_metric", "y_metric", "frontier": (F, 2), "frontier_ratios": (F, N, 2),
+             "points": 描画用の評価点 (≤ keep_points, 2), "n_evaluated": 評価した案の数}
+        """
+        for metric in (x_metric, y_metric):
+            if metric not in PARETO_METRICS:
+                raise ValueError(f"未対応の指標です: {metric}")
+        ratios = np.asarray(ratios, dtype=float)
+        n = ratios.shape[1]
+
+        front_points = np.empty((0, 2))
+        front_ratios = np.empty((0, n, 2))
+        sampled_points = []
+        for start in range(0, len(ratios), self.chunk_size):
+            chunk = ratios[start:start + self.chunk_size]
+            metrics = self._metrics(chunk)
+            points = np.column_stack([metrics[x_metric], metrics[y_metric]])
+            kept = sum(len(p) for p in sampled_points)
+            if kept < keep_points:
+                sampled_points.append(points[:keep_points - kept])
+
+            candidates = np.concatenate([front_points, points])
+            candidate_ratios = np.concatenate([front_ratios, chunk])
+            front = pareto_front(candidates)
+            front_points = candidates[front]
+            front_ratios = candidate_ratios[front]
+
+        return {
+            "x_metric": x_metric,
+            "y_metric": y_metric,
+            "frontier": front_points,
+            "frontier_ratios": front_ratios,
+            "points": np.concatenate(sampled_points) if sampled_points else np.empty((0, 2)),
+            "n_evaluated": len(ratios)
+        }
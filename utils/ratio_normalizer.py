@@ -0,0 +1,171 @@
+"""
+配賦割合正規化モジュール
+任意の入力値を、事業部ごとの上下限付きで合計1の配賦割合（確率単体）に射影・調整
+"""
+
+import numpy as np
+from typing import Dict, Optional, Sequence, Tuple
+
+# 正規化の方法
+NORMALIZATION_MODES = {
+    "project": "最も近い配賦割合に射影（全事業部を同じ幅で調整）",
+    "proportional": "編集していない事業部を比例配分で調整",
+    "lock_edited": "編集した事業部を固定し、他の事業部を同じ幅で調整"
+}
+
+
+def bounds_arrays(names: Sequence[str], bounds: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    事業部ごとの上下限を (N, 2) 配列に変換
+
+    Args:
+        names: 事業部名
+        bounds: {事業部名: (下限, 上限)} または {事業部名: {"fixed": (下限, 上限), "variable": (下限, 上限)}}
+
+    Returns:
+        (下限, 上限) の (N, 2) 配列。列0が固定費、列1が変動費
+    """
+    n = len(names)
+    lower = np.zeros((n, 2))
+    upper = np.ones((n, 2))
+    if bounds:
+        for i, dept_name in enumerate(names):
+            if dept_name not in bounds:
+                continue
+            dept_bounds = bounds[dept_name]
+            if isinstance(dept_bounds, dict):
+                for col, key in enumerate(("fixed", "variable")):
+                    if key in dept_bounds:
+                        lower[i, col], upper[i, col] = dept_bounds[key]
+            else:
+                lower[i, :], upper[i, :] = dept_bounds
+
+    if np.any(lower > upper):
+        raise ValueError("配賦割合の下限が上限を上回っている事業部があります")
+    if np.any(lower.sum(axis=0) > 1.0 + 1e-9) or np.any(upper.sum(axis=0) < 1.0 - 1e-9):
+        raise ValueError("上下限の範囲内で配賦割合の合計を1.0にできません")
+    return lower, upper
+
+
+def _solve_level(offset: np.ndarray, slope: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+                 total: float) -> np.ndarray:
+    """
+    最後の軸ごとに Σ clip(offset + slope × t, lower, upper) = total となる t を求め、調整後の値を返す
+
+    slope >= 0 のため左辺は t について区分線形かつ単調増加であり、折れ点
+    （値が下限・上限に達する t）を並べ替えれば合計が total となる区間を特定できる（O(N log N)）
+
+    Args:
+        offset, slope, lower, upper: (..., N) 配列
+        total: 調整後の合計
+    """
+    n = offset.shape[-1]
+    moving = slope > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        enter = np.where(moving, (lower - offset) / slope, np.inf)
+        leave = np.where(moving, (upper - offset) / slope, np.inf)
+
+    # 折れ点: 下限を離れる位置で傾きが +slope、上限に達する位置で -slope 変化
+    breakpoints = np.concatenate([enter, leave], axis=-1)
+    slope_changes = np.concatenate([np.where(moving, slope, 0.0), np.where(moving, -slope, 0.0)], axis=-1)
+    order = np.argsort(breakpoints, axis=-1, kind="stable")
+    breakpoints = np.take_along_axis(breakpoints, order, axis=-1)
+    slopes = np.cumsum(np.take_along_axis(slope_changes, order, axis=-1), axis=-1)
+
+    # 動かない要素の折れ点（inf）は最後の有限な折れ点に置き換える（区間幅0として扱う）
+    finite = np.isfinite(breakpoints)
+    last_finite = np.max(np.where(finite, breakpoints, -np.inf), axis=-1, keepdims=True)
+    last_finite = np.where(np.isfinite(last_finite), last_finite, 0.0)
+    breakpoints = np.where(finite, breakpoints, last_finite)
+
+    # 各折れ点における合計値
+    base = np.sum(np.where(moving, lower, np.clip(offset, lower, upper)), axis=-1, keepdims=True)
+    widths = np.diff(breakpoints, axis=-1)
+    totals = base + np.concatenate(
+        [np.zeros(offset.shape[:-1] + (1,)), np.cumsum(slopes[..., :-1] * widths, axis=-1)], axis=-1)
+
+    k = np.sum(totals < total, axis=-1, keepdims=True)
+    previous = np.clip(k - 1, 0, 2 * n - 1)
+    t_previous = np.take_along_axis(breakpoints, previous, axis=-1)
+    total_previous = np.take_along_axis(totals, previous, axis=-1)
+    slope_previous = np.take_along_axis(slopes, previous, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(slope_previous > 0, t_previous + (total - total_previous) / slope_previous, t_previous)
+    t = np.where(k == 0, breakpoints[..., :1], t)
+    return np.clip(offset + slope * t, lower, upper)
+
+
+def project_to_simplex(values: np.ndarray, lower=0.0, upper=1.0, total: float = 1.0) -> np.ndarray:
+    """
+    最後の軸ごとに {x | Σx = total, lower <= x <= upper} へユークリッド射影
+
+    Args:
+        values: 射影する配列 (..., N)。複数の配賦割合をまとめて射影できる
+        lower: 下限（(..., N) にブロードキャスト可能）
+        upper: 上限（(..., N) にブロードキャスト可能）
+        total: 合計
+
+    Returns:
+        射影後の配列 (..., N)
+    """
+    values = np.asarray(values, dtype=float)
+    lower = np.broadcast_to(np.asarray(lower, dtype=float), values.shape)
+    upper = np.broadcast_to(np.asarray(upper, dtype=float), values.shape)
+    if np.any(lower.sum(axis=-1) > total + 1e-9) or np.any(upper.sum(axis=-1) < total - 1e-9):
+        raise ValueError("上下限の範囲内で配賦割合の合計を1.0にできません")
+    return _solve_level(values, np.ones_like(values), lower, upper, total)
+
+
+def normalize_ratios(values: np.ndarray, mode: str = "project", locked: Optional[np.ndarray] = None,
+                     lower=0.0, upper=1.0) -> np.ndarray:
+    """
+    配賦割合を合計1に正規化
+
+    locked の事業部は値を（上下限の範囲内で）固定し、残りの事業部で合計を調整する。
+    固定した値だけで上下限を満たせない場合は、その行は固定せずに調整する
+
+    Args:
+        values: 配賦割合 (..., N)
+        mode: NORMALIZATION_MODES のキー
+            - "project": 全事業部をユークリッド射影（locked は無視）
+            - "proportional": 固定しない事業部を同じ倍率で拡大・縮小（比率を保つ）
+            - "lock_edited": 固定しない事業部を同じ幅で増減（ユークリッド射影）
+        locked: 固定する事業部の真偽値 (..., N)（編集した事業部など）
+        lower: 下限
+        upper: 上限
+
+    Returns:
+        正規化後の配賦割合 (..., N)
+    """
+    if mode not in NORMALIZATION_MODES:
+        raise ValueError(f"未対応の正規化方法です: {mode}")
+    values = np.asarray(values, dtype=float)
+    lower = np.broadcast_to(np.asarray(lower, dtype=float), values.shape)
+    upper = np.broadcast_to(np.asarray(upper, dtype=float), values.shape)
+    if mode == "project" or locked is None:
+        locked = np.zeros(values.shape, dtype=bool)
+    locked = np.broadcast_to(np.asarray(locked, dtype=bool), values.shape)
+
+    # 固定した値で合計1を実現できない行は固定を解除
+    pinned = np.clip(values, lower, upper)
+    fixed_sum = np.sum(np.where(locked, pinned, 0.0), axis=-1, keepdims=True)
+    free_lower = np.sum(np.where(locked, 0.0, lower), axis=-1, keepdims=True)
+    free_upper = np.sum(np.where(locked, 0.0, upper), axis=-1, keepdims=True)
+    feasible = (fixed_sum + free_lower <= 1.0 + 1e-9) & (fixed_sum + free_upper >= 1.0 - 1e-9)
+    locked = locked & feasible
+
+    if mode == "proportional":
+        # 比例配分: clip(t × 値)。調整対象の値がすべて0の行は同じ幅で増減
+        free_values = np.where(locked, 0.0, np.maximum(values, 0.0))
+        scalable = np.sum(free_values, axis=-1, keepdims=True) > 0
+        offset = np.where(scalable, 0.0, values)
+        slope = np.where(scalable, free_values, 1.0)
+    else:
+        offset = values
+        slope = np.ones_like(values)
+
+    offset = np.where(locked, pinned, offset)
+    slope = np.where(locked, 0.0, slope)
+    if np.any(lower.sum(axis=-1) > 1.0 + 1e-9) or np.any(upper.sum(axis=-1) < 1.0 - 1e-9):
+        raise ValueError("上下限の範囲内で配賦割合の合計を1.0にできません")
+    return _solve_level(offset, slope, lower, upper, 1.0)
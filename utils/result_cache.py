@@ -0,0 +1,193 @@
+"""
+計算結果キャッシュモジュール
+事業部データ・本部費用・配賦割合・負担調整のハッシュをキーに、配賦計算結果・サマリー表・グラフを
+ディスクに保存（セッションやプロセスをまたいで同じ条件の計算とグラフ生成を省略）
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.allocation_engine import AllocationResult, DepartmentArrays
+
+# キャッシュの形式・計算内容を変更した場合に増やす（古いキャッシュを使わないようにする）
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_DIR = "data/cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def scenario_hash(arrays: DepartmentArrays, exact_yen: bool = False) -> str:
+    """
+    配賦計算の入力を正規化した内容の SHA-256
+
+    事業部名と並び、各配列を float64（リトルエンディアン、-0.0 は 0.0）のバイト列とし、
+    本部費用・計算方法とともにハッシュする
+
+    Args:
+        arrays: 事業部データと配賦条件
+        exact_yen: 円単位の厳密計算の有無
+    """
+    digest = hashlib.sha256()
+    header = {
+        "version": CACHE_VERSION,
+        "names": arrays.names,
+        "headquarters": [arrays.headquarters_fixed_cost + 0.0, arrays.headquarters_variable_cost + 0.0],
+        "exact_yen": bool(exact_yen)
+    }
+    digest.update(json.dumps(header, ensure_ascii=False).encode("utf-8"))
+    for values in (arrays.margin_rate, arrays.fixed_cost, arrays.variable_cost, arrays.ratios, arrays.transfers):
+        digest.update((np.ascontiguousarray(values, dtype="<f8") + 0.0).tobytes())
+    return digest.hexdigest()
+
+
+def dump_allocation(result: AllocationResult) -> bytes:
+    """配賦計算結果をバイト列（npz）に変換"""
+    buffer = io.BytesIO()
+    np.savez(buffer, names=np.array(result.names, dtype=str), **result.fields)
+    return buffer.getvalue()
+
+
+def load_allocation(data: bytes) -> AllocationResult:
+    """dump_allocation の結果から配賦計算結果を復元"""
+    with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+        names = archive["names"].tolist()
+        fields = {field: archive[field] for field in archive.files if field != "names"}
+    return AllocationResult(names, fields)
+
+
+def dump_dataframe(frame: pd.DataFrame) -> bytes:
+    return frame.to_json(orient="split", force_ascii=False).encode("utf-8")
+
+
+def load_dataframe(data: bytes) -> pd.DataFrame:
+    # 型の推測をしない（整数値の float 列が int64 に、日付に見える文字列が日時に変わらないようにする）
+    return pd.read_json(io.StringIO(data.decode("utf-8")), orient="split", dtype=False, convert_dates=False)
+
+
+def dump_figure(figure) -> bytes:
+    return figure.to_json().encode("utf-8")
+
+
+def load_figure(data: bytes):
+    import plotly.io as pio
+    return pio.from_json(data.decode("utf-8"))
+
+
+class ResultCache:
+    """
+    ハッシュをキーとするディスク上のキャッシュ（合計サイズが上限を超えると最後に使用した時刻の古い順に削除）
+
+    最後に使用した時刻はファイルの更新時刻で管理するため、複数のプロセスで同じディレクトリを共有できる
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            directory: 保存先のディレクトリ
+            max_bytes: キャッシュの合計サイズの上限（バイト）
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key: str, kind: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.{kind}")
+
+    def _entries(self):
+        """保存済みのファイルの (パス, サイズ, 最終使用時刻)"""
+        for prefix in os.scandir(self.directory):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime_ns
+
+    @property
+    def total_bytes(self) -> int:
+        """このプロセスで把握しているキャッシュの合計サイズ"""
+        return self._total_bytes
+
+    def get(self, key: str, kind: str) -> Optional[bytes]:
+        """
+        保存済みの内容を取得（見つからない場合は None）
+
+        Args:
+            key: scenario_hash の結果
+            kind: 内容の種類（例: "allocation", "summary", "figure-break_even"）
+        """
+        path = self._path(key, kind)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key: str, kind: str, data: bytes):
+        """内容を保存（一時ファイルに書き込んでから置き換える）し、上限を超えた場合は古いものを削除"""
+        path = self._path(key, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            # 同じキーの内容を置き換える場合は置き換え前のサイズを合計から除く
+            try:
+                replaced_bytes = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced_bytes = 0
+            os.replace(temporary_path, path)
+            self._total_bytes += len(data) - replaced_bytes
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """最後に使用した時刻の古い順に、合計サイズが上限以下になるまで削除"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._total_bytes = total
+
+    def get_or_create(self, key: str, kind: str, build: Callable[[], object],
+                      dump: Callable[[object], bytes], load: Callable[[bytes], object]):
+        """
+        保存済みの場合は復元し、ない場合は作成して保存
+
+        Args:
+            key: scenario_hash の結果
+            kind: 内容の種類
+            build: 内容を作成する関数
+            dump: 内容をバイト列に変換する関数
+            load: バイト列から内容を復元する関数
+        """
+        data = self.get(key, kind)
+        if data is not None:
+            return load(data)
+        value = build()
+        self.put(key, kind, dump(value))
+        return value
+
+    def clear(self):
+        """キャッシュをすべて削除"""
+        with self._lock:
+            for path, _, _ in list(self._entries()):
+                os.remove(path)
+            self._total_bytes = 0
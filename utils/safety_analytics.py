@@ -0,0 +1,69 @@
+"""
+安全性分析モジュール
+安全余裕額・安全余裕率・営業レバレッジ係数などを閉じた式で計算（事業部・シナリオの配列をそのまま扱う）
+"""
+
+import numpy as np
+from typing import Dict, Mapping
+
+from utils.allocation_engine import break_even_point, operating_profit
+
+# 計算する指標
+SAFETY_METRICS = {
+    "break_even_point": "損益分岐点",
+    "margin_of_safety": "安全余裕額",
+    "safety_margin_ratio": "安全余裕率",
+    "contribution_margin": "限界利益",
+    "operating_leverage": "営業レバレッジ係数",
+    "sales_profit_elasticity": "売上総利益-営業利益弾性"
+}
+
+
+def safety_metrics(implied_sales, fixed_cost, margin_rate) -> Dict[str, np.ndarray]:
+    """
+    安全性の指標を計算
+
+    - 安全余裕額 = 売上総利益 - 損益分岐点
+    - 安全余裕率 = 安全余裕額 / 売上総利益
+    - 営業レバレッジ係数 = 限界利益 / (限界利益 - 固定費) = 1 / 安全余裕率
+    - 売上総利益-営業利益弾性 = 売上総利益 / |営業利益|（営業利益 = 売上総利益 - 固定費 の定義での
+      d(営業利益) / d(売上総利益) × 売上総利益 / |営業利益|。営業利益が0の場合は0）
+
+    Args:
+        implied_sales: 配賦後の仮の売上総利益 (...)
+        fixed_cost: 配賦後の固定費 (...)
+        margin_rate: 配賦後の限界利益率 (...)
+
+    Returns:
+        SAFETY_METRICS をキーとする配列の辞書（入力をブロードキャストした形状）
+    """
+    implied_sales = np.asarray(implied_sales, dtype=float)
+    fixed_cost = np.asarray(fixed_cost, dtype=float)
+    margin_rate = np.asarray(margin_rate, dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bep = break_even_point(fixed_cost, margin_rate)
+        margin_of_safety = implied_sales - bep
+        contribution_margin = implied_sales * margin_rate
+        profit = operating_profit(implied_sales, fixed_cost)
+        return {
+            "break_even_point": bep,
+            "margin_of_safety": margin_of_safety,
+            "safety_margin_ratio": margin_of_safety / implied_sales,
+            "contribution_margin": contribution_margin,
+            "operating_leverage": contribution_margin / (contribution_margin - fixed_cost),
+            "sales_profit_elasticity": np.divide(
+                implied_sales, np.abs(profit),
+                out=np.zeros(np.broadcast(implied_sales, profit).shape), where=profit != 0
+            )
+        }
+
+
+def allocation_safety_metrics(allocated: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    配賦計算結果（compute_allocation・AllocationResult など）から安全性の指標を計算
+
+    Args:
+        allocated: 配賦後の項目（事業部 (N,) でもシナリオ × 事業部 (K, N) でもよい）
+    """
+    return safety_metrics(allocated["implied_sales"], allocated["fixed_cost"], allocated["margin_rate"])
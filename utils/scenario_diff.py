@@ -0,0 +1,117 @@
+"""
+シナリオ比較モジュール
+保存した配賦計算結果（または一括評価したシナリオ）と基準シナリオとの差分を配列の引き算で計算
+"""
+
+import numpy as np
+from typing import Dict, List, Mapping, Optional, Sequence
+
+from utils.kpi_formulas import KPI_FIELDS, kpi_inputs
+
+# 差分を計算する項目（配賦後の項目 + 損益分岐点・営業利益）
+DIFF_FIELDS = KPI_FIELDS
+
+
+def stack_results(results: Sequence[Mapping[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    複数の配賦計算結果（AllocationResult など、各項目が (N,) 配列）を (K, N) 配列に積み重ねる
+
+    Args:
+        results: 配賦計算結果のリスト
+    """
+    inputs = [kpi_inputs(result) for result in results]
+    return {field: np.stack([values[field] for values in inputs]) for field in DIFF_FIELDS}
+
+
+class ScenarioDiff:
+    """基準シナリオと比較シナリオ群の項目ごとの差分"""
+
+    def __init__(self, names: Sequence[str], baseline: Mapping[str, np.ndarray],
+                 scenarios: Mapping[str, np.ndarray], scenario_names: Optional[Sequence[str]] = None):
+        """
+        Args:
+            names: 事業部名（配列の並び順）
+            baseline: 基準シナリオの配賦計算結果（各項目 (N,)）
+            scenarios: 比較シナリオの配賦計算結果（各項目 (K, N)）。compute_allocation の
+                       一括計算結果や stack_results の結果をそのまま渡せる
+            scenario_names: 比較シナリオ名。省略時は 0 始まりの番号
+        """
+        self.names = list(names)
+        base = kpi_inputs(baseline)
+        compared = kpi_inputs(scenarios)
+
+        self.absolute: Dict[str, np.ndarray] = {}
+        self.relative: Dict[str, np.ndarray] = {}
+        for field in DIFF_FIELDS:
+            base_values = np.asarray(base[field], dtype=float)
+            delta = np.atleast_2d(np.asarray(compared[field], dtype=float) - base_values)
+            self.absolute[field] = delta
+            # 基準値が0の場合は変化率を定義できないため NaN
+            self.relative[field] = np.divide(
+                delta, np.abs(base_values),
+                out=np.full(delta.shape, np.nan), where=base_values != 0
+            )
+
+        n_scenarios = self.absolute[DIFF_FIELDS[0]].shape[0]
+        self.scenario_names = list(scenario_names) if scenario_names is not None else list(range(n_scenarios))
+        if len(self.scenario_names) != n_scenarios:
+            raise ValueError(f"シナリオ名の数がシナリオ数と一致しません: {len(self.scenario_names)} != {n_scenarios}")
+
+    def department_diff(self, scenario_index: int = 0) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        1つの比較シナリオについて、事業部・項目ごとの差分を辞書で取得
+
+        Returns:
+            {事業部名: {項目名: {"absolute": 差額, "relative": 変化率}}}
+        """
+        return {
+            dept_name: {
+                field: {
+                    "absolute": float(self.absolute[field][scenario_index, i]),
+                    "relative": float(self.relative[field][scenario_index, i])
+                }
+                for field in DIFF_FIELDS
+            }
+            for i, dept_name in enumerate(self.names)
+        }
+
+    def largest_movers(self, top: int = 10, by: str = "absolute",
+                       fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """
+        全シナリオ・事業部・項目の中で変化の大きいものを順位付け
+
+        候補の選択は argpartition（O(シナリオ数 × 事業部数 × 項目数)）で行い、上位のみ並べ替える
+
+        Args:
+            top: 取得する件数
+            by: "absolute"（差額の絶対値）または "relative"（変化率の絶対値）
+            fields: 対象の項目。省略時は全項目
+
+        Returns:
+            [{"scenario", "department", "field", "absolute", "relative"}, ...]（変化の大きい順）
+        """
+        if by not in ("absolute", "relative"):
+            raise ValueError(f"未対応の順位付け基準です: {by}")
+        fields = list(fields) if fields is not None else list(DIFF_FIELDS)
+        source = self.absolute if by == "absolute" else self.relative
+
+        magnitude = np.abs(np.stack([source[field] for field in fields]))
+        magnitude = np.where(np.isnan(magnitude), -np.inf, magnitude).ravel()
+        top = min(top, magnitude.size)
+        if top <= 0:
+            return []
+        candidates = np.argpartition(-magnitude, top - 1)[:top]
+        ranked = candidates[np.argsort(-magnitude[candidates], kind="stable")]
+
+        field_index, scenario_index, dept_index = np.unravel_index(
+            ranked, (len(fields), len(self.scenario_names), len(self.names)))
+        return [
+            {
+                "scenario": self.scenario_names[k],
+                "department": self.names[i],
+                "field": fields[f],
+                "absolute": float(self.absolute[fields[f]][k, i]),
+                "relative": float(self.relative[fields[f]][k, i])
+            }
+            for f, k, i in zip(field_index, scenario_index, dept_index)
+        ]
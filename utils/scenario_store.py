@@ -0,0 +1,296 @@
+"""
+計画保存モジュール
+配賦割合・本部費用・負担調整と配賦計算結果を SQLite に計画ごとのバージョンとして保存
+（保存したバージョンは変更・削除できない）
+"""
+
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from utils.allocation_engine import ALLOCATED_FIELDS, AllocationResult, DepartmentArrays
+
+# 事業部ごとの入力を (N, 7) 配列として保存する列の並び
+INPUT_COLUMNS = (
+    "margin_rate",
+    "fixed_cost",
+    "variable_cost",
+    "fixed_ratio",
+    "variable_ratio",
+    "transfer_fixed",
+    "transfer_variable"
+)
+
+DEFAULT_STORE_PATH = "data/scenarios.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    id INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    latest_version INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (owner, name)
+);
+CREATE INDEX IF NOT EXISTS idx_plans_created_at ON plans (created_at);
+
+CREATE TABLE IF NOT EXISTS plan_versions (
+    id INTEGER PRIMARY KEY,
+    plan_id INTEGER NOT NULL REFERENCES plans (id),
+    version INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    note TEXT NOT NULL DEFAULT '',
+    names TEXT NOT NULL,
+    inputs BLOB NOT NULL,
+    headquarters_fixed_cost REAL NOT NULL,
+    headquarters_variable_cost REAL NOT NULL,
+    exact_yen INTEGER NOT NULL DEFAULT 0,
+    outputs BLOB,
+    UNIQUE (plan_id, version)
+);
+CREATE INDEX IF NOT EXISTS idx_plan_versions_created_at ON plan_versions (created_at);
+
+CREATE TABLE IF NOT EXISTS version_tags (
+    tag TEXT NOT NULL,
+    version_id INTEGER NOT NULL REFERENCES plan_versions (id),
+    PRIMARY KEY (tag, version_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_version_tags_version ON version_tags (version_id);
+
+CREATE TRIGGER IF NOT EXISTS plan_versions_no_update BEFORE UPDATE ON plan_versions
+BEGIN
+    SELECT RAISE(ABORT, 'plan versions are immutable');
+END;
+CREATE TRIGGER IF NOT EXISTS plan_versions_no_delete BEFORE DELETE ON plan_versions
+BEGIN
+    SELECT RAISE(ABORT, 'plan versions are immutable');
+END;
+"""
+
+# 一覧に表示する項目（計画の最新バージョン）
+_LIST_COLUMNS = """
+    plans.owner, plans.name, plan_versions.version, plan_versions.created_at, plan_versions.note,
+    (SELECT group_concat(tag, ',') FROM version_tags WHERE version_tags.version_id = plan_versions.id)
+"""
+
+
+def _pack(values: np.ndarray) -> bytes:
+    return np.ascontiguousarray(values, dtype="<f8").tobytes()
+
+
+def _unpack(blob: bytes, shape: tuple) -> np.ndarray:
+    return np.frombuffer(blob, dtype="<f8").reshape(shape).copy()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _list_row(row: tuple) -> Dict:
+    owner, name, version, created_at, note, tags = row
+    return {
+        "owner": owner,
+        "name": name,
+        "version": version,
+        "created_at": created_at,
+        "note": note,
+        "tags": tags.split(",") if tags else []
+    }
+
+
+class ScenarioStore:
+    """計画（配賦条件と配賦計算結果）のバージョンを保存する SQLite リポジトリ"""
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        """
+        Args:
+            path: データベースファイルのパス（存在しない場合は作成）
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """操作ごとの接続（ブロック全体を1つのトランザクションとして確定・取り消し）"""
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def save(self, name: str, arrays: DepartmentArrays, result: Optional[AllocationResult] = None,
+             owner: str = "", tags: Sequence[str] = (), note: str = "", exact_yen: bool = False) -> Dict:
+        """
+        計画の新しいバージョンを保存
+
+        Args:
+            name: 計画名
+            arrays: 事業部データと配賦条件
+            result: 配賦計算結果（省略可）
+            owner: 保存したユーザー
+            tags: タグ（例: "承認済"）
+            note: メモ
+            exact_yen: 配賦計算結果を円単位の厳密計算で求めた場合 True
+
+        Returns:
+            {"owner", "name", "version", "created_at"}
+        """
+        return self.save_many([{
+            "name": name, "arrays": arrays, "result": result, "owner": owner,
+            "tags": tags, "note": note, "exact_yen": exact_yen
+        }])[0]
+
+    def save_many(self, plans: Iterable[Dict]) -> List[Dict]:
+        """
+        複数の計画を1つのトランザクションで保存（途中で失敗した場合はすべて取り消す）
+
+        Args:
+            plans: save の引数を辞書にしたもののリスト
+        """
+        saved = []
+        with self._connect() as connection:
+            for plan in plans:
+                owner = plan.get("owner", "")
+                created_at = _now()
+                connection.execute(
+                    "INSERT OR IGNORE INTO plans (owner, name, created_at) VALUES (?, ?, ?)",
+                    (owner, plan["name"], created_at)
+                )
+                connection.execute(
+                    "UPDATE plans SET latest_version = latest_version + 1 WHERE owner = ? AND name = ?",
+                    (owner, plan["name"])
+                )
+                plan_id, version = connection.execute(
+                    "SELECT id, latest_version FROM plans WHERE owner = ? AND name = ?", (owner, plan["name"])
+                ).fetchone()
+
+                arrays = plan["arrays"]
+                inputs = np.column_stack([arrays.margin_rate, arrays.fixed_cost, arrays.variable_cost,
+                                          arrays.ratios, arrays.transfers])
+                result = plan.get("result")
+                outputs = _pack(np.stack([result[field] for field in ALLOCATED_FIELDS])) if result is not None else None
+                cursor = connection.execute(
+                    """INSERT INTO plan_versions (plan_id, version, created_at, note, names, inputs,
+                       headquarters_fixed_cost, headquarters_variable_cost, exact_yen, outputs)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (plan_id, version, created_at, plan.get("note", ""), json.dumps(arrays.names, ensure_ascii=False),
+                     _pack(inputs), arrays.headquarters_fixed_cost, arrays.headquarters_variable_cost,
+                     int(plan.get("exact_yen", False)), outputs)
+                )
+                connection.executemany(
+                    "INSERT OR IGNORE INTO version_tags (tag, version_id) VALUES (?, ?)",
+                    [(tag, cursor.lastrowid) for tag in plan.get("tags", ())]
+                )
+                saved.append({"owner": owner, "name": plan["name"], "version": version, "created_at": created_at})
+        return saved
+
+    def list_plans(self, owner: Optional[str] = None, tag: Optional[str] = None,
+                   limit: int = 100, offset: int = 0) -> List[Dict]:
+        """
+        計画の一覧（各計画の最新バージョン、新しい順）
+
+        Args:
+            owner: 指定した場合、そのユーザーの計画のみ
+            tag: 指定した場合、最新バージョンにそのタグがある計画のみ
+            limit: 取得する件数
+            offset: 読み飛ばす件数
+
+        Returns:
+            [{"owner", "name", "version", "created_at", "note", "tags"}, ...]
+        """
+        conditions = []
+        parameters = []
+        if owner is not None:
+            conditions.append("plans.owner = ?")
+            parameters.append(owner)
+        if tag is not None:
+            conditions.append("plan_versions.id IN (SELECT version_id FROM version_tags WHERE tag = ?)")
+            parameters.append(tag)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"""SELECT {_LIST_COLUMNS} FROM plans
+                    JOIN plan_versions ON plan_versions.plan_id = plans.id
+                     AND plan_versions.version = plans.latest_version
+                    {where} ORDER BY plan_versions.created_at DESC LIMIT ? OFFSET ?""",
+                (*parameters, limit, offset)
+            ).fetchall()
+        return [_list_row(row) for row in rows]
+
+    def list_versions(self, name: str, owner: str = "") -> List[Dict]:
+        """計画のバージョンの一覧（新しい順）"""
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"""SELECT {_LIST_COLUMNS} FROM plans
+                    JOIN plan_versions ON plan_versions.plan_id = plans.id
+                    WHERE plans.owner = ? AND plans.name = ? ORDER BY plan_versions.version DESC""",
+                (owner, name)
+            ).fetchall()
+        return [_list_row(row) for row in rows]
+
+    def find_versions(self, tag: str, owner: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """タグが付いたバージョンの一覧（新しい順。例: 最後に承認された計画）"""
+        owner_condition = "AND plans.owner = ?" if owner is not None else ""
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"""SELECT {_LIST_COLUMNS} FROM version_tags
+                    JOIN plan_versions ON plan_versions.id = version_tags.version_id
+                    JOIN plans ON plans.id = plan_versions.plan_id
+                    WHERE version_tags.tag = ? {owner_condition}
+                    ORDER BY plan_versions.created_at DESC LIMIT ?""",
+                (tag, *([owner] if owner is not None else []), limit)
+            ).fetchall()
+        return [_list_row(row) for row in rows]
+
+    def load(self, name: str, owner: str = "", version: Optional[int] = None) -> Dict:
+        """
+        計画のバージョンを読み込み
+
+        Args:
+            name: 計画名
+            owner: 保存したユーザー
+            version: バージョン。省略時は最新
+
+        Returns:
+            {"owner", "name", "version", "created_at", "note", "tags", "exact_yen",
+             "arrays": DepartmentArrays, "result": AllocationResult または None}
+
+        Raises:
+            KeyError: 計画・バージョンが存在しない場合
+        """
+        version_condition = "plan_versions.version = ?" if version is not None else \
+            "plan_versions.version = plans.latest_version"
+        with self._connect() as connection:
+            row = connection.execute(
+                f"""SELECT {_LIST_COLUMNS}, plan_versions.names, plan_versions.inputs,
+                    plan_versions.headquarters_fixed_cost, plan_versions.headquarters_variable_cost,
+                    plan_versions.exact_yen, plan_versions.outputs
+                    FROM plans JOIN plan_versions ON plan_versions.plan_id = plans.id
+                    WHERE plans.owner = ? AND plans.name = ? AND {version_condition}""",
+                (owner, name, *([version] if version is not None else []))
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"計画が見つかりません: {name}" + (f"（バージョン {version}）" if version is not None else ""))
+
+        plan = _list_row(row[:6])
+        names_json, inputs_blob, hq_fixed, hq_variable, exact_yen, outputs_blob = row[6:]
+        names = json.loads(names_json)
+        inputs = _unpack(inputs_blob, (len(names), len(INPUT_COLUMNS)))
+        plan["exact_yen"] = bool(exact_yen)
+        plan["arrays"] = DepartmentArrays(names, inputs[:, 0], inputs[:, 1], inputs[:, 2], inputs[:, 3:5],
+                                          inputs[:, 5:7], hq_fixed, hq_variable)
+        plan["result"] = None
+        if outputs_blob is not None:
+            outputs = _unpack(outputs_blob, (len(ALLOCATED_FIELDS), len(names)))
+            plan["result"] = AllocationResult(names, dict(zip(ALLOCATED_FIELDS, outputs)))
+        return plan
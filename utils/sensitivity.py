@@ -0,0 +1,126 @@
+"""
+感応度分析モジュール
+配賦割合・本部費用・事業部間の負担調整に対する各指標の偏微分（ヤコビアン）を解析的に計算
+"""
+
+import numpy as np
+from typing import Dict
+
+from utils.allocation_engine import DepartmentArrays, compute_allocation
+
+# 感応度を計算する指標
+SENSITIVITY_METRICS = ("margin_rate", "break_even_point", "operating_profit")
+
+
+def compute_sensitivity(arrays: DepartmentArrays) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    各事業部の指標の偏微分を一括で計算
+
+    配賦後の各項目を S（売上総利益）, F（固定費）, V（変動費）とすると
+    S - V = 元の仮の売上総利益 - 事業部変動費 - 変動費負担調整 は配賦割合に依存しないため、
+    限界利益率 m = (S - V) / S、損益分岐点 = F / m、営業利益 = S - F の微分は閉じた形で書ける
+
+    Args:
+        arrays: 事業部データと配賦条件
+
+    Returns:
+        {指標: {"ratios": (N, 2N), "hq_costs": (N, 2), "transfers": (N, 2N)}}
+        ratios・transfers の列は [固定費_1..固定費_N, 変動費_1..変動費_N]、
+        hq_costs の列は [本部固定費, 本部変動費]
+    """
+    n = len(arrays)
+    fixed_ratio = arrays.ratios[:, 0]
+    variable_ratio = arrays.ratios[:, 1]
+    hq_fixed = arrays.headquarters_fixed_cost
+    hq_variable = arrays.headquarters_variable_cost
+
+    allocated = compute_allocation(
+        arrays.margin_rate,
+        arrays.fixed_cost,
+        arrays.variable_cost,
+        fixed_ratio,
+        variable_ratio,
+        hq_fixed,
+        hq_variable,
+        arrays.transfers[:, 0],
+        arrays.transfers[:, 1]
+    )
+    sales = allocated["implied_sales"]
+    fixed = allocated["fixed_cost"]
+    margin = allocated["margin_rate"]
+    contribution = sales - allocated["variable_cost"]
+
+    # 事業部ごとの偏微分 (N,)：[固定費配賦率, 変動費配賦率, 本部固定費, 本部変動費, 固定費負担調整, 変動費負担調整]
+    zeros = np.zeros(n)
+    partials = {
+        "margin_rate": (
+            zeros,
+            -margin * hq_variable / sales,
+            zeros,
+            -margin * variable_ratio / sales,
+            zeros,
+            -1 / sales
+        ),
+        "break_even_point": (
+            hq_fixed / margin,
+            fixed * hq_variable / contribution,
+            fixed_ratio / margin,
+            fixed * variable_ratio / contribution,
+            1 / margin,
+            fixed * sales / (contribution * contribution)
+        ),
+        "operating_profit": (
+            np.full(n, -hq_fixed),
+            np.full(n, hq_variable),
+            -fixed_ratio,
+            variable_ratio,
+            np.full(n, -1.0),
+            zeros
+        )
+    }
+
+    # 各事業部の指標は自事業部の配賦割合・負担調整のみに依存するため、対角ブロックに配置
+    diagonal = np.arange(n)
+    sensitivity = {}
+    for metric, (d_fixed_ratio, d_variable_ratio, d_hq_fixed, d_hq_variable,
+                 d_transfer_fixed, d_transfer_variable) in partials.items():
+        ratios = np.zeros((n, 2 * n))
+        ratios[diagonal, diagonal] = d_fixed_ratio
+        ratios[diagonal, n + diagonal] = d_variable_ratio
+
+        transfers = np.zeros((n, 2 * n))
+        transfers[diagonal, diagonal] = d_transfer_fixed
+        transfers[diagonal, n + diagonal] = d_transfer_variable
+
+        sensitivity[metric] = {
+            "ratios": ratios,
+            "hq_costs": np.column_stack([d_hq_fixed, d_hq_variable]),
+            "transfers": transfers
+        }
+    return sensitivity
+
+
+def estimate_ratio_shift(arrays: DepartmentArrays, sensitivity: Dict, source: str, target: str,
+                         amount: float, cost_type: str = "fixed") -> Dict[str, np.ndarray]:
+    """
+    配賦割合を source から target へ amount だけ移した場合の各指標の変化を一次近似で推定
+
+    Args:
+        arrays: 事業部データと配賦条件
+        sensitivity: compute_sensitivity の結果
+        source: 配賦割合を減らす事業部
+        target: 配賦割合を増やす事業部
+        amount: 移す配賦割合（0.01 = 1%）
+        cost_type: "fixed" または "variable"
+
+    Returns:
+        {指標: 各事業部の変化量 (N,)}
+    """
+    n = len(arrays)
+    offset = {"fixed": 0, "variable": n}[cost_type]
+    source_col = offset + arrays.names.index(source)
+    target_col = offset + arrays.names.index(target)
+    return {
+        metric: amount * (jacobian["ratios"][:, target_col] - jacobian["ratios"][:, source_col])
+        for metric, jacobian in sensitivity.items()
+    }
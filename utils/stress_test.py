@@ -0,0 +1,196 @@
+"""
+ストレステストモジュール
+本部費用の増加や限界利益率の低下などのショックを、現在の計画と保存した計画にまとめて適用し、
+黒字から赤字に転落する事業部を抽出
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Mapping, Optional, Sequence
+
+from utils.allocation_engine import DepartmentArrays, compute_allocation, operating_profit
+
+# ショックの対象
+SHOCK_TARGETS = {
+    "headquarters_fixed_cost": "本部固定費",
+    "headquarters_variable_cost": "本部変動費",
+    "margin_rate": "限界利益率",
+    "fixed_cost": "事業部固定費",
+    "variable_cost": "事業部変動費"
+}
+
+# 本部費用（事業部の軸を持たない項目）
+_HEADQUARTERS_TARGETS = ("headquarters_fixed_cost", "headquarters_variable_cost")
+
+# 現在の計画の名称
+CURRENT_PLAN = "現在の計画"
+
+
+def default_shocks(names: Sequence[str]) -> List[Dict]:
+    """
+    標準のショック一覧
+
+    Args:
+        names: 事業部名（事業部ごとのショックの作成に使用）
+
+    Returns:
+        [{"name": ショック名, "changes": [{"target", "operation", "value", "departments"}, ...]}, ...]
+    """
+    shocks = [
+        {"name": "本部固定費 +15%", "changes": [
+            {"target": "headquarters_fixed_cost", "operation": "multiply", "value": 1.15}]},
+        {"name": "本部変動費 +15%", "changes": [
+            {"target": "headquarters_variable_cost", "operation": "multiply", "value": 1.15}]},
+        {"name": "全事業部の限界利益率 -3pt", "changes": [
+            {"target": "margin_rate", "operation": "add", "value": -0.03}]},
+        {"name": "全事業部の固定費 +10%", "changes": [
+            {"target": "fixed_cost", "operation": "multiply", "value": 1.10}]}
+    ]
+    for dept_name in names:
+        shocks.append({"name": f"{dept_name}事業部の限界利益率 -5pt", "changes": [
+            {"target": "margin_rate", "operation": "add", "value": -0.05, "departments": [dept_name]}]})
+    return shocks
+
+
+class StressTester:
+    """ショック × 計画 の全組合せを一括で評価するクラス"""
+
+    def __init__(self, plans: Mapping[str, DepartmentArrays]):
+        """
+        Args:
+            plans: {計画名: 事業部データと配賦条件}。事業部構成はすべての計画で同じであること
+        """
+        if not plans:
+            raise ValueError("計画がありません")
+        self.plan_names = list(plans.keys())
+        arrays = list(plans.values())
+        self.names = arrays[0].names
+        for plan_name, plan in zip(self.plan_names, arrays):
+            if plan.names != self.names:
+                raise ValueError(f"事業部構成が他の計画と異なります: {plan_name}")
+
+        # 計画 × 事業部 (P, N) の入力
+        self.inputs = {
+            "margin_rate": np.stack([plan.margin_rate for plan in arrays]),
+            "fixed_cost": np.stack([plan.fixed_cost for plan in arrays]),
+            "variable_cost": np.stack([plan.variable_cost for plan in arrays]),
+            "headquarters_fixed_cost": np.array([plan.headquarters_fixed_cost for plan in arrays]),
+            "headquarters_variable_cost": np.array([plan.headquarters_variable_cost for plan in arrays])
+        }
+        self.ratios = np.stack([plan.ratios for plan in arrays])
+        self.transfers = np.stack([plan.transfers for plan in arrays])
+
+    def _shock_arrays(self, shocks: Sequence[Mapping]) -> Dict[str, tuple]:
+        """ショックを項目ごとの倍率・加算額の配列（事業部の項目は (S, N)、本部費用は (S,)）に変換"""
+        index = {name: i for i, name in enumerate(self.names)}
+        n_shocks = len(shocks)
+        arrays = {}
+        for target in SHOCK_TARGETS:
+            shape = (n_shocks,) if target in _HEADQUARTERS_TARGETS else (n_shocks, len(self.names))
+            arrays[target] = (np.ones(shape), np.zeros(shape))
+
+        for s, shock in enumerate(shocks):
+            for change in shock["changes"]:
+                target = change["target"]
+                if target not in SHOCK_TARGETS:
+                    raise ValueError(f"未対応のショック対象です: {target}")
+                scale, shift = arrays[target]
+                if target in _HEADQUARTERS_TARGETS:
+                    columns = s
+                elif change.get("departments"):
+                    columns = (s, [index[dept_name] for dept_name in change["departments"]])
+                else:
+                    columns = (s, slice(None))
+                if change["operation"] == "multiply":
+                    scale[columns] *= change["value"]
+                    shift[columns] *= change["value"]
+                elif change["operation"] == "add":
+                    shift[columns] += change["value"]
+                else:
+                    raise ValueError(f"未対応の操作です: {change['operation']}")
+        return arrays
+
+    def _profit(self, inputs: Mapping[str, np.ndarray]) -> np.ndarray:
+        """入力（(..., P, N) または本部費用 (..., P)）に対する営業利益 (..., P, N)"""
+        allocated = compute_allocation(
+            inputs["margin_rate"],
+            inputs["fixed_cost"],
+            inputs["variable_cost"],
+            self.ratios[..., 0],
+            self.ratios[..., 1],
+            inputs["headquarters_fixed_cost"][..., None],
+            inputs["headquarters_variable_cost"][..., None],
+            self.transfers[..., 0],
+            self.transfers[..., 1]
+        )
+        return operating_profit(allocated["implied_sales"], allocated["fixed_cost"])
+
+    def run(self, shocks: Sequence[Mapping]) -> Dict:
+        """
+        すべてのショックをすべての計画に適用し、営業利益と黒字→赤字の転落を計算
+
+        ショックは 値 × 倍率 + 加算額 として (ショック, 計画, 事業部) の配列で1回の配賦計算にまとめる。
+        仮の売上総利益は 変動費 / (1 - 限界利益率) のため、変動費のショックは仮の売上総利益を変えず
+        限界利益率の低下として扱う（変動費の増加で仮の売上総利益・営業利益が増えないようにする）
+
+        Args:
+            shocks: ショックの一覧（default_shocks と同じ形式）
+
+        Returns:
+            {"shock_names", "plan_names", "names", "base_profit": (P, N), "shocked_profit": (S, P, N),
+             "flipped": 黒字から赤字に転落した箇所 (S, P, N)}
+        """
+        shock_arrays = self._shock_arrays(shocks)
+        shocked_inputs = {}
+        for target, (scale, shift) in shock_arrays.items():
+            if target in _HEADQUARTERS_TARGETS:
+                shocked_inputs[target] = self.inputs[target][None, :] * scale[:, None] + shift[:, None]
+            else:
+                shocked_inputs[target] = self.inputs[target][None, :, :] * scale[:, None, :] + shift[:, None, :]
+
+        # 変動費のショック後も仮の売上総利益（限界利益率のショック後の値）を保つ限界利益率
+        shocked_variable = shocked_inputs["variable_cost"]
+        base_variable = np.broadcast_to(self.inputs["variable_cost"][None, :, :], shocked_variable.shape)
+        held = (base_variable > 0) & (shocked_variable > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            held_margin_rate = 1 - shocked_variable * (1 - shocked_inputs["margin_rate"]) / base_variable
+        shocked_inputs["margin_rate"] = np.where(held, held_margin_rate, shocked_inputs["margin_rate"])
+
+        base_profit = self._profit(self.inputs)
+        shocked_profit = self._profit(shocked_inputs)
+        return {
+            "shock_names": [shock["name"] for shock in shocks],
+            "plan_names": list(self.plan_names),
+            "names": list(self.names),
+            "base_profit": base_profit,
+            "shocked_profit": shocked_profit,
+            "flipped": (base_profit > 0)[None, :, :] & (shocked_profit < 0)
+        }
+
+    @staticmethod
+    def get_summary_data(result: Dict, only_flipped: bool = False) -> pd.DataFrame:
+        """
+        ショック × 計画 ごとのサマリーをDataFrameで取得
+
+        Args:
+            result: run の結果
+            only_flipped: Trueの場合、赤字に転落する事業部がある組合せのみ
+        """
+        names = np.array(result["names"])
+        flipped = result["flipped"]
+        profit_change = result["shocked_profit"].sum(axis=2) - result["base_profit"].sum(axis=1)[None, :]
+        deficit_count = (result["shocked_profit"] < 0).sum(axis=2)
+
+        summary_data = []
+        for s, shock_name in enumerate(result["shock_names"]):
+            for p, plan_name in enumerate(result["plan_names"]):
+                if only_flipped and not flipped[s, p].any():
+                    continue
+                summary_data.append({
+                    "ショック": shock_name,
+                    "計画": plan_name,
+                    "赤字転落事業部": "、".join(names[flipped[s, p]]) or "なし",
+                    "赤字事業部数": int(deficit_count[s, p]),
+                    "全社営業利益の変化": f"{profit_change[s, p]:,.0f}円"
+                })
+        return pd.DataFrame(summary_data)